@@ -0,0 +1,126 @@
+"""Control adaptativo de concurrencia (AIMD) para las llamadas al OSB.
+
+Se comparte entre los consumidores; cada copia de este archivo debe mantenerse
+idéntica. El límite sube de a un slot por cada "ventana" de respuestas sanas y
+se reduce multiplicativamente cuando hay errores o la latencia supera
+``latency_tolerance`` veces la latencia base observada.
+
+``call`` espera un slot sin límite. Quien tiene un plazo (p. ej. el timeout
+de la función) usa ``acquire(timeout)`` y luego ``run``, o ``cancel`` si al
+final no hace la llamada.
+
+Configuración por variables de entorno:
+    OSB_CONCURRENCY_INITIAL (4), OSB_CONCURRENCY_MIN (1), OSB_CONCURRENCY_MAX (32),
+    OSB_LATENCY_TOLERANCE (1.5), OSB_CONCURRENCY_BACKOFF (0.7),
+    OSB_LATENCY_WINDOW (10 segundos)
+"""
+import os
+import threading
+import time
+
+
+class AdaptiveConcurrencyLimiter:
+    """Semáforo cuyo tamaño se ajusta con AIMD según latencia y errores."""
+
+    def __init__(self, initial=4, min_limit=1, max_limit=32,
+                 latency_tolerance=1.5, backoff=0.7, window=10.0, clock=time.monotonic):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self.window = window
+        self._clock = clock
+        self._limit = float(max(min_limit, min(initial, max_limit)))
+        self._inflight = 0
+        self._baseline = None
+        self._window_min = None
+        self._window_start = clock()
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            initial=int(os.getenv("OSB_CONCURRENCY_INITIAL", "4")),
+            min_limit=int(os.getenv("OSB_CONCURRENCY_MIN", "1")),
+            max_limit=int(os.getenv("OSB_CONCURRENCY_MAX", "32")),
+            latency_tolerance=float(os.getenv("OSB_LATENCY_TOLERANCE", "1.5")),
+            backoff=float(os.getenv("OSB_CONCURRENCY_BACKOFF", "0.7")),
+            window=float(os.getenv("OSB_LATENCY_WINDOW", "10")),
+        )
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    @property
+    def inflight(self):
+        return self._inflight
+
+    def acquire(self, timeout=None):
+        """Espera un slot libre. Devuelve False si vence ``timeout``."""
+        deadline = None if timeout is None else self._clock() + timeout
+        with self._cond:
+            while self._inflight >= int(self._limit):
+                remaining = None if deadline is None else deadline - self._clock()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self._inflight += 1
+            return True
+
+    def release(self, latency, ok=True):
+        """Libera el slot y ajusta el límite con la latencia (segundos) y el resultado."""
+        with self._cond:
+            self._inflight -= 1
+            now = self._clock()
+            if ok:
+                # Latencia base: mínimo de la ventana anterior (``window``
+                # segundos). Tras cada reducción del límite llegan respuestas
+                # sin cola propia, así que el mínimo refleja al OSB y puede
+                # subir si este se vuelve más lento de forma sostenida.
+                if self._window_min is None or latency < self._window_min:
+                    self._window_min = latency
+                if self._baseline is None or latency < self._baseline:
+                    self._baseline = latency
+                if now - self._window_start >= self.window:
+                    self._baseline = self._window_min
+                    self._window_min = None
+                    self._window_start = now
+
+            congested = not ok or (self._baseline is not None
+                                    and latency > self._baseline * self.latency_tolerance)
+            if congested:
+                # Una sola reducción por ventana de latencia para no colapsar
+                if now - self._last_decrease >= latency:
+                    self._limit = max(self.min_limit, self._limit * self.backoff)
+                    self._last_decrease = now
+            else:
+                self._limit = min(self.max_limit, self._limit + 1.0 / self._limit)
+            self._cond.notify_all()
+
+    def cancel(self):
+        """Devuelve un slot obtenido con ``acquire`` que no llegó a usarse, sin ajustar el límite."""
+        with self._cond:
+            self._inflight -= 1
+            self._cond.notify_all()
+
+    def run(self, fn, *args, **kwargs):
+        """Ejecuta ``fn`` en un slot ya obtenido con ``acquire`` y lo libera.
+
+        Cuenta como error si ``fn`` lanza excepción o devuelve HTTP >= 500.
+        """
+        start = self._clock()
+        ok = False
+        try:
+            result = fn(*args, **kwargs)
+            status = getattr(result, "status_code", 200)
+            ok = not (isinstance(status, int) and status >= 500)
+            return result
+        finally:
+            self.release(self._clock() - start, ok)
+
+    def call(self, fn, *args, **kwargs):
+        """Espera un slot sin límite de tiempo y ejecuta ``fn`` con ``run``."""
+        self.acquire()
+        return self.run(fn, *args, **kwargs)
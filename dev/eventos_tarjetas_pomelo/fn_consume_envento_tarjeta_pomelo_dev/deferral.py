@@ -0,0 +1,110 @@
+"""Diferir eventos Pomelo a la Queue para que la consumidora los envíe más tarde.
+
+La consumidora (límite de tasa del canal) y la función de notificación (límite
+de tasa hacia el OSB) reencolan con este módulo, así un evento diferido tiene
+el mismo formato que uno de la productora: sobre de envelope.py, metadata de
+tracing.py y clase de prioridad, en la Queue del carril de prioridad, del
+canal o del shard de la tarjeta (ver priority.py y queue_routing.py), con un
+retraso de entrega que incluye jitter para no volver todos a la vez.
+
+Se comparte entre la consumidora y la función de notificación; cada copia
+debe mantenerse idéntica.
+
+Variables de entorno:
+    RATE_LIMIT_JITTER  segundos máximos de jitter sumados al retraso (5)
+"""
+import json
+import logging
+import math
+import os
+import random
+import threading
+from collections import OrderedDict
+
+import requests
+
+from envelope import encode
+from priority import lane_for, priority_for
+from queue_routing import queue_for
+from tracing import stamp, trace_metadata
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_JITTER = int(os.getenv("RATE_LIMIT_JITTER", "5"))
+PUT_MESSAGES_MAX_ENTRIES = 20
+
+_lock = threading.Lock()
+_queues = {}
+
+
+def queue_state(queue_id):
+    """Carga una sola vez por Queue la configuración OCI, el signer y el cliente de mensajes."""
+    with _lock:
+        if queue_id not in _queues:
+            # oci se importa con el primer cliente: entregar al OSB no lo usa y
+            # cargarlo ocupa ~40 MB de la memoria de la función
+            import oci
+
+            file_config = oci.config.from_file("config.oci")
+            signer = oci.signer.Signer(
+                tenancy=file_config["tenancy"],
+                user=file_config["user"],
+                fingerprint=file_config["fingerprint"],
+                private_key_file_location=file_config["key_file"]
+            )
+            admin = oci.queue.QueueAdminClient(config=file_config)
+            q = admin.get_queue(queue_id).data
+            client = oci.queue.QueueClient(config=file_config)
+            client.base_client.endpoint = q.messages_endpoint
+            _queues[queue_id] = {
+                "signer": signer,
+                "messages_endpoint": q.messages_endpoint,
+                "client": client,
+            }
+        return _queues[queue_id]
+
+
+def backoff_delay(wait):
+    """Retraso de entrega (segundos) para la espera sugerida por el limitador, con jitter."""
+    return math.ceil(wait + random.uniform(0, RATE_LIMIT_JITTER))
+
+
+def destination(payload, channel):
+    """Queue del evento: carril de prioridad, Queue del canal o shard de la tarjeta."""
+    card_id = payload.get("id") if isinstance(payload, dict) else None
+    return lane_for(priority_for(channel, payload)) or queue_for(channel, card_id)
+
+
+def defer(entries):
+    """Reencola eventos (payload, channel, delay, trace) en lotes de 20. Devuelve True si todo quedó encolado."""
+    by_queue = OrderedDict()
+    for entry in entries:
+        by_queue.setdefault(destination(*entry[:2]), []).append(entry)
+    if None in by_queue:
+        logger.error("QUEUE_OCID no configurado: no es posible diferir eventos")
+        return False
+    try:
+        for queue_id, queue_entries in by_queue.items():
+            state = queue_state(queue_id)
+            url = f"{state['messages_endpoint']}/20210201/queues/{queue_id}/messages"
+            for i in range(0, len(queue_entries), PUT_MESSAGES_MAX_ENTRIES):
+                messages = []
+                for payload, channel, delay, trace in queue_entries[i:i + PUT_MESSAGES_MAX_ENTRIES]:
+                    trace = stamp(trace)
+                    content, envelope_metadata = encode({"Channel": channel, "payload": payload, "trace": trace})
+                    messages.append({
+                        "content": content,
+                        "metadata": {"channelId": str(channel), "priority": priority_for(channel, payload),
+                                     **trace_metadata(trace), **envelope_metadata},
+                        "deliveryDelayInSeconds": delay
+                    })
+                r = requests.post(url, data=json.dumps({"messages": messages}),
+                                  headers={"Content-Type": "application/json"},
+                                  auth=state["signer"])
+                if r.status_code != 200:
+                    logger.error(f"Error difiriendo eventos (HTTP {r.status_code}): {r.text}")
+                    return False
+        return True
+    except Exception as e:
+        logger.error(f"Error difiriendo eventos a la Queue: {e}")
+        return False
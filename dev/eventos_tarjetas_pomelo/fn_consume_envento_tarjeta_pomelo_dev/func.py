@@ -3,6 +3,18 @@ import json
 import os
 import requests
 import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from concurrency import AdaptiveConcurrencyLimiter
+from deferral import backoff_delay, defer, queue_state
+from envelope import decode
+from health import DeepProbe, health_mode, health_response, http_reachable
+from priority import priority_for, rank
+from rate_limiter import RateLimiter
+from token_provider import authorization_from_env
+from tracing import CORRELATION_HEADER, observe, read_trace
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO,
@@ -10,7 +22,15 @@ logging.basicConfig(level=logging.INFO,
 logger = logging.getLogger()
 
 # --- Variables de entorno ---
-OSB_AUTH = os.getenv("OSB_AUTH")
+QUEUE_OCID = os.getenv("QUEUE_OCID")
+# Presupuesto de tiempo por invocación (timeout de la función, 30 s por defecto en
+# OCI Functions): no se inicia una llamada al OSB si el tiempo restante no alcanza
+# para OSB_TIMEOUT más DEADLINE_MARGIN; esos eventos se reencolan sin retraso.
+FUNCTION_TIMEOUT = int(os.getenv("FUNCTION_TIMEOUT", "30"))
+OSB_TIMEOUT = int(os.getenv("OSB_TIMEOUT", "10"))
+DEADLINE_MARGIN = int(os.getenv("DEADLINE_MARGIN", "5"))
+# Los eventos que exceden el límite de tasa del canal (ver rate_limiter.py) se
+# difieren a la Queue con el retraso sugerido más un jitter (ver deferral.py).
 
 # --- Mapa de canales a endpoints ---
 CHANNEL_ENDPOINTS = {
@@ -19,56 +39,251 @@ CHANNEL_ENDPOINTS = {
     "CANAL_EVENTOS_TARJETA": os.getenv("OSB_BASE_URL_TARJETA")
 }
 
-def handler(ctx, data: io.BytesIO = None):
+_rate_limiter = RateLimiter.from_env()
+# Header Authorization hacia el OSB: token OAuth en caché o OSB_AUTH (ver token_provider.py)
+_authorization, _token_provider = authorization_from_env("OSB_AUTH")
+# Concurrencia hacia el OSB ajustada por latencia/errores (ver concurrency.py);
+# se conserva entre invocaciones de la misma instancia.
+_concurrency = AdaptiveConcurrencyLimiter.from_env()
+
+
+def _get_queue_state(queue_id=None):
+    """Configuración OCI, signer y cliente de mensajes de la Queue (ver deferral.py).
+
+    Sin ``queue_id`` se usa QUEUE_OCID, la Queue de la que lee esta consumidora.
+    """
+    return queue_state(queue_id or QUEUE_OCID)
+
+
+def _message_id(ev, index):
+    """Id del mensaje en la Queue si viene en el elemento; si no, su posición en el lote."""
+    if isinstance(ev, dict) and "receipt" in ev and "content" in ev and ev.get("id") is not None:
+        return str(ev["id"])
+    return str(index)
+
+
+def _parse_event(ev):
+    """Normaliza un elemento del lote (JSON plano o comprimido, ver envelope.py) a (payload, channel, trace).
+
+    Lanza ValueError si el elemento no tiene la forma esperada.
+    """
     try:
-        raw_body = data.getvalue() if data else b"{}"
-        events = json.loads(raw_body.decode("utf-8"))
+        if isinstance(ev, dict) and "content" in ev and "receipt" in ev:
+            ev = decode(ev.get("content"))
+        else:
+            ev = decode(ev)
+    except ValueError as e:
+        raise ValueError(f"content no es JSON válido: {e}")
+    if not isinstance(ev, dict):
+        raise ValueError(f"evento con tipo no soportado: {type(ev).__name__}")
+
+    payload = ev.get("payload", {})
+    channel = ev.get("Channel") or ev.get("canal")  # según cómo venga
+
+    if not channel or channel not in CHANNEL_ENDPOINTS:
+        raise ValueError(f"Channel inválido o no soportado: {channel}")
+    return payload, channel, read_trace(ev)
+
+
+def _summarize(results):
+    """Agrupa los ids por resultado y elige el código HTTP del lote."""
+    summary = {"processed": results, "succeeded": [], "failed": [], "rejected": []}
+    for result in results:
+        summary[result["outcome"]].append(result["id"])
+
+    if summary["failed"] and not summary["succeeded"] and not summary["rejected"]:
+        status_code = 502
+    elif summary["failed"] or summary["rejected"]:
+        status_code = 207
+    else:
+        status_code = 200
+    return status_code, summary
+
+
+def _acquire_slot(deadline):
+    """Espera un slot de concurrencia hacia el OSB sin pasar del plazo de la invocación.
+
+    Con ``deadline`` la espera dura como máximo hasta que el tiempo restante ya
+    no alcanza para OSB_TIMEOUT más DEADLINE_MARGIN, y al obtener el slot se
+    vuelve a comprobar. Devuelve False (sin slot) si no se puede iniciar la
+    llamada a tiempo.
+    """
+    if deadline is None:
+        return _concurrency.acquire()
+    budget = deadline - time.monotonic() - OSB_TIMEOUT - DEADLINE_MARGIN
+    if budget < 0 or not _concurrency.acquire(timeout=budget):
+        return False
+    if deadline - time.monotonic() < OSB_TIMEOUT + DEADLINE_MARGIN:
+        _concurrency.cancel()
+        return False
+    return True
+
+
+def _forward(message_id, payload, channel, trace):
+    """Envía un evento al endpoint OSB de su canal y devuelve el resultado.
+
+    Se llama con un slot de concurrencia ya obtenido (ver ``_acquire_slot``),
+    que se libera aquí.
+    """
+    endpoint = CHANNEL_ENDPOINTS[channel]
+    slot_held = True
+    try:
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": _authorization(),
+            CORRELATION_HEADER: trace["correlationId"]
+        }
+        logger.info(f"Enviando payload al endpoint {endpoint} para channel {channel}, correlationId {trace['correlationId']}")
+        started = time.monotonic()
+        slot_held = False
+        r = _concurrency.run(
+            requests.post,
+            endpoint,
+            headers=headers,
+            json=payload,
+            timeout=OSB_TIMEOUT,
+            verify=True
+        )
+        osb_ms = int(1000 * (time.monotonic() - started))
+        status = r.status_code
+        if status == 401 and _token_provider:
+            _token_provider.invalidate(headers["Authorization"])
+        outcome = "succeeded" if status < 400 else "failed"
+        logger.info(f"POST enviado a {endpoint}, status={status}")
     except Exception as e:
-        logger.error(f"Invalid JSON: {e}")
-        return (400, json.dumps({"error": f"Invalid JSON: {e}"}))
+        if slot_held:
+            # Falló antes de llamar al OSB (p. ej. el token): el slot no se usó
+            _concurrency.cancel()
+        osb_ms = None
+        status = f"error: {str(e)}"
+        outcome = "failed"
+        logger.error(f"Error enviando a webhook: {status}")
+
+    observe(trace, channel, status, osb_ms)
+
+    return {
+        "id": message_id,
+        "channel": channel,
+        "status": status,
+        "outcome": outcome
+    }
 
+
+def _forward_in_order(items, deadline=None):
+    """Envía en orden los eventos de una tarjeta; devuelve (resultados, no iniciados por el plazo)."""
     results = []
-    events = events if isinstance(events, list) else [events]
+    for position, item in enumerate(items):
+        if not _acquire_slot(deadline):
+            return results, items[position:]
+        results.append(_forward(*item))
+    return results, []
+
+
+def _deferred_results(pending, reason, ok):
+    return [
+        {
+            "id": message_id,
+            "channel": channel,
+            "status": f"deferred ({reason})" if ok else f"failed to requeue ({reason})",
+            "outcome": "succeeded" if ok else "failed"
+        }
+        for message_id, _, channel, *_ in pending
+    ]
+
 
-    for ev in events:
-        payload = ev.get("payload", {})
-        channel = ev.get("Channel") or ev.get("canal")  # según cómo venga
+def process_batch(events, deadline=None):
+    """Procesa una lista de elementos de la Queue y devuelve un resultado por elemento.
+
+    Si se indica ``deadline`` (time.monotonic()), los eventos que no alcanzan a
+    iniciar su llamada al OSB a tiempo, incluida la espera de un slot de
+    concurrencia, se reencolan sin retraso y sin alterar el orden por tarjeta.
+    """
+    results = []
+    rate_limited = []
+    unstarted = []
+    # Los eventos de una misma tarjeta se envían en orden; el resto, en paralelo
+    partitions = OrderedDict()
 
-        if not channel or channel not in CHANNEL_ENDPOINTS:
-            logger.warning(f"Channel inválido o no soportado: {channel}")
+    for index, ev in enumerate(events):
+        message_id = _message_id(ev, index)
+        try:
+            payload, channel, trace = _parse_event(ev)
+        except ValueError as e:
+            logger.warning(f"Mensaje {message_id} descartado: {e}")
             results.append({
+                "id": message_id,
                 "status": "error",
-                "message": f"Channel inválido o no soportado: {channel}"
+                "message": str(e),
+                "outcome": "rejected"
             })
             continue
 
-        endpoint = CHANNEL_ENDPOINTS[channel]
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": OSB_AUTH
-        }
+        key = str(payload.get("id")) if isinstance(payload, dict) and payload.get("id") else message_id
+        partitions.setdefault(key, []).append((message_id, payload, channel, trace))
 
-        try:
-            logger.info(f"Enviando payload al endpoint {endpoint} para channel {channel}")
-            r = requests.post(
-                endpoint,
-                headers=headers,
-                json=payload,
-                timeout=10,
-                verify=True
-            )
-            status = r.status_code
-            logger.info(f"POST enviado a {endpoint}, status={status}")
-        except Exception as e:
-            status = f"error: {str(e)}"
-            logger.error(f"Error enviando a webhook: {status}")
-
-        results.append({
-            "channel": channel,
-            "status": status
-        })
+    # Las tarjetas con eventos de mayor prioridad (p. ej. BLOCK) se atienden
+    # primero: toman antes los tokens del límite de tasa y arrancan primero en
+    # el pool. Dentro de una tarjeta se conserva el orden de llegada.
+    ordered = sorted(partitions.values(),
+                     key=lambda items: min(rank(priority_for(c, p)) for _, p, c, _ in items))
+    ready = []
+    for items in ordered:
+        for position, (message_id, payload, channel, _) in enumerate(items):
+            wait = _rate_limiter.try_acquire(channel)
+            if wait > 0:
+                # El resto de la tarjeta se difiere también para no adelantarse
+                delay = backoff_delay(wait)
+                rate_limited.extend((m, p, c, delay, t) for m, p, c, t in items[position:])
+                items = items[:position]
+                break
+        if items:
+            ready.append(items)
+
+    if ready:
+        workers = min(len(ready), _concurrency.max_limit)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for out, pending in pool.map(lambda items: _forward_in_order(items, deadline), ready):
+                results.extend(out)
+                unstarted.extend(pending)
+
+    if unstarted:
+        ok = defer([(payload, channel, 0, trace) for _, payload, channel, trace in unstarted])
+        logger.warning(f"{len(unstarted)} evento(s) diferidos por el plazo de la invocación, reencolados={ok}")
+        results.extend(_deferred_results(unstarted, "deadline", ok))
+    if rate_limited:
+        ok = defer([(payload, channel, delay, trace) for _, payload, channel, delay, trace in rate_limited])
+        logger.warning(f"{len(rate_limited)} evento(s) diferidos por límite de tasa, reencolados={ok}")
+        results.extend(_deferred_results(rate_limited, "rate limit", ok))
+
+    return results
+
+
+# Health check profundo: cada OSB configurado responde y la Queue de entrada responde a GetStats (ver health.py)
+_health_checks = {
+    f"osb:{channel}": (lambda url=url: http_reachable(url))
+    for channel, url in CHANNEL_ENDPOINTS.items() if url
+}
+_health_checks["queue"] = (lambda: _get_queue_state()["client"].get_stats(QUEUE_OCID)) if QUEUE_OCID else None
+_health_probe = DeepProbe(_health_checks)
+
+
+def handler(ctx, data: io.BytesIO = None):
+    # Health check: responde antes de leer el cuerpo, registrar logs o crear clientes
+    mode = health_mode(ctx)
+    if mode:
+        return health_response(mode, _health_probe)
+
+    deadline = time.monotonic() + FUNCTION_TIMEOUT
+    try:
+        raw_body = data.getvalue() if data else b"{}"
+        events = json.loads(raw_body.decode("utf-8"))
+    except Exception as e:
+        logger.error(f"Invalid JSON: {e}")
+        return (400, json.dumps({"error": f"Invalid JSON: {e}"}))
+
+    results = process_batch(events if isinstance(events, list) else [events], deadline)
 
-    summary = {"processed": results}
+    status_code, summary = _summarize(results)
     logger.info(f"Resumen final: {summary}")
-    return (200, json.dumps(summary, ensure_ascii=False),
+    return (status_code, json.dumps(summary, ensure_ascii=False),
             {"Content-Type": "application/json"})
@@ -0,0 +1,115 @@
+"""Limitador de tasa (token bucket) por endpoint/canal del OSB.
+
+Se comparte entre las funciones que reenvían al OSB; cada copia de este archivo
+debe mantenerse idéntica.
+
+Configuración por variables de entorno:
+    OSB_RATE_LIMITS="Prepared=5:10,Committed=10"   -> clave=tasa_por_segundo[:ráfaga]
+    OSB_RATE_LIMIT_DEFAULT="20:40"                 -> límite para claves no listadas
+    OSB_RATE_LIMIT_INSTANCES=1                     -> instancias que comparten esos límites
+Sin configuración no se limita.
+
+Los buckets viven en memoria de cada instancia, así que los límites
+configurados son globales y cada instancia toma la parte que le corresponde:
+tasa y ráfaga se dividen por OSB_RATE_LIMIT_INSTANCES (la ráfaga, con mínimo
+de 1). Ese valor debe ser el máximo de instancias que llaman al mismo OSB a la
+vez, sumando todas las funciones que usan la misma clave (por ejemplo la
+consumidora y la función de notificación de Pomelo con CANAL_EVENTOS_TARJETA):
+con menos instancias activas la tasa total queda por debajo del límite, nunca
+por encima.
+"""
+import os
+import threading
+import time
+
+
+class TokenBucket:
+    """Token bucket seguro entre hilos."""
+
+    def __init__(self, rate, burst=None, clock=time.monotonic):
+        if not rate > 0:
+            raise ValueError(f"la tasa debe ser mayor que 0: {rate!r}")
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(rate, 1))
+        self._clock = clock
+        self._tokens = self.burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, tokens=1):
+        """Consume ``tokens`` si hay disponibles.
+
+        Devuelve 0.0 si se concedió o los segundos que faltan para que haya
+        tokens suficientes.
+        """
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+
+def _parse_limit(value):
+    rate, _, burst = value.strip().partition(":")
+    return float(rate), (float(burst) if burst else None)
+
+
+def parse_limits(spec):
+    """Convierte "clave=tasa[:ráfaga],..." en {clave: (tasa, ráfaga)}."""
+    limits = {}
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        key, _, value = item.partition("=")
+        limits[key.strip()] = _parse_limit(value)
+    return limits
+
+
+class RateLimiter:
+    """Registro de token buckets por clave (endpoint o canal)."""
+
+    def __init__(self, limits=None, default=None, instances=1):
+        if instances < 1:
+            raise ValueError(f"instances debe ser al menos 1: {instances!r}")
+        self._limits = dict(limits or {})
+        self._default = default
+        self.instances = instances
+        self._buckets = {}
+        self._lock = threading.Lock()
+        # Un límite inválido (p. ej. tasa 0) falla al arrancar y no en la primera llamada
+        for limit in [*self._limits.values(), default]:
+            if limit is not None:
+                TokenBucket(*self.share(limit))
+
+    @classmethod
+    def from_env(cls):
+        default = os.getenv("OSB_RATE_LIMIT_DEFAULT")
+        return cls(parse_limits(os.getenv("OSB_RATE_LIMITS")),
+                   _parse_limit(default) if default else None,
+                   int(os.getenv("OSB_RATE_LIMIT_INSTANCES", "1")))
+
+    def share(self, limit):
+        """(tasa, ráfaga) de esta instancia para un límite global (tasa, ráfaga)."""
+        rate, burst = limit
+        burst = burst if burst is not None else max(rate, 1)
+        return rate / self.instances, max(burst / self.instances, 1.0)
+
+    def _bucket(self, key):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                limit = self._limits.get(key, self._default)
+                if limit is None:
+                    return None
+                bucket = self._buckets[key] = TokenBucket(*self.share(limit))
+            return bucket
+
+    def try_acquire(self, key):
+        """Devuelve 0.0 si la llamada puede salir ya o los segundos de espera sugeridos."""
+        bucket = self._bucket(key)
+        if bucket is None:
+            return 0.0
+        return bucket.try_acquire()
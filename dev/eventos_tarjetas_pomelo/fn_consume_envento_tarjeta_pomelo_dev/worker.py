@@ -0,0 +1,106 @@
+"""Consumidor en modo pull: lee de la Queue OCI y procesa con la misma lógica del handler.
+
+Cada worker lee de una sola Queue (QUEUE_OCID: la dedicada a un canal o uno
+de los shards) y, opcionalmente, solo del canal CHANNEL_FILTER, de modo que
+cada canal o shard escala por separado. Si hay carriles de prioridad
+(QUEUE_OCID_BY_PRIORITY, ver priority.py) se vacía primero el más urgente y
+solo se lee el siguiente cuando el anterior no tiene mensajes. Mientras todos
+están vacíos ninguno hace long polling de POLL_TIMEOUT: se consultan por turno
+con esperas de LANE_POLL_TIMEOUT segundos, así un evento urgente que llega con
+la Queue común vacía se lee en la vuelta siguiente y no al vencer POLL_TIMEOUT.
+
+Uso:
+    QUEUE_OCID=... [CHANNEL_FILTER=CANAL_EVENTOS_TARJETA] OSB_BASE_URL_TARJETA=... OSB_AUTH=... python worker.py
+"""
+import logging
+import os
+import time
+
+import oci
+
+import func
+from priority import drain_order
+
+POLL_LIMIT = int(os.getenv("POLL_LIMIT", "10"))
+POLL_TIMEOUT = int(os.getenv("POLL_TIMEOUT", "20"))
+LANE_POLL_TIMEOUT = int(os.getenv("LANE_POLL_TIMEOUT", "1"))
+VISIBILITY = int(os.getenv("VISIBILITY", "60"))
+ERROR_BACKOFF = int(os.getenv("ERROR_BACKOFF", "5"))
+CHANNEL_FILTER = os.getenv("CHANNEL_FILTER")
+DELETE_MESSAGES_MAX_ENTRIES = 20
+
+logger = logging.getLogger()
+
+
+def _delete_messages(client, queue_id, receipts):
+    for i in range(0, len(receipts), DELETE_MESSAGES_MAX_ENTRIES):
+        entries = [
+            oci.queue.models.DeleteMessagesDetailsEntry(receipt=receipt)
+            for receipt in receipts[i:i + DELETE_MESSAGES_MAX_ENTRIES]
+        ]
+        client.delete_messages(
+            queue_id=queue_id,
+            delete_messages_details=oci.queue.models.DeleteMessagesDetails(entries=entries)
+        )
+
+
+def _get_messages(queue_id, timeout):
+    client = func._get_queue_state(queue_id)["client"]
+    kwargs = {"channel_filter": CHANNEL_FILTER} if CHANNEL_FILTER else {}
+    resp = client.get_messages(
+        queue_id=queue_id,
+        visibility_in_seconds=VISIBILITY,
+        timeout_in_seconds=timeout,
+        limit=POLL_LIMIT,
+        **kwargs
+    )
+    return client, resp.data.messages
+
+
+def _poll_lanes(lanes):
+    """(queue_id, client, mensajes) del carril más urgente con mensajes; (None, None, []) tras POLL_TIMEOUT sin nada."""
+    if len(lanes) == 1:
+        client, messages = _get_messages(lanes[0], POLL_TIMEOUT)
+        return lanes[0], client, messages
+    # Primera vuelta sin espera; luego cada carril espera como mucho
+    # LANE_POLL_TIMEOUT, en orden de prioridad, hasta completar POLL_TIMEOUT
+    deadline = time.monotonic() + POLL_TIMEOUT
+    timeout = 0
+    while True:
+        for queue_id in lanes:
+            client, messages = _get_messages(queue_id, timeout)
+            if messages:
+                return queue_id, client, messages
+        if time.monotonic() >= deadline:
+            return None, None, []
+        timeout = LANE_POLL_TIMEOUT
+
+
+def poll_once():
+    """Lee un lote del carril más urgente con mensajes, lo procesa y borra lo que ya quedó resuelto."""
+    queue_id, client, raw_messages = _poll_lanes(drain_order(func.QUEUE_OCID))
+    if not raw_messages:
+        return 0
+
+    messages = [{"id": m.id, "receipt": m.receipt, "content": m.content} for m in raw_messages]
+    results = func.process_batch(messages)
+
+    # Los mensajes fallidos se dejan vencer para que la Queue los reentregue
+    failed = {r["id"] for r in results if r["outcome"] == "failed"}
+    receipts = [m["receipt"] for m in messages if m["id"] not in failed]
+    _delete_messages(client, queue_id, receipts)
+    logger.info(f"Lote procesado de {queue_id}: {len(messages)} mensaje(s), {len(receipts)} eliminado(s)")
+    return len(messages)
+
+
+def main():
+    while True:
+        try:
+            poll_once()
+        except Exception as e:
+            logger.error(f"Error en el ciclo de consumo: {e}")
+            time.sleep(ERROR_BACKOFF)
+
+
+if __name__ == "__main__":
+    main()
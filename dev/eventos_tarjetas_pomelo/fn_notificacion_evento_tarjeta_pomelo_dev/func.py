@@ -4,20 +4,35 @@ import logging
 import hmac
 import hashlib
 import base64
+import math
 import os
 import time
 import requests
 from fdk import response
 
+from deferral import backoff_delay, defer, destination, queue_state
+from health import DeepProbe, health_mode, health_response, http_reachable
+from rate_limiter import RateLimiter
+from token_provider import authorization_from_env
+from tracing import CORRELATION_HEADER, correlation_id, new_trace
+
 # === VARIABLES DE ENTORNO ===
 OSB_BASE_URL = os.getenv("OSB_BASE_URL")
-OSB_AUTH = os.getenv("OSB_AUTH")
 API_SECRET = os.getenv("API_SECRET", "")
+# Si el OSB excede su límite de tasa (ver rate_limiter.py) el evento se difiere
+# a la Queue de Pomelo en DEFER_CHANNEL, con el mismo formato, Queue destino y
+# retraso que usa la consumidora (ver deferral.py); sin Queue se responde 429.
+QUEUE_OCID = os.getenv("QUEUE_OCID")
+DEFER_CHANNEL = os.getenv("DEFER_CHANNEL", "CANAL_EVENTOS_TARJETA")
 
 # === CONFIGURACIÓN DE LOGGING ===
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger()
 
+_rate_limiter = RateLimiter.from_env()
+# Header Authorization hacia el OSB: token OAuth en caché o OSB_AUTH (ver token_provider.py)
+_authorization, _token_provider = authorization_from_env("OSB_AUTH")
+
 # === FUNCIONES AUXILIARES ===
 def get_api_secret(api_secret_key):
     """Decodifica el secreto en base64."""
@@ -60,8 +75,36 @@ def check_signature(api_secret, endpoint, timestamp, body, received_signature):
         logger.error(f"Error al validar la firma: {e}")
         return False
 
+def defer_to_queue(input_body, trace, wait):
+    """Encola el evento en la Queue de Pomelo para que la consumidora lo envíe cuando haya tokens.
+
+    Devuelve False si no se pudo encolar o no hay Queue configurada para DEFER_CHANNEL.
+    """
+    try:
+        payload = json.loads(input_body)
+    except ValueError as e:
+        logger.error(f"Error difiriendo evento a la Queue: {e}")
+        return False
+    if destination(payload, DEFER_CHANNEL) is None:
+        return False
+    return defer([(payload, DEFER_CHANNEL, backoff_delay(wait), trace)])
+
+# Health check profundo: el OSB responde y la Queue de diferidos responde a GetStats (ver health.py)
+_health_probe = DeepProbe({
+    "osb": (lambda: http_reachable(OSB_BASE_URL)) if OSB_BASE_URL else None,
+    "queue": (lambda: queue_state(QUEUE_OCID)["client"].get_stats(QUEUE_OCID)) if QUEUE_OCID else None,
+})
+
 # === MANEJADOR PRINCIPAL ===
 def handler(ctx, data: io.BytesIO = None):
+    # Health check (recurso Health Check de OCI): responde antes de leer el cuerpo,
+    # registrar cabeceras, validar la firma o crear clientes
+    mode = health_mode(ctx)
+    if mode:
+        status_code, body = health_response(mode, _health_probe)
+        return response.Response(ctx, response_data=body, status_code=status_code,
+                                 headers={"Content-Type": "application/json"})
+
     try:
         # Leer cuerpo y cabeceras
         input_body = data.getvalue().decode("utf-8") if data else ""
@@ -71,16 +114,11 @@ def handler(ctx, data: io.BytesIO = None):
         timestamp = in_headers.get("x-timestamp", "")
         signature = in_headers.get("x-signature", "")
         apikey = in_headers.get("x-api-key", "")
-        health_check = in_headers.get("health_check")
+        trace = new_trace(correlation_id(in_headers))
 
         logger.info(f"Headers recibidos: {in_headers}")
         logger.info(f"Cuerpo recibido  : {input_body}")
         
-        if health_check == 'true':
-            response_headers = {"Content-Type": "application/json"}
-            logging.getLogger().info('Invocación desde el recurso Health Chech de OCI')
-            return response.Response(ctx, status_code=200, headers=response_headers)
-
         # Validar parámetros obligatorios
         if not all([endpoint, timestamp, signature, apikey, input_body]):
             logger.warning("Petición con parámetros faltantes")
@@ -96,10 +134,27 @@ def handler(ctx, data: io.BytesIO = None):
             sign_response(API_SECRET, body_out, response_headers, endpoint)
             return response.Response(ctx, response_data=body_out, status_code=400, headers=response_headers)
 
+        # Respetar el límite de tasa hacia el OSB
+        wait = _rate_limiter.try_acquire(DEFER_CHANNEL)
+        if wait > 0:
+            response_headers = {"Content-Type": "application/json"}
+            if defer_to_queue(input_body, trace, wait):
+                logger.warning("Límite de tasa hacia el OSB excedido: evento diferido a la Queue")
+                body_out = json.dumps({"status": "Evento diferido"})
+                sign_response(API_SECRET, body_out, response_headers, endpoint)
+                return response.Response(ctx, response_data=body_out, status_code=202, headers=response_headers)
+
+            logger.warning("Límite de tasa hacia el OSB excedido: se solicita reintento")
+            response_headers["Retry-After"] = str(math.ceil(wait))
+            body_out = json.dumps({"errorCode": 429, "errorMessage": "Demasiadas solicitudes"})
+            sign_response(API_SECRET, body_out, response_headers, endpoint)
+            return response.Response(ctx, response_data=body_out, status_code=429, headers=response_headers)
+
         # Enviar al OSB
         out_headers = {
             "Content-Type": "application/json",
-            "Authorization": OSB_AUTH,
+            "Authorization": _authorization(),
+            CORRELATION_HEADER: trace["correlationId"],
         }
         r = requests.post(
             OSB_BASE_URL,
@@ -110,6 +165,8 @@ def handler(ctx, data: io.BytesIO = None):
         )
 
         logger.info(f"Respuesta OSB: {r.status_code} - {r.text}")
+        if r.status_code == 401 and _token_provider:
+            _token_provider.invalidate(out_headers["Authorization"])
 
         response_headers = {"Content-Type": "application/json"}
 
@@ -0,0 +1,82 @@
+"""Clases de prioridad y carriles (Queues) dedicados para eventos Pomelo.
+
+Las reglas se configuran con ``PRIORITY_RULES``, separadas por coma, con la
+forma ``canal:clase`` o ``canal.campo=valor:clase`` (campo del payload). Gana
+la primera regla que coincide; si ninguna coincide la clase es "normal".
+Por defecto los bloqueos de tarjeta son de prioridad alta:
+
+    PRIORITY_RULES="CANAL_EVENTOS_TARJETA.event=BLOCK:high,CANAL_NOTIFICACIONES_ACTIVIDADES:low"
+
+Cada clase puede tener su propia Queue con ``QUEUE_OCID_BY_PRIORITY``
+("high=ocid,low=ocid"); la consumidora en modo pull vacía primero el carril
+de mayor prioridad. Se comparte entre productor y consumidora; cada copia
+debe mantenerse idéntica.
+"""
+import os
+
+PRIORITIES = ("high", "normal", "low")
+DEFAULT_PRIORITY = "normal"
+DEFAULT_RULES = "CANAL_EVENTOS_TARJETA.event=BLOCK:high"
+
+
+def parse_rules(spec):
+    """Convierte la especificación en una lista de (canal, campo, valor, clase)."""
+    rules = []
+    for item in (spec or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        target, _, priority = item.rpartition(":")
+        if priority not in PRIORITIES or not target:
+            raise ValueError(f"regla de prioridad inválida: {item}")
+        channel, field, value = target, None, None
+        if "=" in target:
+            selector, _, value = target.partition("=")
+            channel, _, field = selector.partition(".")
+        rules.append((channel, field or None, value, priority))
+    return rules
+
+
+def _parse_map(spec):
+    mapping = {}
+    for item in (spec or "").split(","):
+        if "=" in item:
+            key, _, value = item.partition("=")
+            mapping[key.strip()] = value.strip()
+    return mapping
+
+
+PRIORITY_RULES = parse_rules(os.getenv("PRIORITY_RULES", DEFAULT_RULES))
+QUEUE_OCID_BY_PRIORITY = _parse_map(os.getenv("QUEUE_OCID_BY_PRIORITY"))
+
+
+def priority_for(channel, payload, rules=None):
+    """Clase de prioridad de un evento según su canal y su payload."""
+    for rule_channel, field, value, priority in PRIORITY_RULES if rules is None else rules:
+        if rule_channel != channel:
+            continue
+        if field is None:
+            return priority
+        if isinstance(payload, dict) and str(payload.get(field)) == value:
+            return priority
+    return DEFAULT_PRIORITY
+
+
+def rank(priority):
+    """Orden de atención: 0 es la clase más urgente."""
+    return PRIORITIES.index(priority) if priority in PRIORITIES else PRIORITIES.index(DEFAULT_PRIORITY)
+
+
+def lane_for(priority):
+    """Queue dedicada a la clase, o None si la clase comparte la Queue del canal."""
+    return QUEUE_OCID_BY_PRIORITY.get(priority)
+
+
+def drain_order(default_queue):
+    """Queues a consultar de la más a la menos urgente; ``default_queue`` va en el lugar de "normal"."""
+    order = []
+    for priority in PRIORITIES:
+        queue_id = lane_for(priority) or (default_queue if priority == DEFAULT_PRIORITY else None)
+        if queue_id and queue_id not in order:
+            order.append(queue_id)
+    return order
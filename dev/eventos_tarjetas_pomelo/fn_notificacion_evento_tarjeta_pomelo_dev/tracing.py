@@ -0,0 +1,89 @@
+"""Correlación de punta a punta y latencias del paso por la Queue.
+
+El productor toma el id de correlación de la petición (``X-Correlation-Id`` o
+``X-Request-Id``) o crea uno, y lo guarda en el sobre del mensaje junto con
+la hora de recepción y la de encolado. Va en el sobre y no solo en la
+metadata porque el Service Connector entrega el content sin la metadata.
+La consumidora lo reenvía al OSB en ``X-Correlation-Id`` y registra por
+evento el tiempo en la Queue (dwell) y el total desde la recepción (e2e).
+Cada reencolado conserva el id y la hora de recepción y renueva la de encolado.
+
+Se comparte entre productores y consumidoras; cada copia debe mantenerse
+idéntica.
+"""
+import json
+import logging
+import time
+import uuid
+
+CORRELATION_HEADER = "X-Correlation-Id"
+_INCOMING_HEADERS = ("x-correlation-id", "x-request-id")
+
+metrics_logger = logging.getLogger("metrics")
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def correlation_id(headers=None):
+    """Id de la petición entrante o uno nuevo."""
+    lower = {str(k).lower(): v for k, v in (headers or {}).items()}
+    for name in _INCOMING_HEADERS:
+        value = str(lower.get(name) or "").strip()
+        if value:
+            return value[:128]
+    return uuid.uuid4().hex
+
+
+def new_trace(correlation=None, received_at=None):
+    return {"correlationId": correlation or uuid.uuid4().hex, "receivedAt": received_at or now_ms()}
+
+
+def stamp(trace):
+    """Copia del trace con la hora de encolado actual, para cada put_messages."""
+    stamped = {k: v for k, v in trace.items() if k != "dequeuedAt"}
+    stamped["enqueuedAt"] = now_ms()
+    return stamped
+
+
+def trace_metadata(trace):
+    """Campos de metadata del mensaje (la Queue solo acepta strings)."""
+    metadata = {"correlationId": str(trace["correlationId"])}
+    if "enqueuedAt" in trace:
+        metadata["enqueuedAt"] = str(trace["enqueuedAt"])
+    return metadata
+
+
+def read_trace(envelope):
+    """Trace del sobre con la hora de salida de la Queue (dequeuedAt).
+
+    Los mensajes anteriores a este cambio reciben un trace nuevo.
+    """
+    trace = envelope.get("trace") if isinstance(envelope, dict) else None
+    if not (isinstance(trace, dict) and trace.get("correlationId")):
+        trace = new_trace()
+    return dict(trace, dequeuedAt=now_ms())
+
+
+def dwell_ms(trace):
+    """Tiempo en la Queue desde el último encolado hasta la lectura (ms), o None."""
+    enqueued, dequeued = trace.get("enqueuedAt"), trace.get("dequeuedAt")
+    if isinstance(enqueued, int) and isinstance(dequeued, int):
+        return dequeued - enqueued
+    return None
+
+
+def observe(trace, channel, status, osb_ms=None):
+    """Registra una línea JSON con las latencias del evento y su estado final (HTTP o texto)."""
+    done = now_ms()
+    received = trace.get("receivedAt")
+    metrics_logger.info(json.dumps({
+        "metric": "queue_latency",
+        "correlationId": trace.get("correlationId"),
+        "channel": channel,
+        "status": status,
+        "dwell_ms": dwell_ms(trace),
+        "osb_ms": osb_ms,
+        "e2e_ms": done - received if isinstance(received, int) else None,
+    }))
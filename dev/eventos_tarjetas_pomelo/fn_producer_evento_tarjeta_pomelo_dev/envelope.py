@@ -0,0 +1,64 @@
+"""Formato del content de los mensajes en la Queue.
+
+El formato original (v1) es el sobre en JSON plano. El formato comprimido (v2)
+es opcional y se activa con ``QUEUE_COMPRESSION=zlib``: el sobre se comprime
+con zlib, se codifica en base64 y se guarda en un JSON mínimo que se describe
+a sí mismo, porque el Service Connector entrega el content sin la metadata:
+
+    {"envelopeVersion": "2", "contentEncoding": "zlib+base64", "data": "..."}
+
+La metadata del mensaje lleva la misma marca. ``decode`` acepta ambos formatos,
+así que las consumidoras leen mensajes v1 y v2 indistintamente. Se comparte
+entre productores y consumidoras; cada copia debe mantenerse idéntica.
+
+Variables de entorno:
+    QUEUE_COMPRESSION ("none")            -> "zlib" para escribir v2
+    QUEUE_COMPRESSION_MIN_BYTES (1024)    -> sobres más pequeños se dejan en v1
+    QUEUE_COMPRESSION_LEVEL (6)
+"""
+import base64
+import json
+import os
+import zlib
+
+ENVELOPE_VERSION = "2"
+CONTENT_ENCODING = "zlib+base64"
+
+COMPRESSION = os.getenv("QUEUE_COMPRESSION", "none").lower()
+COMPRESSION_MIN_BYTES = int(os.getenv("QUEUE_COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_LEVEL = int(os.getenv("QUEUE_COMPRESSION_LEVEL", "6"))
+
+
+def encode(body, compress=None):
+    """Serializa el sobre para la Queue. Devuelve (content, metadata adicional)."""
+    content = json.dumps(body)
+    if compress is None:
+        compress = COMPRESSION == "zlib"
+    if not compress or len(content) < COMPRESSION_MIN_BYTES:
+        return content, {}
+
+    data = base64.b64encode(zlib.compress(content.encode("utf-8"), COMPRESSION_LEVEL)).decode("ascii")
+    compressed = json.dumps({
+        "envelopeVersion": ENVELOPE_VERSION,
+        "contentEncoding": CONTENT_ENCODING,
+        "data": data,
+    })
+    if len(compressed) >= len(content):
+        return content, {}
+    return compressed, {"envelopeVersion": ENVELOPE_VERSION, "contentEncoding": CONTENT_ENCODING}
+
+
+def is_compressed(value):
+    return isinstance(value, dict) and value.get("contentEncoding") == CONTENT_ENCODING and "data" in value
+
+
+def decode(value):
+    """Devuelve el sobre original a partir del content (str) o del JSON ya parseado."""
+    if isinstance(value, (str, bytes)):
+        value = json.loads(value)
+    if is_compressed(value):
+        try:
+            return json.loads(zlib.decompress(base64.b64decode(value["data"])).decode("utf-8"))
+        except (ValueError, zlib.error) as e:
+            raise ValueError(f"content comprimido inválido: {e}")
+    return value
@@ -1,10 +1,19 @@
 import io
 import json
-import os
 import logging
+import sqlite3
+import threading
 import oci
 from fdk import response
 
+from envelope import encode
+from health import DeepProbe, health_mode, health_response
+from priority import lane_for, priority_for
+from queue_routing import all_queues, queue_for
+from spool import SpoolFull, spool_from_env
+from tracing import CORRELATION_HEADER, correlation_id, new_trace, stamp, trace_metadata
+from validation import check_body_size, check_message_size, validate
+
 # === CONFIGURACIÓN DE LOGGING ===
 logging.basicConfig(
     level=logging.INFO,
@@ -12,9 +21,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# === VARIABLES DE ENTORNO ===
-QUEUE_OCID = os.getenv("QUEUE_OCID")
-
 # === CANALES PERMITIDOS ===
 VALID_CHANNELS = {
     "CANAL_NOTIFICACIONES_POMELO",
@@ -22,13 +28,156 @@ VALID_CHANNELS = {
     "CANAL_EVENTOS_TARJETA"
 }
 
+# Mensajes que no se pudieron encolar; se reenvían en invocaciones siguientes (ver spool.py)
+_spool = spool_from_env()
+
+# Cliente de mensajes por Queue, reutilizado entre invocaciones: config, signer,
+# sesión HTTP y GetQueue se cargan una vez por instancia y no en cada petición
+_queue_lock = threading.Lock()
+_queue_clients = {}
+
+
+def _bad_request(ctx, message, status_code=400):
+    return response.Response(
+        ctx,
+        response_data=json.dumps({"code": status_code, "message": message}),
+        status_code=status_code,
+        headers={"Content-Type": "application/json"}
+    )
+
+
+def _queue_client(queue_id):
+    """Cliente de mensajes de la Queue, creado una vez por instancia y Queue."""
+    with _queue_lock:
+        if queue_id not in _queue_clients:
+            file_config = oci.config.from_file("config.oci")
+            admin = oci.queue.QueueAdminClient(config=file_config)
+            q = admin.get_queue(queue_id).data
+            queue_client = oci.queue.QueueClient(config=file_config)
+            queue_client.base_client.endpoint = q.messages_endpoint
+            _queue_clients[queue_id] = queue_client
+        return _queue_clients[queue_id]
+
+
+def _put_messages(queue_id, entries):
+    """Encola [(content, metadata), ...] y devuelve True por cada mensaje aceptado."""
+    queue_client = _queue_client(queue_id)
+    put_details = oci.queue.models.PutMessagesDetails(
+        messages=[
+            oci.queue.models.PutMessagesDetailsEntry(content=content, metadata=metadata)
+            for content, metadata in entries
+        ]
+    )
+    # Ante una falla se conserva el cliente: recrearlo repetiría GetQueue (con los
+    # reintentos del SDK) justo cuando la Queue no responde
+    resp = queue_client.put_messages(queue_id=queue_id, put_messages_details=put_details)
+    for msg in resp.data.messages:
+        logger.info(
+            f"Mensaje ID={msg.id}, ErrorCode={getattr(msg, 'error_code', None)}, "
+            f"ErrorMessage={getattr(msg, 'error_message', None)}"
+        )
+    return [not getattr(msg, "error_code", None) for msg in resp.data.messages]
+
+
+def _spool_message(ctx, queue_id, content, metadata, reason):
+    """Guarda el mensaje en el spool y responde 202; None si no hay spool o está lleno."""
+    if _spool is None:
+        return None
+    try:
+        _spool.append(queue_id, content, metadata)
+    except (SpoolFull, sqlite3.Error) as e:
+        logger.error(f"No se pudo guardar el mensaje en el spool: {e}")
+        return None
+    logger.warning(f"Mensaje guardado en el spool ({reason}); pendientes={len(_spool)}")
+    return response.Response(
+        ctx,
+        response_data=json.dumps({
+            "code": 202,
+            "status": "spooled",
+            "message": "Mensaje guardado en el spool local de la instancia, pendiente de envío a la cola",
+        }),
+        status_code=202,
+        headers={"Content-Type": "application/json", CORRELATION_HEADER: metadata.get("correlationId", "")}
+    )
+
+
+def _spool_if_pending(ctx, queue_id, content, metadata):
+    """Guarda el mensaje en el spool si la Queue falló hace poco o hay pendientes.
+
+    Con pendientes y sin falla reciente intenta un reenvío solo si no hay otro
+    en curso, así la petición no espera al hilo de fondo. None si el mensaje
+    puede enviarse directo a la Queue.
+    """
+    if _spool is None:
+        return None
+    if _spool.failing():
+        return _spool_message(ctx, queue_id, content, metadata, "falla reciente de la Queue")
+    if len(_spool):
+        sent = _spool.flush(_put_messages, blocking=False)
+        logger.info(f"Spool: {sent} mensaje(s) reenviados, pendientes={len(_spool)}")
+        if len(_spool):
+            return _spool_message(ctx, queue_id, content, metadata, "spool con pendientes")
+    return None
+
+
+def _queue_reachable():
+    for queue_id in all_queues():
+        _queue_client(queue_id).get_stats(queue_id)
+
+
+def _spool_drained():
+    """Reenvía lo pendiente del spool; falla si quedan mensajes sin enviar a la Queue."""
+    if len(_spool):
+        _spool.flush(_put_messages, blocking=False)
+    pending = len(_spool)
+    if pending:
+        raise RuntimeError(f"{pending} mensaje(s) pendientes en el spool")
+
+
+# Health check profundo: las Queues configuradas responden a GetStats y el spool
+# queda vacío (ver health.py y spool.py)
+_health_probe = DeepProbe({
+    "queue": _queue_reachable,
+    "spool": _spool_drained if _spool is not None else None,
+})
+
+# Reenvío de fondo del spool: no depende de que llegue otra petición a esta instancia
+if _spool is not None:
+    _spool.start_flusher(_put_messages)
+
 
 def handler(ctx, data: io.BytesIO = None):
+    # Health check: responde antes de leer el cuerpo, registrar logs o crear clientes
+    mode = health_mode(ctx)
+    if mode:
+        status_code, body = health_response(mode, _health_probe)
+        return response.Response(ctx, response_data=body, status_code=status_code,
+                                 headers={"Content-Type": "application/json"})
+
     logger.info("=== [Inicio de ejecución de la Function] ===")
 
+    # --- Validaciones locales, antes de cualquier trabajo con OCI ---
+    raw_body = data.getvalue() if data else b"{}"
+    size_error = check_body_size(raw_body)
+    if size_error:
+        logger.warning(f"Payload rechazado: {size_error}")
+        return _bad_request(ctx, size_error, 413)
+
+    headers = ctx.Headers() if hasattr(ctx, "Headers") else {}
+
+    # Obtener el canal del header
+    channel_queue = headers.get("channel_queue", "").strip()
+    if not channel_queue:
+        logger.warning("Header 'channel_queue' no encontrado o vacio.")
+        return _bad_request(ctx, "Parametro en header requerido")
+
+    # Validar canal permitido
+    if channel_queue not in VALID_CHANNELS:
+        logger.warning(f"Canal no permitido: {channel_queue}")
+        return _bad_request(ctx, "Canal no valido.")
+
     # --- Leer y parsear JSON ---
     try:
-        raw_body = data.getvalue() if data else b"{}"
         body_str = raw_body.decode("utf-8")
         logger.info(f"Payload recibido (raw): {body_str}")
 
@@ -36,108 +185,69 @@ def handler(ctx, data: io.BytesIO = None):
         logger.info("JSON parseado correctamente.")
     except Exception as e:
         logger.error(f"Error parseando JSON: {e}", exc_info=True)
+        return _bad_request(ctx, f"JSON inválido: {e}")
+
+    schema_error = validate(channel_queue, body)
+    if schema_error:
+        logger.warning(f"Payload inválido para {channel_queue}: {schema_error}")
+        return _bad_request(ctx, f"Payload inválido: {schema_error}")
+
+    # --- Preparar mensaje con canal y trace de correlación (ver tracing.py) ---
+    trace = stamp(new_trace(correlation_id(headers)))
+    enriched_body = {
+        "Channel": channel_queue,
+        "payload": body,
+        "trace": trace
+    }
+    content, envelope_metadata = encode(enriched_body)
+    size_error = check_message_size(content)
+    if size_error:
+        logger.warning(f"Payload rechazado: {size_error}")
+        return _bad_request(ctx, size_error, 413)
+
+    # Queue destino: carril de prioridad si la clase tiene uno (ver priority.py);
+    # si no, dedicada al canal o shard por tarjeta (ver queue_routing.py)
+    priority = priority_for(channel_queue, body)
+    shard_key = body.get("id") or body.get("idempotency_key") if isinstance(body, dict) else None
+    queue_id = lane_for(priority) or queue_for(channel_queue, shard_key)
+    if not queue_id:
+        logger.error("Variable de entorno QUEUE_OCID no configurada.")
         return response.Response(
             ctx,
-            response_data=json.dumps({"code": 400, "message": f"JSON inválido: {e}"}),
-            status_code=400,
+            response_data=json.dumps({
+                "code": 500,
+                "message": "Error interno en el proceso"
+            }),
+            status_code=500,
             headers={"Content-Type": "application/json"}
         )
 
-    # --- Validar Headers ---
+    metadata = {
+        "channelId": str(channel_queue),
+        "priority": priority,
+        **trace_metadata(trace),
+        **envelope_metadata
+    }
+
     try:
-        headers = ctx.Headers() if hasattr(ctx, "Headers") else {}
         logger.info("=== Headers recibidos ===")
         for k, v in headers.items():
             logger.info(f"{k}: {v}")
 
-        # Obtener el canal del header
-        channel_queue = headers.get("channel_queue", "").strip()
-        if not channel_queue:
-            logger.warning("Header 'channel_queue' no encontrado o vacio.")
-            return response.Response(
-                ctx,
-                response_data=json.dumps({
-                    "code": 400,
-                    "message": "Parametro en header requerido"
-                }),
-                status_code=400,
-                headers={"Content-Type": "application/json"}
-            )
-
-        # Validar canal permitido
-        if channel_queue not in VALID_CHANNELS:
-            logger.warning(f"Canal no permitido: {channel_queue}")
-            return response.Response(
-                ctx,
-                response_data=json.dumps({
-                    "code": 400,
-                    "message": f"Canal no valido."
-                }),
-                status_code=400,
-                headers={"Content-Type": "application/json"}
-            )
-
-        if not QUEUE_OCID:
-            logger.error("Variable de entorno QUEUE_OCID no configurada.")
-            return response.Response(
-                ctx,
-                response_data=json.dumps({
-                    "code": 500,
-                    "message": "Error interno en el proceso"
-                }),
-                status_code=500,
-                headers={"Content-Type": "application/json"}
-            )
-
-        # --- Configuración OCI ---
-        logger.info("Cargando configuración OCI desde 'config.oci'...")
-        file_config = oci.config.from_file("config.oci")
-        logger.info(f"Configuración cargada para el tenant: {file_config.get('tenancy')}")
-
-        # --- Obtener endpoint de la Queue ---
-        logger.info(f"Obteniendo endpoint de la Queue con OCID: {QUEUE_OCID}")
-        admin = oci.queue.QueueAdminClient(config=file_config)
-        q = admin.get_queue(QUEUE_OCID).data
-        messages_endpoint = q.messages_endpoint
-        logger.info(f"Endpoint de mensajes: {messages_endpoint}")
-
-        # --- Crear cliente de Queue ---
-        queue_client = oci.queue.QueueClient(config=file_config)
-        queue_client.base_client.endpoint = messages_endpoint
-        logger.info("Cliente de Queue configurado correctamente.")
-
-        # --- Preparar mensaje con canal ---
-        enriched_body = {
-            "Channel": channel_queue,
-            "payload": body
-        }
-        logger.info(f"Mensaje a encolar: {json.dumps(enriched_body)}")
-
-        put_details = oci.queue.models.PutMessagesDetails(
-            messages=[
-                oci.queue.models.PutMessagesDetailsEntry(
-                    content=json.dumps(enriched_body),
-                    metadata={
-                        "channelId": str(channel_queue)
-                    }
-                )
-            ]
-        )
+        logger.info(f"Mensaje a encolar: {content}")
 
-        # --- Enviar mensaje ---
-        logger.info(f"Enviando mensaje al canal '{channel_queue}' de la Queue...")
-        resp = queue_client.put_messages(
-            queue_id=QUEUE_OCID,
-            put_messages_details=put_details
-        )
+        # --- Con falla reciente de la Queue o pendientes en el spool, el mensaje va al
+        # spool detrás de los anteriores y el reenvío queda para el hilo de fondo ---
+        spooled = _spool_if_pending(ctx, queue_id, content, metadata)
+        if spooled is not None:
+            return spooled
 
+        # --- Enviar mensaje ---
+        logger.info(f"Enviando mensaje al canal '{channel_queue}' (prioridad {priority}) de la Queue {queue_id}...")
+        accepted = _put_messages(queue_id, [(content, metadata)])
+        if not all(accepted):
+            raise RuntimeError("la Queue rechazó el mensaje")
         logger.info("Mensaje encolado correctamente.")
-        for msg in resp.data.messages:
-            logger.info(
-                f"Mensaje ID={msg.id}, ErrorCode={getattr(msg, 'error_code', None)}, "
-                f"ErrorMessage={getattr(msg, 'error_message', None)}"
-            )
-
 
         return response.Response(
             ctx,
@@ -146,11 +256,16 @@ def handler(ctx, data: io.BytesIO = None):
                 "message": f"Mensaje encolado correctamente",
             }),
             status_code=202,
-            headers={"Content-Type": "application/json"}
+            headers={"Content-Type": "application/json", CORRELATION_HEADER: trace["correlationId"]}
         )
 
     except Exception as e:
         logger.exception(f"Error durante la ejecución: {e}")
+        if _spool is not None:
+            _spool.mark_failed()
+        spooled = _spool_message(ctx, queue_id, content, metadata, str(e))
+        if spooled is not None:
+            return spooled
         return response.Response(
             ctx,
             response_data=json.dumps({
@@ -0,0 +1,131 @@
+"""Health check uniforme para todas las funciones.
+
+El handler llama a ``health_mode(ctx)`` como primera instrucción: solo mira
+cabeceras y URL, así que el health check responde antes de leer el cuerpo,
+registrar logs, parsear o crear clientes.
+
+Se reconoce como health check:
+    - la cabecera ``health_check: true`` (recurso Health Check de OCI)
+    - una petición cuya ruta es exactamente HEALTH_PATH (API Gateway)
+y se pide el modo profundo con ``health_check: deep`` o ``<HEALTH_PATH>?deep=true``.
+La comparación es exacta (salvo la barra final) para no interceptar rutas
+reales que terminen en ``/health``, como ``/intents/health``. Si el
+deployment del API Gateway antepone un prefijo, HEALTH_PATH debe incluirlo
+(p. ej. ``/rest/b2b/fiducia/minka/v2/health``).
+
+El modo profundo ejecuta las comprobaciones de la función (alcance del OSB,
+GetStats de la Queue...) y guarda el resultado HEALTH_DEEP_TTL segundos por
+instancia: las sondas frecuentes dentro de ese intervalo reciben el resultado
+en caché y no generan tráfico hacia el OSB ni la Queue. Si varias sondas
+llegan a la vez mientras vence la caché, solo una ejecuta las comprobaciones.
+
+Variables de entorno:
+    HEALTH_PATH          ruta completa del health check (/health); vacía lo desactiva por URL
+    HEALTH_DEEP_TTL      segundos de validez del resultado profundo (60)
+    HEALTH_DEEP_TIMEOUT  timeout de cada comprobación HTTP (3)
+
+Se comparte entre funciones; cada copia debe mantenerse idéntica.
+"""
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import parse_qs, urlsplit
+
+HEALTH_PATH = os.getenv("HEALTH_PATH", "/health").rstrip("/")
+HEALTH_DEEP_TTL = float(os.getenv("HEALTH_DEEP_TTL", "60"))
+HEALTH_DEEP_TIMEOUT = float(os.getenv("HEALTH_DEEP_TIMEOUT", "3"))
+
+SHALLOW = "shallow"
+DEEP = "deep"
+_SHALLOW_BODY = json.dumps({"status": "ok"})
+_UNAVAILABLE = {502, 503, 504}
+
+
+def health_mode(ctx):
+    """None si la invocación no es un health check; SHALLOW o DEEP si lo es."""
+    headers = (ctx.Headers() if hasattr(ctx, "Headers") else None) or {}
+    value = headers.get("health_check")
+    if isinstance(value, list):
+        value = value[0] if value else None
+    if value:
+        value = str(value).strip().lower()
+        if value == DEEP:
+            return DEEP
+        if value == "true":
+            return SHALLOW
+
+    request_url = ctx.RequestURL() if hasattr(ctx, "RequestURL") else None
+    if not request_url or not HEALTH_PATH:
+        return None
+    parts = urlsplit(request_url)
+    if parts.path.rstrip("/") != HEALTH_PATH:
+        return None
+    deep = parse_qs(parts.query).get("deep", [""])[0].lower()
+    return DEEP if deep in ("1", "true") else SHALLOW
+
+
+def http_reachable(url, timeout=None):
+    """Lanza excepción si ``url`` no responde por HTTP o responde 502/503/504.
+
+    Cualquier otra respuesta (401, 404, 405, 501...) cuenta como alcanzable:
+    la sonda va sin credenciales ni cuerpo y solo comprueba red, DNS, TLS y
+    que el servicio esté atendiendo.
+    """
+    request = urllib.request.Request(url, method="HEAD")
+    try:
+        with urllib.request.urlopen(request, timeout=timeout or HEALTH_DEEP_TIMEOUT) as r:
+            status = r.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    if status in _UNAVAILABLE:
+        raise RuntimeError(f"HTTP {status}")
+
+
+def _run_check(check):
+    started = time.monotonic()
+    try:
+        check()
+        result = {"ok": True}
+    except Exception as e:
+        result = {"ok": False, "error": str(e)[:200]}
+    result["ms"] = round(1000 * (time.monotonic() - started), 1)
+    return result
+
+
+class DeepProbe:
+    """Comprobaciones profundas {nombre: callable} con resultado en caché.
+
+    Un callable que lanza excepción es una comprobación fallida. Las entradas
+    con valor None (destino no configurado) se omiten.
+    """
+
+    def __init__(self, checks, ttl=None):
+        self._checks = {name: check for name, check in checks.items() if check is not None}
+        self._ttl = HEALTH_DEEP_TTL if ttl is None else ttl
+        self._lock = threading.Lock()
+        self._result = None
+        self._checked_at = 0.0
+
+    def result(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._result is not None and now - self._checked_at < self._ttl:
+                return dict(self._result, cached=True, age=round(now - self._checked_at, 1))
+            checks = {name: _run_check(check) for name, check in self._checks.items()}
+            self._result = {
+                "status": "ok" if all(c["ok"] for c in checks.values()) else "degraded",
+                "checks": checks,
+            }
+            self._checked_at = time.monotonic()
+            return dict(self._result, cached=False, age=0.0)
+
+
+def health_response(mode, probe=None):
+    """(status_code, cuerpo JSON) de la respuesta al health check; 503 si falla alguna comprobación."""
+    if mode != DEEP or probe is None:
+        return 200, _SHALLOW_BODY
+    result = probe.result()
+    return (200 if result["status"] == "ok" else 503), json.dumps(result)
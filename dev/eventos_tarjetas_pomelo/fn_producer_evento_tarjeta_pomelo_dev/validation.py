@@ -0,0 +1,189 @@
+"""Validación temprana de las peticiones de los productores.
+
+Los esquemas se compilan una sola vez al importar el módulo en funciones
+anidadas, así que validar un cuerpo no recorre el esquema en cada petición.
+Se comparte entre los productores; cada copia de este archivo debe mantenerse
+idéntica.
+
+Límites (variables de entorno):
+    MAX_BODY_BYTES (65536)            -> tamaño máximo del cuerpo recibido
+    QUEUE_MAX_MESSAGE_BYTES (131072)  -> tamaño máximo del content encolado
+"""
+import os
+
+MAX_BODY_BYTES = int(os.getenv("MAX_BODY_BYTES", "65536"))
+QUEUE_MAX_MESSAGE_BYTES = int(os.getenv("QUEUE_MAX_MESSAGE_BYTES", "131072"))
+
+_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+}
+
+
+def compile_schema(schema, path="$"):
+    """Convierte un esquema (subconjunto de JSON Schema) en un validador.
+
+    Soporta ``type``, ``properties``, ``required``, ``enum`` y ``maxLength``.
+    El validador devuelve None si el valor es válido o el primer error.
+    """
+    checks = []
+
+    expected = schema.get("type")
+    if expected:
+        py_type = _TYPES[expected]
+
+        def check_type(value, py_type=py_type, expected=expected):
+            # bool es subclase de int: no se acepta como número
+            if not isinstance(value, py_type) or (isinstance(value, bool) and expected != "boolean"):
+                return f"{path}: se esperaba {expected}"
+        checks.append(check_type)
+
+    if "enum" in schema:
+        allowed = frozenset(schema["enum"])
+
+        def check_enum(value, allowed=allowed):
+            if value not in allowed:
+                return f"{path}: valor no permitido {value!r}"
+        checks.append(check_enum)
+
+    if "maxLength" in schema:
+        max_length = schema["maxLength"]
+
+        def check_length(value, max_length=max_length):
+            if len(value) > max_length:
+                return f"{path}: supera {max_length} caracteres"
+        checks.append(check_length)
+
+    required = tuple(schema.get("required", ()))
+    if required:
+        def check_required(value, required=required):
+            for name in required:
+                if name not in value:
+                    return f"{path}.{name}: requerido"
+        checks.append(check_required)
+
+    properties = [
+        (name, compile_schema(sub, f"{path}.{name}"))
+        for name, sub in schema.get("properties", {}).items()
+    ]
+    if properties:
+        def check_properties(value, properties=properties):
+            for name, validate in properties:
+                if name in value:
+                    error = validate(value[name])
+                    if error:
+                        return error
+        checks.append(check_properties)
+
+    def validate(value):
+        for check in checks:
+            error = check(value)
+            if error:
+                return error
+        return None
+    return validate
+
+
+_STR = {"type": "string", "maxLength": 256}
+
+# --- Pomelo ---
+POMELO_CARD_EVENT = {
+    "type": "object",
+    "required": ["event_id", "id", "user_id", "event", "card_type", "idempotency_key"],
+    "properties": {
+        "event_id": _STR,
+        "id": _STR,
+        "updated_at": _STR,
+        "user_id": _STR,
+        "event": _STR,
+        "card_type": _STR,
+        "related_card_id": _STR,
+        "idempotency_key": _STR,
+    },
+}
+
+POMELO_ACTIVITY = {
+    "type": "object",
+    "required": ["idempotency_key", "type", "activity"],
+    "properties": {
+        "idempotency_key": _STR,
+        "datetime": _STR,
+        "type": _STR,
+        "version": _STR,
+        "activity": {"type": "object"},
+    },
+}
+
+POMELO_NOTIFICATION = {"type": "object"}
+
+# --- Minka ---
+_MINKA_INTENT = {
+    "type": "object",
+    "properties": {
+        "data": {"type": "object", "properties": {"handle": _STR}},
+        "meta": {"type": "object"},
+    },
+}
+
+MINKA_PREPARED = {
+    "type": "object",
+    "required": ["data"],
+    "properties": {
+        "data": {
+            "type": "object",
+            "required": ["handle", "intent"],
+            "properties": {"handle": _STR, "amount": {"type": "number"}, "intent": _MINKA_INTENT},
+        },
+    },
+}
+
+MINKA_TRANSITION = {
+    "type": "object",
+    "required": ["data"],
+    "properties": {
+        "data": {"type": "object", "properties": {"handle": _STR, "intent": _MINKA_INTENT}},
+    },
+}
+
+MINKA_COMPLETED = {
+    "type": "object",
+    "required": ["data"],
+    "properties": {
+        "data": {"type": "object", "required": ["intent"], "properties": {"intent": _MINKA_INTENT}},
+    },
+}
+
+VALIDATORS = {
+    "CANAL_EVENTOS_TARJETA": compile_schema(POMELO_CARD_EVENT),
+    "CANAL_NOTIFICACIONES_ACTIVIDADES": compile_schema(POMELO_ACTIVITY),
+    "CANAL_NOTIFICACIONES_POMELO": compile_schema(POMELO_NOTIFICATION),
+    "Prepared": compile_schema(MINKA_PREPARED),
+    "Aborted": compile_schema(MINKA_TRANSITION),
+    "Committed": compile_schema(MINKA_TRANSITION),
+    "Completed": compile_schema(MINKA_COMPLETED),
+}
+
+
+def validate(channel, body):
+    """Valida el cuerpo según el canal. Devuelve None o el primer error."""
+    validator = VALIDATORS.get(channel)
+    if validator is None:
+        return f"canal sin esquema: {channel}"
+    return validator(body)
+
+
+def check_body_size(raw_body):
+    if len(raw_body) > MAX_BODY_BYTES:
+        return f"el cuerpo supera {MAX_BODY_BYTES} bytes"
+    return None
+
+
+def check_message_size(content):
+    size = len(content.encode("utf-8"))
+    if size > QUEUE_MAX_MESSAGE_BYTES:
+        return f"el mensaje ({size} bytes) supera el límite de la Queue ({QUEUE_MAX_MESSAGE_BYTES} bytes)"
+    return None
@@ -3,21 +3,60 @@ import json
 import os
 import requests
 import logging
-import oci
+import math
+import random
+import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from concurrency import AdaptiveConcurrencyLimiter
+from envelope import decode, encode
+from health import DeepProbe, health_mode, health_response, http_reachable
+from intent_state import STATE_RANK, decide, store_from_env
+from queue_routing import queue_for
+from rate_limiter import RateLimiter
+from token_provider import authorization_from_env
+from tracing import CORRELATION_HEADER, observe, read_trace, stamp, trace_metadata
 
 # === CONFIGURACIÓN GENERAL ===
 OSB_BASE_URL = os.getenv("OSB_BASE_URL")  
-OSB_AUTH = os.getenv("OSB_AUTH")          
 QUEUE_OCID = os.getenv("QUEUE_OCID")
 MAX_RETRIES = int(os.getenv("MAX_RETRIES", "3"))
 VISIBILITY_DELAY = int(os.getenv("VISIBILITY_DELAY", "120")) 
+# Heartbeat de visibilidad: cada HEARTBEAT_INTERVAL segundos se extiende la
+# visibilidad de los mensajes en proceso a VISIBILITY_EXTENSION segundos.
+VISIBILITY_EXTENSION = int(os.getenv("VISIBILITY_EXTENSION", "60"))
+HEARTBEAT_INTERVAL = int(os.getenv("HEARTBEAT_INTERVAL", "20"))
+UPDATE_MESSAGES_MAX_ENTRIES = 20
+PUT_MESSAGES_MAX_ENTRIES = 20
+# Presupuesto de tiempo por invocación (debe coincidir con timeout de func.yaml)
+FUNCTION_TIMEOUT = int(os.getenv("FUNCTION_TIMEOUT", "120"))
+OSB_TIMEOUT = int(os.getenv("OSB_TIMEOUT", "15"))
+DEADLINE_MARGIN = int(os.getenv("DEADLINE_MARGIN", "10"))
+# Límite de tasa por canal hacia el OSB (ver rate_limiter.py); los eventos que
+# exceden el límite se difieren a la Queue con el retraso sugerido más un jitter.
+RATE_LIMIT_JITTER = int(os.getenv("RATE_LIMIT_JITTER", "5"))
+# Transiciones cuyo predecesor aún no se entregó al OSB se difieren
+# STATE_DEFER_DELAY segundos; tras MAX_STATE_DEFERRALS se envían de todos modos.
+STATE_DEFER_DELAY = int(os.getenv("STATE_DEFER_DELAY", "30"))
+MAX_STATE_DEFERRALS = int(os.getenv("MAX_STATE_DEFERRALS", "3"))
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO,
                     format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger()
 
+_rate_limiter = RateLimiter.from_env()
+# Header Authorization hacia el OSB: token OAuth en caché o OSB_AUTH (ver token_provider.py)
+_authorization, _token_provider = authorization_from_env("OSB_AUTH")
+# Concurrencia hacia el OSB ajustada por latencia/errores (ver concurrency.py);
+# se conserva entre invocaciones de la misma instancia.
+_concurrency = AdaptiveConcurrencyLimiter.from_env()
+# Último estado entregado por intent (ver intent_state.py)
+_intent_states = store_from_env()
+_shared_states = getattr(_intent_states, "shared", True)
+
 
 def _get_header(headers: dict, name: str):
     if not headers:
@@ -26,50 +65,206 @@ def _get_header(headers: dict, name: str):
     return lower.get(name.lower())
 
 
-def _send_back_to_queue(payload, channel, path_params):
-    """Reenvía el mensaje a la Queue OCI con retraso de visibilidad."""
+_queue_lock = threading.Lock()
+_queue_state = {}
+
+
+def _get_queue_state(queue_id=None):
+    """Carga una sola vez por Queue la configuración OCI, el signer y el cliente de mensajes.
+
+    Sin ``queue_id`` se usa QUEUE_OCID, la Queue de la que lee esta consumidora.
+    """
+    queue_id = queue_id or QUEUE_OCID
+    with _queue_lock:
+        if queue_id not in _queue_state:
+            # oci se importa con el primer cliente: entregar al OSB no lo usa y
+            # cargarlo ocupa ~40 MB de la memoria de la función
+            import oci
+
+            file_config = oci.config.from_file("config.oci")
+            signer = oci.signer.Signer(
+                tenancy=file_config["tenancy"],
+                user=file_config["user"],
+                fingerprint=file_config["fingerprint"],
+                private_key_file_location=file_config["key_file"]
+            )
+
+            admin = oci.queue.QueueAdminClient(config=file_config)
+            q = admin.get_queue(queue_id).data
+
+            client = oci.queue.QueueClient(config=file_config)
+            client.base_client.endpoint = q.messages_endpoint
+
+            _queue_state[queue_id] = {
+                "signer": signer,
+                "messages_endpoint": q.messages_endpoint,
+                "client": client,
+            }
+        return _queue_state[queue_id]
+
+
+def _extend_visibility(receipts):
+    """Extiende la visibilidad de los mensajes en proceso con UpdateMessages."""
+    if not receipts:
+        return
     try:
-        file_config = oci.config.from_file("config.oci")
-        signer = oci.signer.Signer(
-            tenancy=file_config["tenancy"],
-            user=file_config["user"],
-            fingerprint=file_config["fingerprint"],
-            private_key_file_location=file_config["key_file"]
-        )
-
-        admin = oci.queue.QueueAdminClient(config=file_config)
-        q = admin.get_queue(QUEUE_OCID).data
-        messages_endpoint = q.messages_endpoint
-
-        enriched_body = {"payload": payload, "pathParams": path_params, "channel": channel}
-        message_data = {
-            "messages": [
-                {
-                    "content": json.dumps(enriched_body),
-                    "metadata": {"channelId": str(channel)},
-                    "deliveryDelayInSeconds": VISIBILITY_DELAY
-                }
+        import oci
+
+        client = _get_queue_state()["client"]
+        for i in range(0, len(receipts), UPDATE_MESSAGES_MAX_ENTRIES):
+            entries = [
+                oci.queue.models.UpdateMessagesDetailsEntry(
+                    receipt=receipt,
+                    visibility_in_seconds=VISIBILITY_EXTENSION
+                )
+                for receipt in receipts[i:i + UPDATE_MESSAGES_MAX_ENTRIES]
             ]
-        }
+            client.update_messages(
+                queue_id=QUEUE_OCID,
+                update_messages_details=oci.queue.models.UpdateMessagesDetails(entries=entries)
+            )
+        logger.info(f"Visibilidad extendida {VISIBILITY_EXTENSION}s para {len(receipts)} mensaje(s)")
+    except Exception as e:
+        logger.error(f"Error extendiendo visibilidad: {e}")
 
-        url = f"{messages_endpoint}/20210201/queues/{QUEUE_OCID}/messages"
-        headers = {"Content-Type": "application/json"}
 
-        response = requests.post(url, data=json.dumps(message_data),
-                                 headers=headers, auth=signer)
+class _VisibilityHeartbeat:
+    """Mantiene invisibles los mensajes mientras se procesan.
+
+    Un hilo en segundo plano llama a UpdateMessages cada HEARTBEAT_INTERVAL
+    segundos para los receipts pendientes; cada mensaje se retira con
+    ``done(receipt)`` al terminar y el hilo se detiene al salir del bloque.
+    """
+
+    def __init__(self, receipts):
+        self._pending = [r for r in receipts if r]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        if self._pending and QUEUE_OCID:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        return False
+
+    def done(self, receipt):
+        with self._lock:
+            if receipt in self._pending:
+                self._pending.remove(receipt)
 
-        if response.status_code == 200:
-            logger.info(f"Mensaje reenviado a Queue (retry={payload.get('retry_count', 0)}, delay={VISIBILITY_DELAY}s)")
-            return True
+    def _run(self):
+        while not self._stop.wait(HEARTBEAT_INTERVAL):
+            with self._lock:
+                receipts = list(self._pending)
+            if not receipts:
+                break
+            _extend_visibility(receipts)
+
+
+def _message_ref(ev):
+    """Devuelve (receipt, id) si el elemento es un mensaje crudo de la Queue."""
+    if isinstance(ev, dict) and "receipt" in ev and "content" in ev:
+        return ev.get("receipt"), ev.get("id")
+    return None, None
+
+
+def _parse_event(ev):
+    """Normaliza un elemento del lote a (payload, channel, path_params, retry_count, trace).
+
+    Acepta el evento plano o un mensaje crudo de la Queue (con content y
+    receipt), en formato JSON plano o comprimido (ver envelope.py).
+    Lanza ValueError si el elemento no tiene la forma esperada.
+    """
+    try:
+        if isinstance(ev, dict) and "receipt" in ev and "content" in ev:
+            ev = decode(ev.get("content"))
         else:
-            logger.error(f"Error reenviando mensaje (HTTP {response.status_code}): {response.text}")
-            return False
+            ev = decode(ev)
+    except ValueError as e:
+        raise ValueError(f"content no es JSON válido: {e}")
+    if not isinstance(ev, dict):
+        raise ValueError(f"evento con tipo no soportado: {type(ev).__name__}")
+
+    payload = ev.get("payload", {})
+    if payload is None:
+        payload = {}
+    if not isinstance(payload, dict):
+        raise ValueError(f"payload con tipo no soportado: {type(payload).__name__}")
+
+    channel = ev.get("channel", "unknown")
+    # Si el pathParams viene dentro de payload (estructura anidada)
+    path_params = ev.get("pathParams") or payload.get("pathParams", "")
+
+    try:
+        retry_count = int(payload.get("retry_count", 0) or 0)
+    except (TypeError, ValueError):
+        raise ValueError(f"retry_count inválido: {payload.get('retry_count')!r}")
+
+    return payload, channel, path_params, retry_count, read_trace(ev)
+
+
+def _put_to_queue(entries):
+    """Publica varios mensajes con una llamada por Queue destino y bloque de 20.
+
+    Cada entrada es una tupla (payload, channel, path_params, delay, trace). La Queue
+    destino se resuelve por canal o shard del intent (ver queue_routing.py),
+    igual que en la productora.
+    """
+    try:
+        by_queue = OrderedDict()
+        for entry in entries:
+            payload, channel, path_params = entry[:3]
+            shard_key = _dig(payload, "data", "intent", "data", "handle") or path_params
+            by_queue.setdefault(queue_for(channel, shard_key) or QUEUE_OCID, []).append(entry)
+
+        headers = {"Content-Type": "application/json"}
+        for queue_id, queue_entries in by_queue.items():
+            queue_state = _get_queue_state(queue_id)
+            signer = queue_state["signer"]
+            messages_endpoint = queue_state["messages_endpoint"]
+            url = f"{messages_endpoint}/20210201/queues/{queue_id}/messages"
+
+            for i in range(0, len(queue_entries), PUT_MESSAGES_MAX_ENTRIES):
+                messages = []
+                for payload, channel, path_params, delay, trace in queue_entries[i:i + PUT_MESSAGES_MAX_ENTRIES]:
+                    trace = stamp(trace)
+                    enriched_body = {"payload": payload, "pathParams": path_params, "channel": channel,
+                                     "trace": trace}
+                    content, envelope_metadata = encode(enriched_body)
+                    messages.append({
+                        "content": content,
+                        "metadata": {"channelId": str(channel), **trace_metadata(trace), **envelope_metadata},
+                        "deliveryDelayInSeconds": delay
+                    })
+
+                response = requests.post(url, data=json.dumps({"messages": messages}),
+                                         headers=headers, auth=signer)
+
+                if response.status_code != 200:
+                    logger.error(f"Error reenviando mensaje (HTTP {response.status_code}): {response.text}")
+                    return False
+        return True
 
     except Exception as e:
         logger.error(f"Error reenviando a la Queue: {e}")
         return False
 
 
+def _send_back_to_queue(payload, channel, path_params, trace):
+    """Reenvía el mensaje a la Queue OCI con retraso de visibilidad."""
+    ok = _put_to_queue([(payload, channel, path_params, VISIBILITY_DELAY, trace)])
+    if ok:
+        logger.info(f"Mensaje reenviado a Queue (retry={payload.get('retry_count', 0)}, delay={VISIBILITY_DELAY}s)")
+    return ok
+
+
 def _build_osb_endpoint(channel, path_params):
     if not OSB_BASE_URL:
         raise ValueError("OSB_BASE_URL no configurado en variables de entorno.")
@@ -85,73 +280,339 @@ def _build_osb_endpoint(channel, path_params):
     return OSB_BASE_URL
 
 
-def handler(ctx, data: io.BytesIO = None):
+def _acquire_slot(deadline):
+    """Espera un slot de concurrencia hacia el OSB sin pasar del plazo de la invocación.
+
+    Con ``deadline`` la espera dura como máximo hasta que el tiempo restante ya
+    no alcanza para OSB_TIMEOUT más DEADLINE_MARGIN, y al obtener el slot se
+    vuelve a comprobar. Devuelve False (sin slot) si no se puede iniciar la
+    llamada a tiempo.
+    """
+    if deadline is None:
+        return _concurrency.acquire()
+    budget = deadline - time.monotonic() - OSB_TIMEOUT - DEADLINE_MARGIN
+    if budget < 0 or not _concurrency.acquire(timeout=budget):
+        return False
+    if deadline - time.monotonic() < OSB_TIMEOUT + DEADLINE_MARGIN:
+        _concurrency.cancel()
+        return False
+    return True
+
+
+def _process_event(payload, channel, path_params, retry_count, trace):
+    """Envía un evento al OSB y lo reencola si falla. Devuelve el resultado.
+
+    Se llama con un slot de concurrencia ya obtenido (ver ``_acquire_slot``),
+    que se libera aquí.
+    """
+    logger.info("=== Evento recibido ===")
+    logger.info(f"Channel: {channel}, correlationId: {trace['correlationId']}")
+    logger.info(f"PathParams: {json.dumps(path_params)}")
+    logger.info(f"Payload: {json.dumps(payload)[:500]}")
+
+    outcome = "succeeded"
+    osb_ms = None
+    slot_held = True
     try:
-        raw_body = data.getvalue() if data else b"{}"
-        event = json.loads(raw_body.decode("utf-8"))
+        osb_endpoint = _build_osb_endpoint(channel, path_params)
+        logger.info(f"Endpoint OSB seleccionado: {osb_endpoint}")
+
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": _authorization(),
+            "Channel": channel,
+            "Retry-Count": str(retry_count),
+            CORRELATION_HEADER: trace["correlationId"]
+        }
+        status = None
+        send = requests.put if channel == "Completed" else requests.post
+        started = time.monotonic()
+        slot_held = False
+        response = _concurrency.run(send, osb_endpoint, json=payload, headers=headers,
+                                    timeout=OSB_TIMEOUT, verify=True)
+        osb_ms = int(1000 * (time.monotonic() - started))
+        status = response.status_code
+
+        logger.info(f"Solicitud enviada a OSB: {osb_endpoint}, status={status}")
+        logger.info(f"Respuesta OSB: {response.text[:500]}")
+
+        if status == 401 and _token_provider:
+            _token_provider.invalidate(headers["Authorization"])
+        if status >= 400:
+            raise Exception(f"HTTP {status}")
+
     except Exception as e:
-        logger.error(f"Invalid JSON: {e}")
-        return (400, json.dumps({"error": f"Invalid JSON: {e}"}))
+        if slot_held:
+            # Falló antes de llamar al OSB (endpoint o token): el slot no se usó
+            _concurrency.cancel()
+            slot_held = False
+        retry_count += 1
+        payload["retry_count"] = retry_count
+        logger.error(f"Error enviando a OSB: {str(e)}. Reintento #{retry_count}")
 
-    results = []
-    events = event if isinstance(event, list) else [event]
+        if retry_count <= MAX_RETRIES:
+            ok = _send_back_to_queue(payload, channel, path_params, trace)
+            status = f"requeued (retry #{retry_count})" if ok else f"failed to requeue (retry #{retry_count})"
+            outcome = "succeeded" if ok else "failed"
+        else:
+            status = f"max retries exceeded ({MAX_RETRIES})"
+            outcome = "rejected"
 
-    for ev in events:
-        payload = ev.get("payload", {})
-        channel = ev.get("channel", "unknown")
-        # Si el pathParams viene dentro de payload (estructura anidada)
-        path_params = ev.get("pathParams") or ev.get("payload", {}).get("pathParams", "")
-        retry_count = payload.get("retry_count", 0)
-        logger.info(f"EVENTO: {json.dumps(ev)}")
-        logger.info("=== Evento recibido ===")
-        logger.info(f"Channel: {channel}")
-        logger.info(f"PathParams: {json.dumps(path_params)}")
-        logger.info(f"Payload: {json.dumps(payload)[:500]}")
+    observe(trace, channel, status, osb_ms)
+    return {
+        "channel": channel,
+        "status": status,
+        "retry_count": retry_count,
+        "outcome": outcome
+    }
 
-        try:
-            osb_endpoint = _build_osb_endpoint(channel, path_params)
-            logger.info(f"Endpoint OSB seleccionado: {osb_endpoint}")
-
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": OSB_AUTH,
-                "Channel": channel,
-                "Retry-Count": str(retry_count)
-            }
-            status = None
-            if channel == "Completed":
-                response = requests.put(osb_endpoint, json=payload, headers=headers, timeout=15, verify=True)
-                status = response.status_code
-            else:
-                response = requests.post(osb_endpoint, json=payload, headers=headers, timeout=15, verify=True)
-                status = response.status_code
 
-            logger.info(f"Solicitud enviada a OSB: {osb_endpoint}, status={status}")
-            logger.info(f"Respuesta OSB: {response.text[:500]}")
+def _requeue_pending(pending, reason):
+    """Devuelve a la Queue, en un solo lote y sin consumir reintentos, eventos no enviados.
+
+    Cada elemento de ``pending`` es (evento normalizado, id, retraso en segundos).
+    """
+    entries = [
+        (payload, channel, path_params, delay, trace)
+        for (payload, channel, path_params, _, trace), _, delay in pending
+    ]
+    ok = _put_to_queue(entries)
+    logger.warning(f"{len(entries)} evento(s) diferidos ({reason}), reencolados={ok}")
+
+    return [
+        {
+            "id": message_id,
+            "channel": channel,
+            "status": f"deferred ({reason})" if ok else f"failed to requeue ({reason})",
+            "retry_count": retry_count,
+            "outcome": "succeeded" if ok else "failed"
+        }
+        for (_, channel, _, retry_count, _), message_id, _ in pending
+    ]
+
+
+def _dig(obj, *keys):
+    """Recorre diccionarios anidados; devuelve None si algún nivel no es dict."""
+    for key in keys:
+        if not isinstance(obj, dict):
+            return None
+        obj = obj.get(key)
+    return obj
+
+
+def _intent_key(parsed, message_id):
+    """Clave del intent para no procesar en paralelo transiciones del mismo débito."""
+    payload, _, path_params = parsed[:3]
+    return _dig(payload, "data", "intent", "data", "handle") or path_params or message_id
+
+
+def _state_keys(parsed):
+    """Claves con las que se registra el estado: intent handle, handle del débito y pathParams."""
+    payload, _, path_params = parsed[:3]
+    keys = [
+        _dig(payload, "data", "intent", "data", "handle"),
+        _dig(payload, "data", "handle"),
+        path_params,
+    ]
+    return [str(k) for k in keys if k and isinstance(k, (str, int))]
+
+
+def _last_state(keys):
+    try:
+        states = [_intent_states.get(k) for k in keys]
+    except Exception as e:
+        logger.error(f"Error consultando el estado del intent: {e}")
+        return None
+    states = [st for st in states if st in STATE_RANK]
+    return max(states, key=STATE_RANK.get) if states else None
+
+
+def _state_deferrals(payload):
+    value = payload.get("state_deferrals", 0)
+    return value if isinstance(value, int) else 0
+
+
+def _schedule(parsed):
+    """Decide si la transición se envía, se difiere o ya fue superada."""
+    payload, channel = parsed[0], parsed[1]
+    last_state = _last_state(_state_keys(parsed))
+    decision = decide(last_state, channel, _shared_states)
+    if decision == "defer" and _state_deferrals(payload) >= MAX_STATE_DEFERRALS:
+        logger.warning(f"Predecesor de {channel} no confirmado tras {MAX_STATE_DEFERRALS} esperas: se envía")
+        decision = "send"
+    return decision, last_state
+
 
-            if status >= 400:
-                raise Exception(f"HTTP {status}")
+def _delivered(result):
+    """True si el OSB aceptó la transición (HTTP < 400)."""
+    status = result.get("status")
+    return isinstance(status, int) and status < 400
 
+
+def _record_delivery(parsed, result):
+    if _delivered(result) and parsed[1] in STATE_RANK:
+        try:
+            for key in _state_keys(parsed):
+                _intent_states.set(key, parsed[1])
         except Exception as e:
-            retry_count += 1
-            payload["retry_count"] = retry_count
-            logger.error(f"Error enviando a OSB: {str(e)}. Reintento #{retry_count}")
+            logger.error(f"Error registrando el estado del intent: {e}")
 
-            if retry_count <= MAX_RETRIES:
-                ok = _send_back_to_queue(payload, channel, path_params)
-                status = f"requeued (retry #{retry_count})" if ok else f"failed to requeue (retry #{retry_count})"
-            else:
-                status = f"max retries exceeded ({MAX_RETRIES})"
 
-        results.append({
-            "channel": channel,
-            "status": status,
-            "retry_count": retry_count
-        })
+def process_batch(events, deadline=None):
+    """Procesa un lote manteniendo la visibilidad de los mensajes que traen receipt.
+
+    Cada elemento se aísla: uno malformado se marca ``rejected`` sin afectar al
+    resto. Los eventos de intents distintos se envían en paralelo (con la
+    concurrencia adaptativa de ``_concurrency``); los del mismo intent, en orden.
+    Si se indica ``deadline`` (time.monotonic()), no se inicia una llamada al
+    OSB cuando el tiempo restante no alcanza para OSB_TIMEOUT más
+    DEADLINE_MARGIN, tampoco tras esperar un slot de concurrencia; los eventos
+    pendientes se reencolan juntos. Los eventos que exceden el límite de tasa
+    de su canal se difieren en otro lote.
+    Antes de llamar al OSB se consulta el último estado entregado del intent:
+    las transiciones ya superadas se descartan y las que aún no tienen su
+    predecesor entregado se difieren sin consumir reintentos. Dentro del
+    lote, si una transición de un intent falla o se difiere, las siguientes
+    del mismo intent se difieren STATE_DEFER_DELAY segundos sin llamar al
+    OSB, aunque el almacén de estados sea por instancia.
+    """
+    results = []
+    partitions = OrderedDict()
+    for index, ev in enumerate(events):
+        receipt, message_id = _message_ref(ev)
+        message_id = message_id if message_id is not None else str(index)
+        try:
+            parsed = _parse_event(ev)
+        except ValueError as e:
+            logger.error(f"Mensaje {message_id} descartado por formato inválido: {e}")
+            results.append({"id": message_id, "status": f"invalid: {e}", "outcome": "rejected"})
+            continue
+        partitions.setdefault(_intent_key(parsed, message_id), []).append((parsed, receipt, message_id))
+
+    unstarted = []
+    rate_limited = []
+    held_back = []
+    pending_lock = threading.Lock()
+
+    def hold_back(parsed, receipt, message_id):
+        parsed[0]["state_deferrals"] = _state_deferrals(parsed[0]) + 1
+        with pending_lock:
+            held_back.append((parsed, message_id, STATE_DEFER_DELAY))
+        heartbeat.done(receipt)
+
+    def run_partition(items):
+        out = []
+        # Dentro de un intent, primero las transiciones anteriores
+        items = sorted(items, key=lambda item: STATE_RANK.get(item[0][1], 0))
+        # Transición del intent que no llegó al OSB en este lote
+        blocked = None
+        for pos, (parsed, receipt, message_id) in enumerate(items):
+            if blocked is not None:
+                logger.info(f"Mensaje {message_id} ({parsed[1]}) diferido: {blocked} del mismo intent no se entregó")
+                hold_back(parsed, receipt, message_id)
+                continue
+            decision, last_state = _schedule(parsed)
+            if decision == "superseded":
+                logger.info(f"Mensaje {message_id} ({parsed[1]}) superado por {last_state}: no se envía")
+                heartbeat.done(receipt)
+                out.append({
+                    "id": message_id,
+                    "channel": parsed[1],
+                    "status": f"superseded ({last_state})",
+                    "retry_count": parsed[3],
+                    "outcome": "succeeded"
+                })
+                continue
+            if decision == "defer":
+                hold_back(parsed, receipt, message_id)
+                blocked = parsed[1]
+                continue
+            if not _acquire_slot(deadline):
+                with pending_lock:
+                    unstarted.extend((p, m, 0) for p, _, m in items[pos:])
+                break
+            wait = _rate_limiter.try_acquire(parsed[1])
+            if wait > 0:
+                _concurrency.cancel()
+                # Se difiere también el resto del intent para no alterar el orden
+                delay = math.ceil(wait + random.uniform(0, RATE_LIMIT_JITTER))
+                with pending_lock:
+                    rate_limited.extend((p, m, delay) for p, _, m in items[pos:])
+                for _, r, _ in items[pos:]:
+                    heartbeat.done(r)
+                break
+            try:
+                result = _process_event(*parsed)
+                _record_delivery(parsed, result)
+            except Exception as e:
+                logger.exception(f"Error inesperado procesando el mensaje {message_id}")
+                result = {"channel": parsed[1], "status": f"error: {e}", "outcome": "failed"}
+            finally:
+                heartbeat.done(receipt)
+            result["id"] = message_id
+            out.append(result)
+            if not _delivered(result):
+                blocked = parsed[1]
+        return out
+
+    receipts = [receipt for items in partitions.values() for _, receipt, _ in items]
+    with _VisibilityHeartbeat(receipts) as heartbeat:
+        if partitions:
+            workers = min(len(partitions), _concurrency.max_limit)
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for out in pool.map(run_partition, partitions.values()):
+                    results.extend(out)
+
+    if unstarted:
+        results.extend(_requeue_pending(unstarted, "deadline"))
+    if rate_limited:
+        results.extend(_requeue_pending(rate_limited, "rate limit"))
+    if held_back:
+        results.extend(_requeue_pending(held_back, "waiting predecessor"))
+    return results
+
+
+def _summarize(results):
+    """Agrupa los ids por resultado y elige el código HTTP del lote."""
+    summary = {"processed": results, "succeeded": [], "failed": [], "rejected": []}
+    for result in results:
+        summary[result["outcome"]].append(result["id"])
+
+    if summary["failed"] and not summary["succeeded"] and not summary["rejected"]:
+        status_code = 502
+    elif summary["failed"] or summary["rejected"]:
+        status_code = 207
+    else:
+        status_code = 200
+    return status_code, summary
+
 
-    summary = {"processed": results}
+# Health check profundo: el OSB responde y la Queue de entrada responde a GetStats (ver health.py)
+_health_probe = DeepProbe({
+    "osb": (lambda: http_reachable(OSB_BASE_URL)) if OSB_BASE_URL else None,
+    "queue": (lambda: _get_queue_state()["client"].get_stats(QUEUE_OCID)) if QUEUE_OCID else None,
+})
+
+
+def handler(ctx, data: io.BytesIO = None):
+    # Health check: responde antes de leer el cuerpo, registrar logs o crear clientes
+    mode = health_mode(ctx)
+    if mode:
+        return health_response(mode, _health_probe)
+
+    deadline = time.monotonic() + FUNCTION_TIMEOUT
+    try:
+        raw_body = data.getvalue() if data else b"{}"
+        event = json.loads(raw_body.decode("utf-8"))
+    except Exception as e:
+        logger.error(f"Invalid JSON: {e}")
+        return (400, json.dumps({"error": f"Invalid JSON: {e}"}))
+
+    events = event if isinstance(event, list) else [event]
+    results = process_batch(events, deadline)
+
+    status_code, summary = _summarize(results)
     logger.info(f"Resumen final: {summary}")
 
-    return (200, json.dumps(summary, ensure_ascii=False),
+    return (status_code, json.dumps(summary, ensure_ascii=False),
             {"Content-Type": "application/json"})
-
@@ -0,0 +1,88 @@
+"""Último estado entregado al OSB por cada intent de débito Minka.
+
+Por defecto se guarda en memoria de la instancia (LRU con TTL). Para compartir
+el estado entre instancias se puede indicar otra implementación con
+``INTENT_STATE_STORE="paquete.modulo:Clase"``; la clase debe ofrecer
+``get(key)`` y ``set(key, state)`` y construirse sin argumentos. Se considera
+compartida salvo que declare ``shared = False``.
+
+Con el almacén en memoria, que un intent no tenga estado no significa que su
+predecesor falte: pudo entregarse en otra instancia o antes de un arranque en
+frío. Por eso una transición sin estado conocido solo se difiere si el
+almacén es compartido.
+"""
+import importlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Orden de las transiciones de un débito y predecesor requerido por cada una
+STATE_RANK = {"Prepared": 1, "Committed": 2, "Aborted": 2, "Completed": 3}
+PREDECESSOR = {"Committed": "Prepared", "Aborted": "Prepared", "Completed": "Committed"}
+TERMINAL = {"Aborted", "Completed"}
+
+
+class MemoryIntentStateStore:
+    """Almacén en memoria, acotado en tamaño y con expiración."""
+
+    shared = False
+
+    def __init__(self, max_entries=10000, ttl=86400, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            state, expires = item
+            if expires < self._clock():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return state
+
+    def set(self, key, state):
+        with self._lock:
+            self._data[key] = (state, self._clock() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+
+def store_from_env():
+    spec = os.getenv("INTENT_STATE_STORE")
+    if not spec or spec == "memory":
+        return MemoryIntentStateStore(
+            max_entries=int(os.getenv("INTENT_STATE_MAX_ENTRIES", "10000")),
+            ttl=int(os.getenv("INTENT_STATE_TTL", "86400")),
+        )
+    module_name, _, class_name = spec.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+def decide(last_state, channel, shared=False):
+    """Decide qué hacer con una transición dado el último estado entregado.
+
+    Devuelve "send", "defer" (falta entregar su predecesor) o "superseded"
+    (el intent ya pasó por este estado o uno posterior). Sin estado conocido
+    (``last_state`` None) se difiere solo si el almacén es compartido
+    (``shared``); con uno por instancia se envía.
+    """
+    if channel not in STATE_RANK:
+        return "send"
+    if last_state is None:
+        return "defer" if shared and channel in PREDECESSOR else "send"
+    if last_state in TERMINAL:
+        return "superseded"
+    if STATE_RANK[last_state] >= STATE_RANK[channel]:
+        return "superseded"
+    required = PREDECESSOR.get(channel)
+    if required and last_state != required:
+        return "defer"
+    return "send"
@@ -0,0 +1,130 @@
+"""Pruebas de concurrency.AdaptiveConcurrencyLimiter: python -m pytest -q (desde esta carpeta)."""
+import threading
+import time
+
+import pytest
+
+from concurrency import AdaptiveConcurrencyLimiter
+
+
+class FakeClock:
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+def _limiter(initial, clock=None, **kwargs):
+    return AdaptiveConcurrencyLimiter(initial=initial, clock=clock or FakeClock(), **kwargs)
+
+
+def test_healthy_responses_increase_limit_additively():
+    limiter = _limiter(2, max_limit=8)
+    for _ in range(3):
+        assert limiter.acquire()
+        limiter.release(0.1)
+    # +1/límite por respuesta sana: 2 -> 2.5 -> 2.9 -> 3.24
+    assert limiter.limit == 3
+
+
+def test_limit_does_not_exceed_max():
+    limiter = _limiter(4, max_limit=4)
+    for _ in range(20):
+        limiter.acquire()
+        limiter.release(0.1)
+    assert limiter.limit == 4
+
+
+def test_error_decreases_limit_multiplicatively():
+    limiter = _limiter(10, backoff=0.7)
+    limiter.acquire()
+    limiter.release(0.1, ok=False)
+    assert limiter.limit == 7
+
+
+def test_one_decrease_per_latency_window():
+    clock = FakeClock()
+    limiter = _limiter(10, clock, backoff=0.5)
+    for _ in range(3):
+        limiter.acquire()
+        limiter.release(0.2, ok=False)
+    assert limiter.limit == 5
+    clock.now += 0.2
+    limiter.acquire()
+    limiter.release(0.2, ok=False)
+    assert limiter.limit == 2
+
+
+def test_latency_over_tolerance_decreases_limit():
+    limiter = _limiter(10, latency_tolerance=1.5, backoff=0.5)
+    limiter.acquire()
+    limiter.release(0.1)
+    limit = limiter.limit
+    limiter.acquire()
+    limiter.release(0.5)
+    assert limiter.limit == limit // 2
+
+
+def test_limit_does_not_go_below_min():
+    clock = FakeClock()
+    limiter = _limiter(2, clock, min_limit=1, backoff=0.1)
+    for _ in range(5):
+        clock.now += 1
+        limiter.acquire()
+        limiter.release(0.1, ok=False)
+    assert limiter.limit == 1
+
+
+def test_acquire_times_out_when_no_slot_is_free():
+    limiter = AdaptiveConcurrencyLimiter(initial=1)
+    assert limiter.acquire()
+    started = time.monotonic()
+    assert limiter.acquire(timeout=0.05) is False
+    assert time.monotonic() - started >= 0.05
+    assert limiter.inflight == 1
+
+
+def test_acquire_with_expired_timeout_does_not_wait():
+    limiter = AdaptiveConcurrencyLimiter(initial=1)
+    limiter.acquire()
+    assert limiter.acquire(timeout=0) is False
+
+
+def test_waiting_acquire_gets_released_slot():
+    limiter = AdaptiveConcurrencyLimiter(initial=1)
+    limiter.acquire()
+    threading.Timer(0.05, limiter.cancel).start()
+    assert limiter.acquire(timeout=2)
+    assert limiter.inflight == 1
+
+
+def test_cancel_frees_slot_without_adjusting_limit():
+    limiter = _limiter(3)
+    limiter.acquire()
+    limiter.cancel()
+    assert limiter.inflight == 0
+    assert limiter.limit == 3
+
+
+@pytest.mark.parametrize("status, decreased", [(200, False), (404, False), (500, True), (503, True)])
+def test_run_counts_server_errors_as_failures(status, decreased):
+    limiter = _limiter(10, backoff=0.5)
+    limiter.acquire()
+    assert limiter.run(lambda: FakeResponse(status)).status_code == status
+    assert limiter.inflight == 0
+    assert (limiter.limit < 10) is decreased
+
+
+def test_run_releases_slot_when_call_raises():
+    limiter = _limiter(10, backoff=0.5)
+    limiter.acquire()
+    with pytest.raises(ConnectionError):
+        limiter.run(lambda: (_ for _ in ()).throw(ConnectionError("OSB caído")))
+    assert limiter.inflight == 0
+    assert limiter.limit == 5
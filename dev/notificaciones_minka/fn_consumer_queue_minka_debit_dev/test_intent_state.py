@@ -0,0 +1,79 @@
+"""Pruebas de intent_state.decide: python -m pytest -q (desde esta carpeta)."""
+import pytest
+
+from intent_state import MemoryIntentStateStore, decide
+
+
+@pytest.mark.parametrize("channel", ["Committed", "Aborted", "Completed"])
+def test_unknown_state_is_sent_with_per_instance_store(channel):
+    # El predecesor pudo entregarse en otra instancia o antes de un arranque en frío
+    assert decide(None, channel) == "send"
+    assert decide(None, channel, shared=False) == "send"
+
+
+@pytest.mark.parametrize("channel", ["Committed", "Aborted", "Completed"])
+def test_unknown_state_is_deferred_with_shared_store(channel):
+    assert decide(None, channel, shared=True) == "defer"
+
+
+@pytest.mark.parametrize("shared", [False, True])
+def test_prepared_without_state_is_sent(shared):
+    assert decide(None, "Prepared", shared) == "send"
+
+
+@pytest.mark.parametrize("shared", [False, True])
+def test_out_of_order_with_known_earlier_state_is_deferred(shared):
+    # Completed llega con Prepared entregado pero sin Committed
+    assert decide("Prepared", "Completed", shared) == "defer"
+
+
+@pytest.mark.parametrize("last_state", ["Aborted", "Completed"])
+@pytest.mark.parametrize("channel", ["Prepared", "Committed", "Aborted", "Completed"])
+def test_terminal_state_supersedes_everything(last_state, channel):
+    assert decide(last_state, channel) == "superseded"
+    assert decide(last_state, channel, shared=True) == "superseded"
+
+
+def test_memory_store_is_not_shared():
+    assert MemoryIntentStateStore.shared is False
+
+
+@pytest.mark.parametrize("last_state, channel, expected", [
+    ("Prepared", "Prepared", "superseded"),
+    ("Prepared", "Committed", "send"),
+    ("Prepared", "Aborted", "send"),
+    ("Prepared", "Completed", "defer"),
+    ("Committed", "Prepared", "superseded"),
+    ("Committed", "Committed", "superseded"),
+    ("Committed", "Aborted", "superseded"),
+    ("Committed", "Completed", "send"),
+])
+def test_transition_from_non_terminal_state(last_state, channel, expected):
+    assert decide(last_state, channel) == expected
+    assert decide(last_state, channel, shared=True) == expected
+
+
+@pytest.mark.parametrize("last_state", [None, "Prepared", "Completed"])
+def test_unknown_channel_is_sent(last_state):
+    assert decide(last_state, "Otro", shared=True) == "send"
+
+
+def test_memory_store_expires_entries():
+    now = [0.0]
+    store = MemoryIntentStateStore(ttl=10, clock=lambda: now[0])
+    store.set("intent-1", "Prepared")
+    now[0] = 9
+    assert store.get("intent-1") == "Prepared"
+    now[0] = 11
+    assert store.get("intent-1") is None
+
+
+def test_memory_store_evicts_least_recently_used():
+    store = MemoryIntentStateStore(max_entries=2)
+    store.set("a", "Prepared")
+    store.set("b", "Prepared")
+    store.get("a")
+    store.set("c", "Prepared")
+    assert store.get("a") == "Prepared"
+    assert store.get("b") is None
+    assert store.get("c") == "Prepared"
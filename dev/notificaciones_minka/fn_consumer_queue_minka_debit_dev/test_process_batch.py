@@ -0,0 +1,100 @@
+"""Pruebas del orden de transiciones en func.process_batch: python -m pytest -q (desde esta carpeta)."""
+import pytest
+
+import func
+from intent_state import MemoryIntentStateStore
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.text = ""
+
+
+class FakeOSB:
+    """OSB que responde según el sufijo de la URL y registra las llamadas."""
+
+    def __init__(self, statuses):
+        self.statuses = statuses
+        self.calls = []
+
+    def __call__(self, url, **kwargs):
+        self.calls.append(url)
+        action = url.rsplit("/", 1)[-1]
+        return FakeResponse(self.statuses.get(action, 200))
+
+
+def _event(channel, handle="INT1"):
+    path_params = "" if channel == "Prepared" else handle
+    return {
+        "channel": channel,
+        "pathParams": path_params,
+        "payload": {"data": {"intent": {"data": {"handle": handle}}}},
+    }
+
+
+@pytest.fixture
+def consumer(monkeypatch):
+    requeued = []
+
+    def put_to_queue(entries):
+        requeued.extend(entries)
+        return True
+
+    def setup(statuses):
+        osb = FakeOSB(statuses)
+        monkeypatch.setattr(func, "OSB_BASE_URL", "http://osb")
+        monkeypatch.setattr(func.requests, "post", osb)
+        monkeypatch.setattr(func.requests, "put", osb)
+        monkeypatch.setattr(func, "_put_to_queue", put_to_queue)
+        monkeypatch.setattr(func, "_intent_states", MemoryIntentStateStore())
+        monkeypatch.setattr(func, "_shared_states", False)
+        return osb, requeued
+
+    return setup
+
+
+def test_failed_prepared_holds_back_later_transitions(consumer):
+    osb, requeued = consumer({"crear": 503})
+    results = func.process_batch([_event("Committed"), _event("Prepared")])
+
+    assert osb.calls == ["http://osb/crear"]
+    by_channel = {r["channel"]: r for r in results}
+    assert by_channel["Prepared"]["status"].startswith("requeued")
+    assert by_channel["Committed"]["status"] == "deferred (waiting predecessor)"
+    # El Committed se difiere sin consumir reintentos
+    assert by_channel["Committed"]["retry_count"] == 0
+    delays = {channel: delay for payload, channel, _, delay, _ in requeued}
+    assert delays == {"Prepared": func.VISIBILITY_DELAY, "Committed": func.STATE_DEFER_DELAY}
+    assert func._intent_states.get("INT1") is None
+
+
+def test_every_later_transition_is_held_back(consumer):
+    osb, requeued = consumer({"crear": 503})
+    func.process_batch([_event("Prepared"), _event("Committed"), _event("Completed")])
+
+    assert osb.calls == ["http://osb/crear"]
+    assert sorted(channel for _, channel, _, _, _ in requeued) == ["Committed", "Completed", "Prepared"]
+
+
+def test_requeued_prepared_is_not_superseded_later(consumer):
+    osb, requeued = consumer({"crear": 503})
+    func.process_batch([_event("Prepared"), _event("Committed")])
+
+    # La nueva entrega de ambos ya con el OSB disponible
+    osb.statuses.clear()
+    redelivered = [{"channel": c, "pathParams": p, "payload": payload} for payload, c, p, _, _ in requeued]
+    results = func.process_batch(redelivered)
+
+    assert [r["status"] for r in results] == [200, 200]
+    assert osb.calls[1:] == ["http://osb/crear", "http://osb/INT1/confirmar"]
+
+
+def test_delivered_prepared_lets_committed_through(consumer):
+    osb, requeued = consumer({})
+    results = func.process_batch([_event("Prepared"), _event("Committed")])
+
+    assert osb.calls == ["http://osb/crear", "http://osb/INT1/confirmar"]
+    assert [r["status"] for r in results] == [200, 200]
+    assert requeued == []
+    assert func._intent_states.get("INT1") == "Committed"
@@ -0,0 +1,138 @@
+"""Pruebas de token_provider.TokenProvider: python -m pytest -q (desde esta carpeta)."""
+import threading
+import time
+
+import pytest
+
+from token_provider import TokenError, TokenProvider
+
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FakeResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self._body = body
+
+    def json(self):
+        return self._body
+
+
+class FakeTokenEndpoint:
+    """Endpoint de identidad que entrega token-1, token-2... y cuenta las peticiones."""
+
+    def __init__(self, expires_in=100, status_code=200, gate=None):
+        self.expires_in = expires_in
+        self.status_code = status_code
+        self.gate = gate
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, url, data=None, auth=None, timeout=None):
+        with self._lock:
+            self.calls += 1
+            n = self.calls
+        if self.gate is not None:
+            self.gate.wait(5)
+        return FakeResponse(self.status_code, {"access_token": f"token-{n}", "expires_in": self.expires_in})
+
+
+def _provider(post, clock=None, refresh_margin=10):
+    return TokenProvider("https://idcs/oauth2/v1/token", "id", "secret",
+                         refresh_margin=refresh_margin, timeout=5, clock=clock or FakeClock(), post=post)
+
+
+def test_concurrent_callers_share_one_fetch():
+    gate = threading.Event()
+    post = FakeTokenEndpoint(gate=gate)
+    provider = _provider(post)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(provider.token())) for _ in range(8)]
+    for t in threads:
+        t.start()
+    # Todos los hilos piden el token mientras la única renovación está en curso
+    while post.calls == 0:
+        time.sleep(0.001)
+    gate.set()
+    for t in threads:
+        t.join(5)
+    assert post.calls == 1
+    assert results == ["token-1"] * 8
+
+
+def test_callers_use_current_token_while_another_refreshes():
+    clock = FakeClock()
+    gate = threading.Event()
+    post = FakeTokenEndpoint(expires_in=100)
+    provider = _provider(post, clock)
+    assert provider.token() == "token-1"
+
+    # Pasado el margen de renovación, pero antes de vencer
+    clock.now = 95
+    post.gate = gate
+    refresher = threading.Thread(target=provider.token)
+    refresher.start()
+    while post.calls < 2:
+        time.sleep(0.001)
+    assert provider.token() == "token-1"
+    gate.set()
+    refresher.join(5)
+    assert provider.token() == "token-2"
+    assert post.calls == 2
+
+
+def test_token_is_cached_until_refresh_margin():
+    clock = FakeClock()
+    post = FakeTokenEndpoint(expires_in=100)
+    provider = _provider(post, clock, refresh_margin=10)
+    assert provider.token() == "token-1"
+    clock.now = 89
+    assert provider.token() == "token-1"
+    assert post.calls == 1
+
+
+def test_token_is_refreshed_on_expiry():
+    clock = FakeClock()
+    post = FakeTokenEndpoint(expires_in=100)
+    provider = _provider(post, clock, refresh_margin=10)
+    assert provider.authorization() == "Bearer token-1"
+    clock.now = 90
+    assert provider.authorization() == "Bearer token-2"
+    clock.now = 500
+    assert provider.authorization() == "Bearer token-3"
+    assert post.calls == 3
+
+
+def test_failed_refresh_keeps_valid_token():
+    clock = FakeClock()
+    post = FakeTokenEndpoint(expires_in=100)
+    provider = _provider(post, clock)
+    provider.token()
+    clock.now = 95
+    post.status_code = 503
+    assert provider.token() == "token-1"
+    # No reintenta en cada llamada mientras dura la espera tras el fallo
+    assert provider.token() == "token-1"
+    assert post.calls == 2
+
+
+def test_failed_fetch_without_valid_token_raises():
+    post = FakeTokenEndpoint(status_code=401)
+    with pytest.raises(TokenError):
+        _provider(post).token()
+
+
+def test_invalidate_forces_new_token():
+    post = FakeTokenEndpoint()
+    provider = _provider(post)
+    authorization = provider.authorization()
+    provider.invalidate("Bearer otro-token")
+    assert provider.authorization() == authorization
+    provider.invalidate(authorization)
+    assert provider.authorization() == "Bearer token-2"
@@ -0,0 +1,138 @@
+"""Tokens OAuth 2.0 (client credentials) para las llamadas al API Gateway y al OSB.
+
+El token se guarda en memoria de la instancia y se renueva ``OAUTH_REFRESH_MARGIN``
+segundos antes de vencer. Solo un hilo pide el token nuevo (single-flight):
+mientras tanto los demás siguen usando el vigente o, si ya venció, esperan
+a esa misma renovación en lugar de ir cada uno al endpoint de identidad.
+
+Sin ``OAUTH_TOKEN_URL`` se mantiene el comportamiento original: el header
+Authorization es el valor estático de la variable indicada (OSB_AUTH, ...).
+Se comparte entre las funciones que llaman al OSB; cada copia debe
+mantenerse idéntica.
+
+Variables de entorno:
+    OAUTH_TOKEN_URL, OAUTH_CLIENT_ID, OAUTH_CLIENT_SECRET, OAUTH_SCOPE
+    OAUTH_REFRESH_MARGIN (60)  -> segundos antes del vencimiento para renovar
+    OAUTH_TIMEOUT (10)         -> timeout de la petición de token
+"""
+import logging
+import os
+import threading
+import time
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Tras un fallo de renovación con el token aún vigente, espera antes de reintentar
+RETRY_AFTER_FAILURE = 5.0
+
+
+class TokenError(Exception):
+    pass
+
+
+class TokenProvider:
+    """Token de acceso en caché con renovación anticipada y single-flight."""
+
+    def __init__(self, token_url, client_id, client_secret, scope=None,
+                 refresh_margin=60.0, timeout=10.0, clock=time.monotonic, post=requests.post):
+        self.token_url = token_url
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.scope = scope
+        self.refresh_margin = refresh_margin
+        self.timeout = timeout
+        self._clock = clock
+        self._post = post
+        self._cond = threading.Condition()
+        self._token = None
+        self._expires_at = 0.0
+        self._refresh_at = 0.0
+        self._refreshing = False
+
+    @classmethod
+    def from_env(cls):
+        token_url = os.getenv("OAUTH_TOKEN_URL")
+        if not token_url:
+            return None
+        return cls(
+            token_url,
+            os.getenv("OAUTH_CLIENT_ID", ""),
+            os.getenv("OAUTH_CLIENT_SECRET", ""),
+            scope=os.getenv("OAUTH_SCOPE") or None,
+            refresh_margin=float(os.getenv("OAUTH_REFRESH_MARGIN", "60")),
+            timeout=float(os.getenv("OAUTH_TIMEOUT", "10")),
+        )
+
+    def _fetch(self):
+        data = {"grant_type": "client_credentials"}
+        if self.scope:
+            data["scope"] = self.scope
+        r = self._post(self.token_url, data=data, auth=(self.client_id, self.client_secret),
+                       timeout=self.timeout)
+        if r.status_code != 200:
+            raise TokenError(f"el endpoint de tokens respondió HTTP {r.status_code}")
+        body = r.json()
+        if not body.get("access_token"):
+            raise TokenError("respuesta de token sin access_token")
+        return body["access_token"], float(body.get("expires_in", 3600))
+
+    def token(self):
+        """Token vigente; lo renueva si está por vencer."""
+        with self._cond:
+            while True:
+                now = self._clock()
+                if self._token and now < self._refresh_at:
+                    return self._token
+                if not self._refreshing:
+                    self._refreshing = True
+                    break
+                # Otro hilo está renovando: se usa el token actual mientras no venza
+                if self._token and now < self._expires_at:
+                    return self._token
+                self._cond.wait(self.timeout)
+
+        try:
+            token, expires_in = self._fetch()
+        except Exception as e:
+            with self._cond:
+                self._refreshing = False
+                self._cond.notify_all()
+                if self._token and self._clock() < self._expires_at:
+                    logger.warning(f"No se pudo renovar el token, se usa el vigente: {e}")
+                    self._refresh_at = self._clock() + RETRY_AFTER_FAILURE
+                    return self._token
+            raise
+
+        with self._cond:
+            now = self._clock()
+            self._token = token
+            self._expires_at = now + expires_in
+            self._refresh_at = now + max(expires_in - self.refresh_margin, expires_in / 2)
+            self._refreshing = False
+            self._cond.notify_all()
+            return token
+
+    def authorization(self):
+        return f"Bearer {self.token()}"
+
+    def invalidate(self, authorization=None):
+        """Descarta el token (p. ej. tras un 401) si sigue siendo el que se usó."""
+        with self._cond:
+            if authorization is None or authorization == f"Bearer {self._token}":
+                self._token = None
+                self._expires_at = self._refresh_at = 0.0
+
+
+def authorization_from_env(static_env):
+    """Devuelve una función que entrega el header Authorization.
+
+    Con OAUTH_TOKEN_URL usa un TokenProvider; si no, el valor de ``static_env``.
+    El segundo elemento es el proveedor (o None) para invalidarlo tras un 401.
+    """
+    provider = TokenProvider.from_env()
+    if provider is None:
+        static = os.getenv(static_env)
+        return (lambda: static), None
+    return provider.authorization, provider
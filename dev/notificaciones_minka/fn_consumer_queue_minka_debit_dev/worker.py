@@ -0,0 +1,76 @@
+"""Consumidor en modo pull: lee de la Queue OCI y procesa con la misma lógica del handler.
+
+Cada worker lee de una sola Queue (QUEUE_OCID: la dedicada a un canal o uno
+de los shards) y, opcionalmente, solo del canal CHANNEL_FILTER, de modo que
+cada canal o shard escala por separado.
+
+Uso:
+    QUEUE_OCID=... [CHANNEL_FILTER=Prepared] OSB_BASE_URL=... OSB_AUTH=... python worker.py
+"""
+import logging
+import os
+import time
+
+import oci
+
+import func
+
+POLL_LIMIT = int(os.getenv("POLL_LIMIT", "10"))
+POLL_TIMEOUT = int(os.getenv("POLL_TIMEOUT", "20"))
+ERROR_BACKOFF = int(os.getenv("ERROR_BACKOFF", "5"))
+CHANNEL_FILTER = os.getenv("CHANNEL_FILTER")
+
+logger = logging.getLogger()
+
+
+def _delete_messages(client, receipts):
+    for i in range(0, len(receipts), func.UPDATE_MESSAGES_MAX_ENTRIES):
+        entries = [
+            oci.queue.models.DeleteMessagesDetailsEntry(receipt=receipt)
+            for receipt in receipts[i:i + func.UPDATE_MESSAGES_MAX_ENTRIES]
+        ]
+        client.delete_messages(
+            queue_id=func.QUEUE_OCID,
+            delete_messages_details=oci.queue.models.DeleteMessagesDetails(entries=entries)
+        )
+
+
+def poll_once():
+    """Lee un lote, lo procesa con heartbeat de visibilidad y borra lo que ya quedó resuelto."""
+    client = func._get_queue_state()["client"]
+    kwargs = {"channel_filter": CHANNEL_FILTER} if CHANNEL_FILTER else {}
+    resp = client.get_messages(
+        queue_id=func.QUEUE_OCID,
+        visibility_in_seconds=func.VISIBILITY_EXTENSION,
+        timeout_in_seconds=POLL_TIMEOUT,
+        limit=POLL_LIMIT,
+        **kwargs
+    )
+    messages = [
+        {"id": m.id, "receipt": m.receipt, "content": m.content}
+        for m in resp.data.messages
+    ]
+    if not messages:
+        return 0
+
+    results = func.process_batch(messages)
+
+    # Los mensajes fallidos se dejan vencer para que la Queue los reentregue
+    failed = {r["id"] for r in results if r["outcome"] == "failed"}
+    receipts = [m["receipt"] for m in messages if m["id"] not in failed]
+    _delete_messages(client, receipts)
+    logger.info(f"Lote procesado: {len(messages)} mensaje(s), {len(receipts)} eliminado(s)")
+    return len(messages)
+
+
+def main():
+    while True:
+        try:
+            poll_once()
+        except Exception as e:
+            logger.error(f"Error en el ciclo de consumo: {e}")
+            time.sleep(ERROR_BACKOFF)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,173 @@
-import io, json, os
+import io, json
 import oci
 import logging
+import sqlite3
+import threading
 from fdk import response
 
-QUEUE_OCID = os.getenv("QUEUE_OCID")
+from envelope import encode
+from health import DeepProbe, health_mode, health_response
+from queue_routing import all_queues, queue_for
+from routes import MethodNotAllowed, match_route
+from spool import SpoolFull, spool_from_env
+from tracing import CORRELATION_HEADER, correlation_id, new_trace, stamp, trace_metadata
+from validation import check_body_size, check_message_size, validate
+
 
 # === CONFIGURACIÓN DE LOGGING ===
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger()
 
+# Mensajes que no se pudieron encolar; se reenvían en invocaciones siguientes (ver spool.py)
+_spool = spool_from_env()
+
+# Cliente de mensajes por Queue, reutilizado entre invocaciones: config, signer,
+# sesión HTTP y GetQueue se cargan una vez por instancia y no en cada petición
+_queue_lock = threading.Lock()
+_queue_clients = {}
+
 def _get_header(headers: dict, name: str):
     if not headers:
         return None
     lower = {k.lower(): v for k, v in headers.items()}
     return lower.get(name.lower())
 
-def _extract_path_params(ctx):
+def _queue_client(queue_id):
+    """Cliente de mensajes de la Queue, creado una vez por instancia y Queue."""
+    with _queue_lock:
+        if queue_id not in _queue_clients:
+            file_config = oci.config.from_file("config.oci")
+            admin = oci.queue.QueueAdminClient(config=file_config)
+            q = admin.get_queue(queue_id).data
+            queue_client = oci.queue.QueueClient(config=file_config)
+            queue_client.base_client.endpoint = q.messages_endpoint
+            _queue_clients[queue_id] = queue_client
+        return _queue_clients[queue_id]
+
+def _put_messages(queue_id, entries):
+    """Encola [(content, metadata), ...] y devuelve True por cada mensaje aceptado."""
+    queue_client = _queue_client(queue_id)
+    put_details = oci.queue.models.PutMessagesDetails(
+        messages=[
+            oci.queue.models.PutMessagesDetailsEntry(content=content, metadata=metadata)
+            for content, metadata in entries
+        ]
+    )
+    # Ante una falla se conserva el cliente: recrearlo repetiría GetQueue (con los
+    # reintentos del SDK) justo cuando la Queue no responde
+    resp = queue_client.put_messages(queue_id=queue_id, put_messages_details=put_details)
+    result = oci.util.to_dict(resp.data)
+    logger.info(f"[fn_producer_queue_minka_debit] put_messages queue={queue_id}, result={result}")
+    return [not getattr(msg, "error_code", None) for msg in resp.data.messages]
+
+
+def _spool_message(ctx, queue_id, content, metadata, status_code, reason):
+    """Guarda el mensaje en el spool y responde como aceptado; None si no hay spool o está lleno."""
+    if _spool is None:
+        return None
     try:
-        req_url = ctx.RequestURL()  # URL completa de la invocación
-        parts = req_url.split("/")
-
-        if "abort" in parts:
-            params = parts[-2] if len(parts) > 1 else None
-        elif "commit" in parts:
-            params = parts[-2] if len(parts) > 1 else None
-        elif "intents" in parts:
-            params = parts[-1] if len(parts) > 1 else None
-        else:
-            return "prepared"
-        return params
-    except Exception as e:
-        logger.error(f"Error extrayendo parámetros de URL: {e}")
-        return {}
+        _spool.append(queue_id, content, metadata)
+    except (SpoolFull, sqlite3.Error) as e:
+        logger.error(f"[fn_producer_queue_minka_debit] No se pudo guardar el mensaje en el spool: {e}")
+        return None
+    logger.warning(f"[fn_producer_queue_minka_debit] Mensaje guardado en el spool ({reason}); pendientes={len(_spool)}")
+    return response.Response(
+        ctx,
+        response_data=json.dumps({
+            "code": status_code,
+            "status": "spooled",
+            "message": "Mensaje guardado en el spool local de la instancia, pendiente de envío a la cola",
+        }),
+        status_code=status_code,
+        headers={"Content-Type": "application/json", CORRELATION_HEADER: metadata.get("correlationId", "")}
+    )
+
+def _spool_if_pending(ctx, queue_id, content, metadata, status_code):
+    """Guarda el mensaje en el spool si la Queue falló hace poco o hay pendientes.
+
+    Con pendientes y sin falla reciente intenta un reenvío solo si no hay otro
+    en curso, así la petición no espera al hilo de fondo. None si el mensaje
+    puede enviarse directo a la Queue.
+    """
+    if _spool is None:
+        return None
+    if _spool.failing():
+        return _spool_message(ctx, queue_id, content, metadata, status_code, "falla reciente de la Queue")
+    if len(_spool):
+        sent = _spool.flush(_put_messages, blocking=False)
+        logger.info(f"[fn_producer_queue_minka_debit] Spool: {sent} mensaje(s) reenviados, pendientes={len(_spool)}")
+        if len(_spool):
+            return _spool_message(ctx, queue_id, content, metadata, status_code, "spool con pendientes")
+    return None
+
+def _queue_reachable():
+    for queue_id in all_queues():
+        _queue_client(queue_id).get_stats(queue_id)
+
+def _spool_drained():
+    """Reenvía lo pendiente del spool; falla si quedan mensajes sin enviar a la Queue."""
+    if len(_spool):
+        _spool.flush(_put_messages, blocking=False)
+    pending = len(_spool)
+    if pending:
+        raise RuntimeError(f"{pending} mensaje(s) pendientes en el spool")
+
+# Health check profundo: las Queues configuradas responden a GetStats y el spool
+# queda vacío (ver health.py y spool.py)
+_health_probe = DeepProbe({
+    "queue": _queue_reachable,
+    "spool": _spool_drained if _spool is not None else None,
+})
+
+# Reenvío de fondo del spool: no depende de que llegue otra petición a esta instancia
+if _spool is not None:
+    _spool.start_flusher(_put_messages)
 
 def handler(ctx, data: io.BytesIO = None):
+    # Health check: responde antes de resolver la ruta, leer el cuerpo o crear clientes
+    mode = health_mode(ctx)
+    if mode:
+        status_code, body = health_response(mode, _health_probe)
+        return response.Response(ctx, response_data=body, status_code=status_code,
+                                 headers={"Content-Type": "application/json"})
+
+    # Identificar ruta (método y path), canal y parámetros antes de cualquier otro trabajo
+    request_url = ctx.RequestURL() if hasattr(ctx, "RequestURL") else None
+    method = ctx.Method() if hasattr(ctx, "Method") else None
+    try:
+        route = match_route(request_url, method or None)
+    except MethodNotAllowed as e:
+        logger.warning(f"[fn_producer_queue_minka_debit] Método {method} no permitido en {request_url}")
+        return response.Response(
+            ctx,
+            response_data=json.dumps({"code": 405, "message": str(e)}),
+            status_code=405,
+            headers={"Content-Type": "application/json", "Allow": ", ".join(e.allowed)}
+        )
+    if route is None:
+        logger.warning(f"[fn_producer_queue_minka_debit] Ruta no soportada: {request_url}")
+        return response.Response(
+            ctx,
+            response_data=json.dumps({"code": 404, "message": "Ruta no soportada"}),
+            status_code=404,
+            headers={"Content-Type": "application/json"}
+        )
+    channel, route_params = route
+    # La consumidora espera el único parámetro de la ruta (handle o intentHandle)
+    path_params = next(iter(route_params.values()), None)
+
+    raw_body = data.getvalue() if data else b"{}"
+    size_error = check_body_size(raw_body)
+    if size_error:
+        logger.warning(f"[fn_producer_queue_minka_debit] Payload rechazado: {size_error}")
+        return response.Response(
+            ctx,
+            response_data=json.dumps({"code": 413, "message": size_error}),
+            status_code=413,
+            headers={"Content-Type": "application/json"}
+        )
+
     try:
-        raw_body = data.getvalue() if data else b"{}"
         body = json.loads(raw_body.decode("utf-8"))
     except Exception as e:
         return response.Response(
@@ -45,29 +177,27 @@ def handler(ctx, data: io.BytesIO = None):
             headers={"Content-Type": "application/json"}
         )
 
+    schema_error = validate(channel, body)
+    if schema_error:
+        logger.warning(f"[fn_producer_queue_minka_debit] Payload inválido para {channel}: {schema_error}")
+        return response.Response(
+            ctx,
+            response_data=json.dumps({"code": 400, "message": f"Payload inválido: {schema_error}"}),
+            status_code=400,
+            headers={"Content-Type": "application/json"}
+        )
+
     try:
       
         headers = ctx.Headers() if hasattr(ctx, "Headers") else {}
         logger.info(f"[fn_producer_queue_minka_debit] Headers recibidos: {headers}")
 
-        # Extraer parámetros de la URL
-        path_params = _extract_path_params(ctx)
-        logger.info(f"[fn_producer_queue_minka_debit] Parámetros extraídos de la URL: {path_params}")
-
+        logger.info(f"[fn_producer_queue_minka_debit] Ruta: channel={channel}, pathParams={path_params}")
         logger.info(f"[fn_producer_queue_minka_debit] body: {body}")
 
-        # Obtener canal desde header o body
-        channel = _get_header(headers, "x-queue-channel") or body.get("channel")
-        if not channel:
-            return response.Response(
-                ctx,
-                response_data=json.dumps({
-                    "code": 400,
-                    "message": "Falta el parámetro 'channel' (header x-queue-channel o body.channel)"
-                }),
-                status_code=400,
-                headers={"Content-Type": "application/json"}
-            )
+        header_channel = _get_header(headers, "x-queue-channel")
+        if header_channel and header_channel != channel:
+            logger.warning(f"[fn_producer_queue_minka_debit] x-queue-channel={header_channel} no coincide con la ruta ({channel})")
 
         if channel == "Completed":
             status = (body.get("data", {}).get("intent", {}).get("meta", {}).get("status"))
@@ -82,66 +212,79 @@ def handler(ctx, data: io.BytesIO = None):
                     headers={"Content-Type": "application/json"}
                 )
 
-        if not QUEUE_OCID:
-            return response.Response(
-                ctx,
-                response_data=json.dumps({
-                    "code": 500,
-                    "message": "QUEUE_OCID no configurado en variables de entorno"
-                }),
-                status_code=500,
-                headers={"Content-Type": "application/json"}
-            )
-
-        # Cargar credenciales OCI
-        file_config = oci.config.from_file("config.oci")
-
-        # Obtener endpoint de la Queue
-        admin = oci.queue.QueueAdminClient(config=file_config)
-        q = admin.get_queue(QUEUE_OCID).data
-        messages_endpoint = q.messages_endpoint
-
-        # Crear cliente de mensajes
-        queue_client = oci.queue.QueueClient(config=file_config)
-        queue_client.base_client.endpoint = messages_endpoint
-        enriched_body = {}
-        if path_params == "prepared":
+        # Trace de correlación (ver tracing.py)
+        trace = stamp(new_trace(correlation_id(headers)))
+        if path_params is None:
             enriched_body = {
                 "payload": body,
                 "channel": channel,
+                "trace": trace,
             }
         else:
             enriched_body = {
                 "payload": body,
                 "pathParams": path_params,
-                "channel": channel
+                "channel": channel,
+                "trace": trace
             }
-        # Construir el mensaje
-        put_details = oci.queue.models.PutMessagesDetails(
-            messages=[
-                oci.queue.models.PutMessagesDetailsEntry(
-                    content=json.dumps(enriched_body),
-                    metadata={
-                        "channelId": str(channel),
-                        "pathParams": json.dumps(path_params)
-                    }
-                )
-            ]
-        )
-        # Enviar mensaje a la Queue
-        resp = queue_client.put_messages(
-            queue_id=QUEUE_OCID,
-            put_messages_details=put_details
-        )
-    
-        result = oci.util.to_dict(resp.data)
-        logger.info(f"[fn_producer_queue_minka_debit] put_messages in channel={channel}, result={result}")
+        content, envelope_metadata = encode(enriched_body)
+        size_error = check_message_size(content)
+        if size_error:
+            logger.warning(f"[fn_producer_queue_minka_debit] Payload rechazado: {size_error}")
+            return response.Response(
+                ctx,
+                response_data=json.dumps({"code": 413, "message": size_error}),
+                status_code=413,
+                headers={"Content-Type": "application/json"}
+            )
+
+        # Queue destino: dedicada al canal o shard por intent (ver queue_routing.py)
+        intent_handle = body.get("data", {}).get("intent", {}).get("data", {}).get("handle")
+        queue_id = queue_for(channel, intent_handle or path_params)
+        if not queue_id:
+            return response.Response(
+                ctx,
+                response_data=json.dumps({
+                    "code": 500,
+                    "message": "QUEUE_OCID no configurado en variables de entorno"
+                }),
+                status_code=500,
+                headers={"Content-Type": "application/json"}
+            )
 
         if channel == "Completed":
             statusHttp = "200"
         else:
             statusHttp = "202"
 
+        metadata = {
+            "channelId": str(channel),
+            "pathParams": json.dumps(path_params),
+            **trace_metadata(trace),
+            **envelope_metadata
+        }
+
+        try:
+            # Con falla reciente de la Queue o pendientes en el spool, el mensaje va al
+            # spool detrás de los anteriores y el reenvío queda para el hilo de fondo
+            spooled = _spool_if_pending(ctx, queue_id, content, metadata, statusHttp)
+            if spooled is not None:
+                return spooled
+
+            # Enviar mensaje a la Queue
+            accepted = _put_messages(queue_id, [(content, metadata)])
+            if not all(accepted):
+                raise RuntimeError("la Queue rechazó el mensaje")
+        except Exception as e:
+            logger.error(f"[fn_producer_queue_minka_debit] Error encolando en channel={channel}: {e}")
+            if _spool is not None:
+                _spool.mark_failed()
+            spooled = _spool_message(ctx, queue_id, content, metadata, statusHttp, str(e))
+            if spooled is not None:
+                return spooled
+            raise
+        logger.info(f"[fn_producer_queue_minka_debit] put_messages in channel={channel}, queue={queue_id}")
+
         return response.Response(
             ctx,
             response_data=json.dumps({
@@ -149,7 +292,7 @@ def handler(ctx, data: io.BytesIO = None):
                 "message": "Mensaje encolado correctamente",
             }),
             status_code=statusHttp,
-            headers={"Content-Type": "application/json"}
+            headers={"Content-Type": "application/json", CORRELATION_HEADER: trace["correlationId"]}
         )
 
     except Exception as e:
@@ -0,0 +1,48 @@
+"""Selección de la Queue destino por canal o por shard.
+
+Orden de resolución:
+    1. QUEUE_OCID_BY_CHANNEL="canal=ocid,canal=ocid"  -> Queue dedicada por canal
+    2. QUEUE_OCID_SHARDS="ocid,ocid,..."              -> shard por hash estable de la clave
+    3. QUEUE_OCID                                      -> Queue única (comportamiento original)
+
+La clave de shard debe ser la misma para los eventos que necesitan orden
+(por ejemplo el intent Minka o la tarjeta Pomelo). Se comparte entre
+productores y consumidoras; cada copia debe mantenerse idéntica.
+"""
+import os
+import zlib
+
+
+def _parse_map(spec):
+    mapping = {}
+    for item in (spec or "").split(","):
+        if "=" in item:
+            key, _, value = item.partition("=")
+            mapping[key.strip()] = value.strip()
+    return mapping
+
+
+QUEUE_OCID = os.getenv("QUEUE_OCID")
+QUEUE_OCID_BY_CHANNEL = _parse_map(os.getenv("QUEUE_OCID_BY_CHANNEL"))
+QUEUE_OCID_SHARDS = [q.strip() for q in os.getenv("QUEUE_OCID_SHARDS", "").split(",") if q.strip()]
+
+
+def shard_index(key, shards):
+    """Índice estable entre procesos (crc32, no ``hash`` que cambia por proceso)."""
+    return zlib.crc32(str(key).encode("utf-8")) % shards
+
+
+def queue_for(channel, shard_key=None):
+    """OCID de la Queue para un canal y clave de shard; None si no hay configuración."""
+    if channel in QUEUE_OCID_BY_CHANNEL:
+        return QUEUE_OCID_BY_CHANNEL[channel]
+    if QUEUE_OCID_SHARDS:
+        key = shard_key if shard_key is not None else channel
+        return QUEUE_OCID_SHARDS[shard_index(key, len(QUEUE_OCID_SHARDS))]
+    return QUEUE_OCID
+
+
+def all_queues():
+    """Todas las Queues configuradas, sin repetir."""
+    queues = list(QUEUE_OCID_BY_CHANNEL.values()) + QUEUE_OCID_SHARDS + [QUEUE_OCID]
+    return [q for i, q in enumerate(queues) if q and q not in queues[:i]]
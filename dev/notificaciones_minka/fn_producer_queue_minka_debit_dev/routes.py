@@ -0,0 +1,83 @@
+"""Tabla de rutas Minka precompilada.
+
+Las rutas y el canal de cada una salen del deployment API_TRANSACCIONES del
+API Gateway (``transacciones.json``: cabecera ``x-queue-channel`` que fija cada
+ruta). Si el deployment cambia, se regenera con:
+
+    python dev/tools/minka_routes.py transacciones.json
+"""
+import re
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+# (ruta relativa a /rest/b2b/fiducia/minka/v2, métodos, canal)
+ROUTES = [
+    ("/debits", ("POST",), "Prepared"),
+    ("/debits/{handle}/abort", ("POST",), "Aborted"),
+    ("/debits/{intentHandle}/commit", ("POST",), "Committed"),
+    ("/intents/{intentHandle}", ("PUT",), "Completed"),
+]
+
+_PARAM = re.compile(r"\{(\w+)\}")
+
+
+class MethodNotAllowed(Exception):
+    """La URL corresponde a una ruta conocida, pero no con ese método HTTP."""
+
+    def __init__(self, allowed):
+        super().__init__(f"Método no permitido; permitidos: {', '.join(allowed)}")
+        self.allowed = allowed
+
+
+def compile_routes(routes):
+    """Une todas las rutas en una sola expresión anclada al final de la URL.
+
+    Cada plantilla de ruta queda en el grupo ``r<i>`` y sus parámetros en
+    ``r<i>_<nombre>``, de modo que una sola búsqueda identifica la ruta y
+    extrae los parámetros. Devuelve además, por plantilla, los nombres de los
+    parámetros y el canal de cada método ({método: canal}).
+    """
+    templates = OrderedDict()
+    for template, methods, channel in routes:
+        by_method = templates.setdefault(template, {})
+        for method in methods:
+            by_method[method.upper()] = channel
+
+    alternatives = []
+    params = []
+    for i, template in enumerate(templates):
+        names = _PARAM.findall(template)
+        pattern = ""
+        for literal, name in zip(_PARAM.split(template)[::2], names + [None]):
+            pattern += re.escape(literal)
+            if name:
+                pattern += f"(?P<r{i}_{name}>[^/]+)"
+        alternatives.append(f"(?P<r{i}>{pattern})")
+        params.append((names, templates[template]))
+    return re.compile(f"(?:{'|'.join(alternatives)})/?$"), params
+
+
+_ROUTE_RE, _ROUTE_PARAMS = compile_routes(ROUTES)
+
+
+def match_route(request_url, method=None):
+    """Devuelve (canal, parámetros) de la ruta Minka o None si la URL no es conocida.
+
+    Con ``method`` la ruta se resuelve por (método, ruta) y se lanza
+    MethodNotAllowed si la ruta existe pero no acepta ese método.
+    """
+    if not request_url:
+        return None
+    m = _ROUTE_RE.search(urlsplit(request_url).path)
+    if not m:
+        return None
+    i = int(m.lastgroup[1:])
+    names, by_method = _ROUTE_PARAMS[i]
+    if method is None:
+        channel = next(iter(by_method.values()))
+    elif method.upper() in by_method:
+        channel = by_method[method.upper()]
+    else:
+        raise MethodNotAllowed(tuple(by_method))
+    params = {name: m.group(f"r{i}_{name}") for name in names}
+    return channel, params
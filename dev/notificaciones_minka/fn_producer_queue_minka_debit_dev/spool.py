@@ -0,0 +1,181 @@
+"""Spool local (SQLite) para no perder eventos cuando la Queue no responde.
+
+Si ``put_messages`` falla, el productor guarda el mensaje ya serializado en el
+spool y responde 202 con ``"status": "spooled"`` (no "encolado"). Lo pendiente
+se envía a la Queue en lotes, del más antiguo al más nuevo, cada
+SPOOL_FLUSH_INTERVAL segundos desde un hilo de fondo (``start_flusher``); las
+peticiones y el health check profundo solo lo intentan si no hay otro reenvío
+en curso (``blocking=False``), así no esperan el timeout de la Queue.
+
+Tras una falla de la Queue (``mark_failed``) y durante SPOOL_FAILURE_WINDOW
+segundos, ``failing()`` es True: el productor guarda los mensajes nuevos en el
+spool sin intentar el envío y deja el reenvío al hilo de fondo. El primer
+reenvío exitoso cierra la ventana.
+
+En OCI Functions solo /tmp es escribible y se pierde cuando la instancia se
+recicla, así que el spool cubre cortes breves de la Queue y un mensaje
+"spooled" no tiene la durabilidad de uno encolado. En un worker o VM conviene
+apuntar ``SPOOL_PATH`` a un disco persistente. Se comparte entre productores;
+cada copia debe mantenerse idéntica.
+
+Variables de entorno:
+    SPOOL_PATH ("/tmp/queue_spool.sqlite3")  -> "none" desactiva el spool
+    SPOOL_MAX_ENTRIES (10000)                -> por encima se rechaza el evento (500)
+    SPOOL_FLUSH_MAX (200)                    -> mensajes a reenviar por invocación
+    SPOOL_FLUSH_INTERVAL (30)                -> segundos entre reenvíos de fondo; 0 los desactiva
+    SPOOL_FAILURE_WINDOW (30)                -> segundos sin intentar la Queue tras una falla
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SPOOL_PATH = os.getenv("SPOOL_PATH", "/tmp/queue_spool.sqlite3")
+SPOOL_MAX_ENTRIES = int(os.getenv("SPOOL_MAX_ENTRIES", "10000"))
+SPOOL_FLUSH_MAX = int(os.getenv("SPOOL_FLUSH_MAX", "200"))
+SPOOL_FLUSH_INTERVAL = float(os.getenv("SPOOL_FLUSH_INTERVAL", "30"))
+SPOOL_FAILURE_WINDOW = float(os.getenv("SPOOL_FAILURE_WINDOW", "30"))
+PUT_MESSAGES_MAX_ENTRIES = 20
+
+
+class SpoolFull(Exception):
+    pass
+
+
+class Spool:
+    """Cola FIFO persistente de mensajes (queue_id, content, metadata)."""
+
+    def __init__(self, path, max_entries=10000, failure_window=SPOOL_FAILURE_WINDOW, clock=time.monotonic):
+        self.path = path
+        self.max_entries = max_entries
+        self.failure_window = failure_window
+        self._clock = clock
+        self._failed_until = 0.0
+        # _lock protege la conexión SQLite; _flush_lock permite un solo reenvío a la vez
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flusher = None
+        self._stop = threading.Event()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS spool ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " queue_id TEXT NOT NULL,"
+            " content TEXT NOT NULL,"
+            " metadata TEXT NOT NULL,"
+            " created REAL NOT NULL)"
+        )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+
+    def append(self, queue_id, content, metadata):
+        with self._lock:
+            if self._conn.execute("SELECT COUNT(*) FROM spool").fetchone()[0] >= self.max_entries:
+                raise SpoolFull(f"spool lleno ({self.max_entries} mensajes)")
+            cursor = self._conn.execute(
+                "INSERT INTO spool (queue_id, content, metadata, created) VALUES (?, ?, ?, ?)",
+                (queue_id, content, json.dumps(metadata), time.time())
+            )
+            return cursor.lastrowid
+
+    def _next_batch(self, limit):
+        """Mensajes más antiguos de la Queue del primer pendiente, en orden."""
+        row = self._conn.execute("SELECT queue_id FROM spool ORDER BY id LIMIT 1").fetchone()
+        if row is None:
+            return None, []
+        rows = self._conn.execute(
+            "SELECT id, content, metadata FROM spool WHERE queue_id = ? ORDER BY id LIMIT ?",
+            (row[0], limit)
+        ).fetchall()
+        return row[0], [(rowid, content, json.loads(metadata)) for rowid, content, metadata in rows]
+
+    def mark_failed(self):
+        """Abre la ventana de falla: durante ``failure_window`` segundos no se intenta la Queue."""
+        self._failed_until = self._clock() + self.failure_window
+
+    def failing(self):
+        return self._clock() < self._failed_until
+
+    def flush(self, send, max_messages=SPOOL_FLUSH_MAX, batch=PUT_MESSAGES_MAX_ENTRIES, blocking=True):
+        """Envía lo pendiente con ``send(queue_id, [(content, metadata), ...])``.
+
+        ``send`` devuelve un booleano por mensaje (True si la Queue lo aceptó).
+        Se borran todos los aceptados (la Queue ya los tiene: reenviarlos los
+        duplicaría) y se detiene tras un lote con rechazos o un error; los
+        rechazados quedan para el próximo reenvío. El envío ocurre fuera del
+        lock de SQLite, así ``append`` y ``len`` no esperan a la red. Con
+        ``blocking=False`` devuelve 0 si ya hay otro reenvío en curso.
+        Devuelve la cantidad de mensajes enviados.
+        """
+        if not self._flush_lock.acquire(blocking=blocking):
+            return 0
+        sent = 0
+        try:
+            while sent < max_messages:
+                with self._lock:
+                    queue_id, rows = self._next_batch(min(batch, max_messages - sent))
+                if not rows:
+                    break
+                try:
+                    accepted = send(queue_id, [(content, metadata) for _, content, metadata in rows])
+                except Exception as e:
+                    logger.warning(f"Spool: la Queue {queue_id} sigue sin responder: {e}")
+                    self.mark_failed()
+                    break
+                done = [rowid for (rowid, _, _), ok in zip(rows, accepted) if ok]
+                with self._lock:
+                    self._conn.executemany("DELETE FROM spool WHERE id = ?", [(rowid,) for rowid in done])
+                sent += len(done)
+                if done:
+                    self._failed_until = 0.0
+                if len(done) < len(rows):
+                    break
+        finally:
+            self._flush_lock.release()
+        return sent
+
+    def start_flusher(self, send, interval=SPOOL_FLUSH_INTERVAL):
+        """Reenvía lo pendiente cada ``interval`` segundos desde un hilo de fondo.
+
+        Cubre la instancia que queda sin peticiones con mensajes en el spool;
+        el hilo solo avanza mientras la instancia está viva.
+        """
+        if interval <= 0 or self._flusher is not None:
+            return
+        self._flusher = threading.Thread(target=self._flush_loop, args=(send, interval),
+                                         name="spool-flusher", daemon=True)
+        self._flusher.start()
+
+    def stop_flusher(self):
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+
+    def _flush_loop(self, send, interval):
+        while not self._stop.wait(interval):
+            try:
+                if len(self):
+                    sent = self.flush(send)
+                    logger.info(f"Spool (reenvío de fondo): {sent} mensaje(s) reenviados, pendientes={len(self)}")
+            except Exception as e:
+                logger.warning(f"Spool: error en el reenvío de fondo: {e}")
+
+
+def spool_from_env():
+    """Spool configurado por entorno, o None si está desactivado o no se puede abrir."""
+    if not SPOOL_PATH or SPOOL_PATH.lower() == "none":
+        return None
+    try:
+        return Spool(SPOOL_PATH, SPOOL_MAX_ENTRIES)
+    except sqlite3.Error as e:
+        logger.error(f"No se pudo abrir el spool en {SPOOL_PATH}: {e}")
+        return None
@@ -0,0 +1,46 @@
+"""Pruebas de envelope.py: python -m pytest -q (desde esta carpeta)."""
+import json
+
+import pytest
+
+from envelope import CONTENT_ENCODING, ENVELOPE_VERSION, decode, encode, is_compressed
+
+
+def _body(rows=100):
+    return {
+        "payload": {"data": {"intent": {"data": {"handle": "int-1"}}},
+                    "items": [{"n": i, "descripción": "débito"} for i in range(rows)]},
+        "pathParams": "int-1",
+        "channel": "Committed",
+    }
+
+
+def test_plain_round_trip():
+    content, metadata = encode(_body(), compress=False)
+    assert metadata == {}
+    assert json.loads(content) == _body()
+    assert decode(content) == _body()
+
+
+def test_compressed_round_trip():
+    content, metadata = encode(_body(), compress=True)
+    assert metadata == {"envelopeVersion": ENVELOPE_VERSION, "contentEncoding": CONTENT_ENCODING}
+    assert is_compressed(json.loads(content))
+    assert len(content) < len(json.dumps(_body()))
+    assert decode(content) == _body()
+    # El Service Connector entrega el content ya parseado
+    assert decode(json.loads(content)) == _body()
+    assert decode(content.encode("utf-8")) == _body()
+
+
+def test_small_body_stays_plain():
+    body = {"channel": "Prepared", "payload": {}}
+    content, metadata = encode(body, compress=True)
+    assert metadata == {}
+    assert decode(content) == body
+
+
+def test_invalid_compressed_content_raises_value_error():
+    broken = json.dumps({"envelopeVersion": "2", "contentEncoding": CONTENT_ENCODING, "data": "no-es-zlib"})
+    with pytest.raises(ValueError):
+        decode(broken)
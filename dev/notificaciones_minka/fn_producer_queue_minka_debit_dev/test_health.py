@@ -0,0 +1,59 @@
+"""Pruebas de health.health_mode: python -m pytest -q (desde esta carpeta)."""
+import pytest
+
+import health
+from health import DEEP, SHALLOW, health_mode
+
+BASE = "/rest/b2b/fiducia/minka/v2"
+
+
+class Ctx:
+    def __init__(self, url=None, headers=None):
+        self._url = url
+        self._headers = headers or {}
+
+    def RequestURL(self):
+        return self._url
+
+    def Headers(self):
+        return self._headers
+
+
+@pytest.mark.parametrize("headers, expected", [
+    ({"health_check": "true"}, SHALLOW),
+    ({"health_check": ["Deep"]}, DEEP),
+    ({"health_check": "false"}, None),
+    ({}, None),
+])
+def test_header(headers, expected):
+    assert health_mode(Ctx(f"{BASE}/debits", headers)) == expected
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("/health", SHALLOW),
+    ("/health/", SHALLOW),
+    ("https://gw.example.com/health?deep=true", DEEP),
+    ("/health?deep=0", SHALLOW),
+    (f"{BASE}/intents/health", None),
+    (f"{BASE}/health", None),
+    ("/healthz", None),
+    (f"{BASE}/debits", None),
+    (None, None),
+])
+def test_default_path_is_exact(url, expected):
+    assert health_mode(Ctx(url)) == expected
+
+
+def test_configured_path_with_prefix(monkeypatch):
+    monkeypatch.setattr(health, "HEALTH_PATH", f"{BASE}/health")
+    assert health_mode(Ctx(f"{BASE}/health")) == SHALLOW
+    assert health_mode(Ctx(f"{BASE}/health?deep=true")) == DEEP
+    assert health_mode(Ctx("/health")) is None
+    assert health_mode(Ctx(f"{BASE}/intents/health")) is None
+
+
+def test_empty_path_disables_url_probe(monkeypatch):
+    monkeypatch.setattr(health, "HEALTH_PATH", "")
+    assert health_mode(Ctx("/")) is None
+    assert health_mode(Ctx("/health")) is None
+    assert health_mode(Ctx("/", {"health_check": "true"})) == SHALLOW
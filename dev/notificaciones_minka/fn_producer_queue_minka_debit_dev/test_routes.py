@@ -0,0 +1,49 @@
+"""Pruebas de routes.match_route: python -m pytest -q (desde esta carpeta)."""
+import pytest
+
+from routes import MethodNotAllowed, match_route
+
+BASE = "/rest/b2b/fiducia/minka/v2"
+
+
+@pytest.mark.parametrize("url, method, expected", [
+    (f"{BASE}/debits", "POST", ("Prepared", {})),
+    (f"{BASE}/debits/dbt-1/abort", "POST", ("Aborted", {"handle": "dbt-1"})),
+    (f"{BASE}/debits/int-1/commit", "POST", ("Committed", {"intentHandle": "int-1"})),
+    (f"{BASE}/intents/int-1", "PUT", ("Completed", {"intentHandle": "int-1"})),
+])
+def test_known_routes(url, method, expected):
+    assert match_route(url, method) == expected
+
+
+def test_trailing_slash_query_and_method_case():
+    assert match_route(f"https://gw.example.com{BASE}/debits/int-1/commit/?x=1", "post") == \
+        ("Committed", {"intentHandle": "int-1"})
+
+
+@pytest.mark.parametrize("url", [
+    None,
+    "",
+    f"{BASE}/credits",
+    f"{BASE}/debits/int-1/commit/extra",
+    f"{BASE}/intents",
+])
+def test_unknown_route_is_none(url):
+    # El handler responde 404
+    assert match_route(url, "POST") is None
+
+
+@pytest.mark.parametrize("url, method, allowed", [
+    (f"{BASE}/debits", "GET", ("POST",)),
+    (f"{BASE}/debits", "DELETE", ("POST",)),
+    (f"{BASE}/intents/int-1", "POST", ("PUT",)),
+])
+def test_known_route_with_wrong_method_raises(url, method, allowed):
+    # El handler responde 405 con la cabecera Allow
+    with pytest.raises(MethodNotAllowed) as e:
+        match_route(url, method)
+    assert e.value.allowed == allowed
+
+
+def test_without_method_matches_path_only():
+    assert match_route(f"{BASE}/intents/int-1") == ("Completed", {"intentHandle": "int-1"})
@@ -0,0 +1,154 @@
+"""Pruebas de spool.Spool: python -m pytest -q (desde esta carpeta)."""
+import threading
+
+import pytest
+
+from spool import Spool, SpoolFull
+
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FakeQueue:
+    """Queue que registra los envíos; ``reject`` marca contents rechazados y ``down`` la deja caída."""
+
+    def __init__(self):
+        self.sent = []
+        self.reject = set()
+        self.down = False
+
+    def __call__(self, queue_id, entries):
+        if self.down:
+            raise ConnectionError("Queue caída")
+        accepted = []
+        for content, metadata in entries:
+            ok = content not in self.reject
+            if ok:
+                self.sent.append((queue_id, content, metadata))
+            accepted.append(ok)
+        return accepted
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "spool.sqlite3")
+
+
+def test_flush_replays_in_append_order(path):
+    spool = Spool(path)
+    for i in range(45):
+        spool.append("q1", f"m{i}", {"n": i})
+    queue = FakeQueue()
+    assert spool.flush(queue, batch=20) == 45
+    assert [content for _, content, _ in queue.sent] == [f"m{i}" for i in range(45)]
+    assert queue.sent[3][2] == {"n": 3}
+    assert len(spool) == 0
+
+
+def test_flush_follows_oldest_pending_queue(path):
+    spool = Spool(path)
+    spool.append("q1", "a", {})
+    spool.append("q2", "b", {})
+    spool.append("q1", "c", {})
+    queue = FakeQueue()
+    spool.flush(queue)
+    assert [(q, c) for q, c, _ in queue.sent] == [("q1", "a"), ("q1", "c"), ("q2", "b")]
+
+
+def test_flush_respects_max_messages(path):
+    spool = Spool(path)
+    for i in range(5):
+        spool.append("q1", f"m{i}", {})
+    queue = FakeQueue()
+    assert spool.flush(queue, max_messages=3) == 3
+    assert len(spool) == 2
+
+
+def test_rejected_message_stays_without_duplicating_accepted_ones(path):
+    spool = Spool(path)
+    for content in ("a", "b", "c"):
+        spool.append("q1", content, {})
+    spool.append("q1", "d", {})
+    queue = FakeQueue()
+    queue.reject = {"b"}
+    # La Queue acepta a, c y d del mismo lote; solo b queda pendiente
+    assert spool.flush(queue, batch=3) == 2
+    assert len(spool) == 2
+    queue.reject = set()
+    assert spool.flush(queue) == 2
+    assert [c for _, c, _ in queue.sent] == ["a", "c", "b", "d"]
+
+
+def test_pending_messages_survive_reopen(path):
+    spool = Spool(path)
+    spool.append("q1", "a", {"k": "v"})
+    spool.append("q1", "b", {})
+    spool._conn.close()
+
+    reopened = Spool(path)
+    queue = FakeQueue()
+    assert reopened.flush(queue) == 2
+    assert [(c, m) for _, c, m in queue.sent] == [("a", {"k": "v"}), ("b", {})]
+
+
+def test_spool_full(path):
+    spool = Spool(path, max_entries=2)
+    spool.append("q1", "a", {})
+    spool.append("q1", "b", {})
+    with pytest.raises(SpoolFull):
+        spool.append("q1", "c", {})
+
+
+def test_queue_failure_opens_window_until_a_flush_succeeds(path):
+    clock = FakeClock()
+    spool = Spool(path, failure_window=30, clock=clock)
+    spool.append("q1", "a", {})
+    queue = FakeQueue()
+    queue.down = True
+    assert spool.flush(queue) == 0
+    assert spool.failing()
+    assert len(spool) == 1
+
+    clock.now = 10
+    queue.down = False
+    assert spool.flush(queue) == 1
+    assert not spool.failing()
+
+
+def test_failure_window_expires(path):
+    clock = FakeClock()
+    spool = Spool(path, failure_window=30, clock=clock)
+    spool.mark_failed()
+    clock.now = 29
+    assert spool.failing()
+    clock.now = 31
+    assert not spool.failing()
+
+
+def test_append_and_len_do_not_wait_for_flush_io(path):
+    spool = Spool(path)
+    spool.append("q1", "a", {})
+    sending = threading.Event()
+    release = threading.Event()
+
+    def slow_send(queue_id, entries):
+        sending.set()
+        release.wait(5)
+        return [True] * len(entries)
+
+    flusher = threading.Thread(target=spool.flush, args=(slow_send,))
+    flusher.start()
+    assert sending.wait(5)
+    # Mientras el envío está en curso: append y len responden y otro reenvío no espera
+    spool.append("q1", "b", {})
+    assert len(spool) == 2
+    assert spool.flush(FakeQueue(), blocking=False) == 0
+    release.set()
+    flusher.join(5)
+    # El reenvío en curso también toma el mensaje agregado mientras enviaba
+    assert len(spool) == 0
@@ -0,0 +1,56 @@
+"""Pruebas de validation.py: python -m pytest -q (desde esta carpeta)."""
+import json
+
+import pytest
+
+import validation
+from validation import check_body_size, check_message_size, compile_schema, validate
+
+
+def _prepared(**data):
+    body = {"data": {"handle": "dbt-1", "amount": 100, "intent": {"data": {"handle": "int-1"}}}}
+    body["data"].update(data)
+    return body
+
+
+def test_valid_bodies_pass():
+    assert validate("Prepared", _prepared()) is None
+    assert validate("Committed", {"data": {"handle": "dbt-1"}}) is None
+    assert validate("Completed", {"data": {"intent": {"meta": {"status": "completed"}}}}) is None
+
+
+@pytest.mark.parametrize("channel, body, error", [
+    ("Prepared", {}, "$.data: requerido"),
+    ("Prepared", {"data": {"handle": "dbt-1"}}, "$.data.intent: requerido"),
+    ("Prepared", _prepared(amount="100"), "$.data.amount: se esperaba number"),
+    ("Prepared", _prepared(amount=True), "$.data.amount: se esperaba number"),
+    ("Prepared", _prepared(handle="x" * 257), "$.data.handle: supera 256 caracteres"),
+    ("Committed", [], "$: se esperaba object"),
+    ("Completed", {"data": {}}, "$.data.intent: requerido"),
+])
+def test_schema_failures(channel, body, error):
+    assert validate(channel, body) == error
+
+
+def test_unknown_channel():
+    assert validate("Otro", {}) == "canal sin esquema: Otro"
+
+
+def test_enum():
+    check = compile_schema({"type": "string", "enum": ["a", "b"]})
+    assert check("a") is None
+    assert check("c") == "$: valor no permitido 'c'"
+
+
+def test_oversized_body():
+    assert check_body_size(b"x" * validation.MAX_BODY_BYTES) is None
+    assert check_body_size(b"x" * (validation.MAX_BODY_BYTES + 1)) == \
+        f"el cuerpo supera {validation.MAX_BODY_BYTES} bytes"
+
+
+def test_oversized_message_counts_utf8_bytes():
+    limit = validation.QUEUE_MAX_MESSAGE_BYTES
+    assert check_message_size("a" * limit) is None
+    # "ñ" ocupa dos bytes en UTF-8
+    content = json.dumps({"n": "ñ" * (limit // 2)}, ensure_ascii=False)
+    assert "supera el límite de la Queue" in check_message_size(content)
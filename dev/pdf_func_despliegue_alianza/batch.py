@@ -0,0 +1,184 @@
+"""Generación de PDFs por lotes en un pool de procesos.
+
+ReportLab usa CPU y no libera el GIL, así que el lote se reparte entre
+procesos (uno por núcleo disponible, o ``BATCH_WORKERS``). Los resultados se
+entregan a medida que terminan, con su índice en el lote, para escribirlos
+en streaming: NDJSON (una línea por documento), ZIP o un objeto por
+documento en Object Storage. Los documentos ya cacheados (ver pdf_cache.py)
+no se envían al pool.
+
+En la función, sin ``BATCH_BUCKET`` los PDFs viajan en la respuesta, que OCI
+Functions limita a 6 MB: el lote se acota a BATCH_INLINE_MAX_DOCUMENTS
+documentos y la respuesta se escribe en un ``BoundedBuffer`` de
+BATCH_INLINE_MAX_BYTES. El uso local no tiene ese límite.
+
+Uso local (cierres de mes, fuera de OCI Functions):
+    python batch.py documentos.json --format zip --output cartas.zip
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import sys
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import oci_auth
+import pdf_cache
+
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "0"))
+BATCH_MAX_DOCUMENTS = int(os.getenv("BATCH_MAX_DOCUMENTS", "5000"))
+BATCH_BUCKET = os.getenv("BATCH_BUCKET")
+BATCH_NAMESPACE = os.getenv("BATCH_NAMESPACE")
+BATCH_PREFIX = os.getenv("BATCH_PREFIX", "pdf-batches/")
+BATCH_INLINE_MAX_DOCUMENTS = int(os.getenv("BATCH_INLINE_MAX_DOCUMENTS", "50"))
+BATCH_INLINE_MAX_BYTES = int(os.getenv("BATCH_INLINE_MAX_BYTES", str(5 * 1024 * 1024)))
+
+
+class InlineLimitExceeded(Exception):
+    pass
+
+
+class BoundedBuffer(io.BytesIO):
+    """BytesIO que lanza InlineLimitExceeded antes de superar ``max_bytes``."""
+
+    def __init__(self, max_bytes):
+        super().__init__()
+        self.max_bytes = max_bytes
+
+    def write(self, data):
+        if self.tell() + len(data) > self.max_bytes:
+            raise InlineLimitExceeded(f"la respuesta del lote supera {self.max_bytes} bytes")
+        return super().write(data)
+
+
+def pool_size():
+    if BATCH_WORKERS > 0:
+        return BATCH_WORKERS
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except AttributeError:
+        return max(1, os.cpu_count() or 1)
+
+
+def render_pdf(payload: dict):
+    """Genera un PDF en memoria. Se ejecuta en los procesos del pool."""
+    from func import crear_pdf_reportlab
+    out = io.BytesIO()
+    crear_pdf_reportlab(out, payload)
+    return out.getvalue()
+
+
+def render_batch(payloads, cache=None, workers=None, render=render_pdf):
+    """Genera los PDFs del lote y produce (índice, pdf, cache) o (índice, None, error) al terminar cada uno.
+
+    Mantiene como máximo dos documentos por proceso en vuelo, de modo que la
+    memoria no crece con el tamaño del lote.
+    """
+    workers = workers or pool_size()
+    pending = {}
+    items = iter(enumerate(payloads))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            while len(pending) < workers * 2:
+                item = next(items, None)
+                if item is None:
+                    break
+                index, payload = item
+                key = pdf_cache.cache_key(payload) if cache else None
+                if cache:
+                    pdf, tier = cache.get(key)
+                    if pdf is not None:
+                        yield index, pdf, "hit"
+                        continue
+                pending[pool.submit(render, payload)] = (index, key)
+            if not pending:
+                return
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, key = pending.pop(future)
+                try:
+                    pdf = future.result()
+                except Exception as e:
+                    yield index, None, str(e)
+                    continue
+                if cache:
+                    cache.put(key, pdf)
+                yield index, pdf, "miss"
+
+
+def ndjson_lines(results):
+    """Una línea JSON por documento, en el orden en que terminan."""
+    for index, pdf, info in results:
+        if pdf is None:
+            yield json.dumps({"index": index, "ok": False, "error": info}) + "\n"
+        else:
+            yield json.dumps({"index": index, "ok": True, "cache": info,
+                              "pdf_base64": base64.b64encode(pdf).decode("utf-8")}) + "\n"
+
+
+def write_zip(results, fileobj):
+    """Escribe cada PDF en el ZIP apenas termina; los errores van en errores.json."""
+    errors = []
+    count = 0
+    with zipfile.ZipFile(fileobj, "w", compression=zipfile.ZIP_STORED) as zf:
+        for index, pdf, info in results:
+            if pdf is None:
+                errors.append({"index": index, "error": info})
+                continue
+            # Los PDF ya vienen comprimidos: se guardan sin volver a comprimir
+            zf.writestr(f"documento_{index:05d}.pdf", pdf)
+            count += 1
+        if errors:
+            zf.writestr("errores.json", json.dumps(errors, ensure_ascii=False))
+    return count, errors
+
+
+def upload_lines(results, batch_id):
+    """Sube cada PDF a BATCH_BUCKET apenas termina y produce una línea NDJSON con su objeto."""
+    import oci
+    config, signer = oci_auth.client_args()
+    client = oci.object_storage.ObjectStorageClient(config=config, signer=signer)
+    namespace = BATCH_NAMESPACE or client.get_namespace().data
+    for index, pdf, info in results:
+        if pdf is None:
+            yield json.dumps({"index": index, "ok": False, "error": info}) + "\n"
+            continue
+        name = f"{BATCH_PREFIX}{batch_id}/documento_{index:05d}.pdf"
+        try:
+            client.put_object(namespace, BATCH_BUCKET, name, pdf, content_type="application/pdf")
+        except Exception as e:
+            yield json.dumps({"index": index, "ok": False, "error": f"Error subiendo {name}: {e}"}) + "\n"
+            continue
+        yield json.dumps({"index": index, "ok": True, "cache": info, "object": name}) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="JSON con una lista de documentos o {\"Documentos\": [...]}")
+    parser.add_argument("--format", choices=("ndjson", "zip"), default="zip")
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    with open(args.input, encoding="utf-8") as f:
+        documents = json.load(f)
+    if isinstance(documents, dict):
+        documents = documents.get("Documentos", [])
+
+    results = render_batch(documents, cache=pdf_cache.cache_from_env(), workers=args.workers)
+    if args.format == "zip":
+        with open(args.output, "wb") as out:
+            count, errors = write_zip(results, out)
+        print(f"{count} documento(s) y {len(errors)} error(es) en {args.output}", file=sys.stderr)
+    else:
+        with open(args.output, "w", encoding="utf-8") as out:
+            out.writelines(ndjson_lines(results))
+        print(f"{len(documents)} línea(s) escritas en {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
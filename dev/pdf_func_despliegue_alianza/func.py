@@ -2,37 +2,123 @@ import io
 import os
 import json
 import base64
+import threading
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
 
 from fdk import response
+from reportlab import rl_config
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
 from reportlab.lib.styles import getSampleStyleSheet
 
-import oci  # SDK de Oracle para enviar a la cola
+import batch
+import jobs
+import oci_auth
+import pdf_cache
+from health import DeepProbe, health_mode, health_response, http_reachable
+from token_provider import authorization_from_env
+
+# Header Authorization hacia TARGET_API_URL: token OAuth en caché o TARGET_API_AUTH (ver token_provider.py)
+_authorization, _token_provider = authorization_from_env("TARGET_API_AUTH")
 
 
 # ---------- Generador de PDF ----------
-def crear_pdf_reportlab(salida_pdf: str, datos: dict):
-    print("[crear_pdf_reportlab] Inicio")
-    doc = SimpleDocTemplate(
-        salida_pdf, pagesize=A4,
-        leftMargin=40, rightMargin=40, topMargin=50, bottomMargin=40
-    )
+# Perfil de salida (PDF_PROFILE):
+#   "default" -> opciones por defecto de ReportLab
+#   "compact" -> streams comprimidos en binario (sin ASCII85, que solo agrega
+#                un 25% antes del base64 del transporte), metadata mínima y
+#                salida determinista (fecha e ID fijos: la misma solicitud
+#                produce los mismos bytes)
+PDF_PROFILE = os.getenv("PDF_PROFILE", "default").lower()
+PDF_PROFILES = {
+    "default": {},
+    "compact": {
+        "pageCompression": 1,
+        "invariant": 1,
+        "useA85": 0,
+        "title": "",
+        "author": "",
+        "subject": "",
+        "creator": "",
+        "producer": "",
+        "keywords": [],
+    },
+}
+
+
+# useA85 es global en ReportLab: se fija solo durante el build de cada documento
+_rl_config_lock = threading.Lock()
+
+# La relación de partícipes se dibuja como tablas consecutivas de
+# PDF_TABLE_CHUNK_ROWS filas (mismas columnas y grilla, se ven como una sola).
+# Una tabla única de N filas se vuelve a partir en cada salto de página y
+# mantiene en memoria todas sus celdas durante el build; por bloques, cada
+# tabla se crea cuando el documento llega a ella y se libera al dibujarse.
+PDF_TABLE_CHUNK_ROWS = int(os.getenv("PDF_TABLE_CHUNK_ROWS", "50"))
+COL_WIDTHS = [120, 180, 180]
+ESTILO_TABLA = [
+    ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+    ("GRID", (0, 0), (-1, -1), 1, colors.black),
+]
+ESTILO_ENCABEZADO = [
+    ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
+    ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
+    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+    ("BOTTOMPADDING", (0, 0), (-1, 0), 10),
+]
+
+
+class _StoryStream(list):
+    """Story que se va completando desde un iterador a medida que ``build`` la consume.
+
+    ``build`` consulta ``len(flowables)`` antes de cada flowable y solo trabaja
+    con los primeros de la lista, así que basta con tener ``window`` cargados.
+    """
+
+    def __init__(self, flowables, window=2):
+        super().__init__()
+        self._pending = iter(flowables)
+        self._window = window
+
+    def __len__(self):
+        while list.__len__(self) < self._window:
+            flowable = next(self._pending, None)
+            if flowable is None:
+                break
+            self.append(flowable)
+        return list.__len__(self)
+
+
+def _tablas_clientes(clientes):
+    """Tablas de PDF_TABLE_CHUNK_ROWS filas; la primera lleva el encabezado."""
+    filas = [["CÉDULA", "NOMBRE", "ENCARGO"]]
+    estilo = ESTILO_ENCABEZADO + ESTILO_TABLA
+    for cliente in clientes:
+        filas.append([cliente.get("cedula",""), cliente.get("nombre",""), cliente.get("encargo","")])
+        if len(filas) == PDF_TABLE_CHUNK_ROWS:
+            yield Table(filas, colWidths=COL_WIDTHS, style=TableStyle(estilo))
+            filas, estilo = [], ESTILO_TABLA
+    if filas:
+        yield Table(filas, colWidths=COL_WIDTHS, style=TableStyle(estilo))
+
+
+def _contenido(datos: dict):
     estilos = getSampleStyleSheet()
-    story = []
-
-    story.append(Paragraph("Señores", estilos["Normal"]))
-    story.append(Spacer(1, 12))
-    story.append(Paragraph("ALIANZA FIDUCIARIA S.A.", estilos["Normal"]))
-    story.append(Spacer(1, 12))
-    story.append(Paragraph(datos.get("Ciudad", "Ciudad"), estilos["Normal"]))
-    story.append(Spacer(1, 36))
-    story.append(Paragraph("Ref.: " + datos.get("Referencia", "Referencia"), estilos["Normal"]))
-    story.append(Spacer(1, 36))
-    story.append(Paragraph("Respetados señores:", estilos["Normal"]))
-    story.append(Spacer(1, 36))
+
+    yield Paragraph("Señores", estilos["Normal"])
+    yield Spacer(1, 12)
+    yield Paragraph("ALIANZA FIDUCIARIA S.A.", estilos["Normal"])
+    yield Spacer(1, 12)
+    yield Paragraph(datos.get("Ciudad", "Ciudad"), estilos["Normal"])
+    yield Spacer(1, 36)
+    yield Paragraph("Ref.: " + datos.get("Referencia", "Referencia"), estilos["Normal"])
+    yield Spacer(1, 36)
+    yield Paragraph("Respetados señores:", estilos["Normal"])
+    yield Spacer(1, 36)
 
     texto = (
         "En desarrollo del Plan de Pensiones Institucional ofrecido por la entidad patrocinadora con NIT "
@@ -41,125 +127,421 @@ def crear_pdf_reportlab(salida_pdf: str, datos: dict):
         +datos.get("Plan", "")
         + " de acuerdo con las condiciones de administración contenidas en el mismo."
     )
-    story.append(Paragraph(texto, estilos["Normal"]))
-    story.append(Spacer(1, 12))
-
-    tabla_datos = [["CÉDULA", "NOMBRE", "ENCARGO"]]
-    for cliente in datos.get("Clientes", []):
-        fila = [cliente.get("cedula",""), cliente.get("nombre",""), cliente.get("encargo","")]
-        tabla_datos.append(fila)
-
-    col_widths = [120, 180, 180]
-    tabla = Table(tabla_datos, colWidths=col_widths)
-    tabla.setStyle(TableStyle([
-        ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
-        ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
-        ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-        ("BOTTOMPADDING", (0, 0), (-1, 0), 10),
-        ("GRID", (0, 0), (-1, -1), 1, colors.black),
-    ]))
-    story.append(tabla)
-    story.append(Spacer(1, 24))
-    story.append(Paragraph("Con la presente, suscribimos la obligación a cargo de la entidad patrocinadora a suministrar la relación de los partícipes cuando se realice un aporte o se presente una novedad de ingreso o de retiro de partícipes, caso en el cual se incluirá la justificación del retiro.", estilos["Normal"]))
-    story.append(Spacer(1, 12))
-    story.append(Paragraph("De igual manera, nos comprometemos a informar la cuenta y la entidad financiera para consignación o a retirar los recursos destinados al Plan, en caso de presentarse condición fallida sobre los aportes condicionados a favor de los partícipes, si para este evento se contempla la devolución de los saldos condicionados a favor de la patrocinadora.", estilos["Normal"]))
-    story.append(Spacer(1, 12))
-    story.append(Paragraph("Agradecemos su atención.", estilos["Normal"]))
-    story.append(Spacer(1, 36))
-    story.append(Paragraph("Firma del Representante Legal,", estilos["Normal"]))
-    story.append(Spacer(1, 12))
-    story.append(Paragraph(datos.get("Representante", "Representante"), estilos["Normal"]))
-
-    doc.build(story)
+    yield Paragraph(texto, estilos["Normal"])
+    yield Spacer(1, 12)
+
+    yield from _tablas_clientes(datos.get("Clientes", []))
+    yield Spacer(1, 24)
+    yield Paragraph("Con la presente, suscribimos la obligación a cargo de la entidad patrocinadora a suministrar la relación de los partícipes cuando se realice un aporte o se presente una novedad de ingreso o de retiro de partícipes, caso en el cual se incluirá la justificación del retiro.", estilos["Normal"])
+    yield Spacer(1, 12)
+    yield Paragraph("De igual manera, nos comprometemos a informar la cuenta y la entidad financiera para consignación o a retirar los recursos destinados al Plan, en caso de presentarse condición fallida sobre los aportes condicionados a favor de los partícipes, si para este evento se contempla la devolución de los saldos condicionados a favor de la patrocinadora.", estilos["Normal"])
+    yield Spacer(1, 12)
+    yield Paragraph("Agradecemos su atención.", estilos["Normal"])
+    yield Spacer(1, 36)
+    yield Paragraph("Firma del Representante Legal,", estilos["Normal"])
+    yield Spacer(1, 12)
+    yield Paragraph(datos.get("Representante", "Representante"), estilos["Normal"])
+
+
+def crear_pdf_reportlab(salida_pdf, datos: dict, profile: str = None):
+    print("[crear_pdf_reportlab] Inicio")
+    opciones = dict(PDF_PROFILES[profile or PDF_PROFILE])
+    use_a85 = opciones.pop("useA85", rl_config.useA85)
+    doc = SimpleDocTemplate(
+        salida_pdf, pagesize=A4,
+        leftMargin=40, rightMargin=40, topMargin=50, bottomMargin=40,
+        **opciones
+    )
+
+    with _rl_config_lock:
+        previo, rl_config.useA85 = rl_config.useA85, use_a85
+        try:
+            doc.build(_StoryStream(_contenido(datos)))
+        finally:
+            rl_config.useA85 = previo
     print("[crear_pdf_reportlab] PDF generado con éxito")
 
 
 # ---------- Publicar en OCI Queue ----------
-# ---------- Publicar en OCI Queue ----------
+# El signer de resource principal y el QueueClient se crean una vez por
+# instancia y se renuevan pasado QUEUE_CLIENT_TTL o si la Queue responde 401.
+# Con PUBLISH_ASYNC=true la publicación se hace en un hilo de fondo y la
+# respuesta no espera el put; OCI Functions puede congelar la instancia tras
+# responder, así que el envío puede completarse en la siguiente invocación.
+QUEUE_CLIENT_TTL = int(os.getenv("QUEUE_CLIENT_TTL", "900"))
+PUBLISH_ASYNC = os.getenv("PUBLISH_ASYNC", "false").lower() == "true"
+
+_queue_lock = threading.Lock()
+_queue_clients = {}
+_publisher = ThreadPoolExecutor(max_workers=1) if PUBLISH_ASYNC else None
+
+
+def _get_queue_client(refresh=False, endpoint=None):
+    # Leer endpoint de variable de entorno (más flexible que hardcodear)
+    queue_endpoint = endpoint or os.getenv("OCI_QUEUE_ENDPOINT")
+    with _queue_lock:
+        client, created = _queue_clients.get(queue_endpoint, (None, 0.0))
+        if client is None or time.monotonic() - created > QUEUE_CLIENT_TTL or refresh:
+            # SDK de Oracle para enviar a la cola; se importa al crear el primer cliente
+            # (~40 MB que no hacen falta para generar el PDF ni para el health check)
+            import oci
+
+            config, signer = oci_auth.client_args()
+            client = oci.queue.QueueClient(
+                config=config,
+                signer=signer,
+                service_endpoint=queue_endpoint
+            )
+            _queue_clients[queue_endpoint] = (client, time.monotonic())
+        return client
+
+
+def _put_message(queue_id, message: dict, endpoint=None):
+    import oci
+
+    details = oci.queue.models.PutMessagesDetails(
+        messages=[oci.queue.models.PutMessagesDetailsEntry(content=json.dumps(message))]
+    )
+    try:
+        _get_queue_client(endpoint=endpoint).put_messages(queue_id, put_messages_details=details)
+    except oci.exceptions.ServiceError as e:
+        if e.status != 401:
+            raise
+        # Token de resource principal vencido: se recrea el cliente y se reintenta una vez
+        _get_queue_client(refresh=True, endpoint=endpoint).put_messages(queue_id, put_messages_details=details)
+
+
+def _publish_in_background(queue_id, message: dict):
+    try:
+        _put_message(queue_id, message)
+        print("[queue] Mensaje publicado con éxito (segundo plano)")
+    except Exception as e:
+        print("[queue] Error publicando en la cola (segundo plano):", str(e))
+
+
 def publish_to_queue(message: dict):
     queue_id = os.getenv("OCI_QUEUE_ID")
     if not queue_id:
         print("[queue] OCI_QUEUE_ID no configurado, no se publica")
         return
 
+    if _publisher is not None:
+        _publisher.submit(_publish_in_background, queue_id, message)
+        return "[queue] Publicación en curso (asíncrona)"
+
     try:
-        signer = oci.auth.signers.get_resource_principals_signer()
+        _put_message(queue_id, message)
+        return "[queue] Mensaje publicado con éxito"
+    except Exception as e:
+        return "[queue] Error publicando en la cola:", str(e)
 
-        # Leer endpoint de variable de entorno (más flexible que hardcodear)
-        queue_endpoint = os.getenv("OCI_QUEUE_ENDPOINT")
 
-        # Cliente con endpoint correcto
-        queue_client = oci.queue.QueueClient(
-            config={}, 
-            signer=signer, 
-            service_endpoint=queue_endpoint
-        )
 
-        queue_client.put_messages(
-            queue_id,
-            put_messages_details=oci.queue.models.PutMessagesDetails(
-                messages=[oci.queue.models.PutMessagesDetailsEntry(content=json.dumps(message))]
-            )
-        )
-        return "[queue] Mensaje publicado con éxito"
+# ---------- Generación y entrega ----------
+# PDFs ya generados por contenido de la solicitud (ver pdf_cache.py)
+_pdf_cache = pdf_cache.cache_from_env()
+
+
+def generar_y_entregar(payload: dict, job_id=None):
+    """Genera el PDF, lo reenvía a TARGET_API_URL y publica el resultado en la cola.
+
+    Devuelve (status_code, result) con el mismo contenido de la respuesta síncrona.
+    """
+    key = pdf_cache.cache_key(payload)
+    pdf, tier = _pdf_cache.get(key)
+    if pdf is None:
+        out_path = f"/tmp/salida_{job_id}.pdf" if job_id else "/tmp/salida.pdf"
+        crear_pdf_reportlab(out_path, payload)
+
+        with open(out_path, "rb") as f:
+            pdf = f.read()
+        if job_id:
+            os.remove(out_path)
+        _pdf_cache.put(key, pdf)
+    cache = {"cache": "hit" if tier else "miss", "cache_tier": tier}
+    print(f"[cache] {cache['cache']} ({tier or 'render'}), tasa de aciertos={_pdf_cache.hit_ratio():.2f}")
+    pdf_b64 = base64.b64encode(pdf).decode("utf-8")
+
+    target_url = os.getenv("TARGET_API_URL")
+
+    if not target_url:
+        return 200, {"ok": True, "pdf_base64": pdf_b64, "Queue": None, **cache}
+
+    headers = {"Content-Type": "application/json"}
+    target_auth = _authorization()
+    if target_auth:
+        headers["Authorization"] = target_auth
+
+    payload_out = {"pdf_base64": pdf_b64, "metadata": payload}
+    r = requests.post(target_url, headers=headers, json=payload_out, timeout=30)
+
+    forward_status = r.status_code
+    if forward_status == 401 and _token_provider:
+        _token_provider.invalidate(target_auth)
+    try:
+        forward_body = r.json()
+    except Exception:
+        forward_body = r.text[:512]
+
+    # Publicar en la cola el resultado del reenvío
+    message = {"status": forward_status, "body": forward_body, "metadata": payload}
+    if job_id:
+        message["job_id"] = job_id
+    pqueue = publish_to_queue(message)
+
+    if forward_status == 200:
+        return 200, {"ok": True, "message": "Proceso completado con éxito", "Queue": pqueue, "pdf_base64": pdf_b64, "APIGW_receiver_response": forward_body, **cache}
+    return 500, {"ok": False, "error": f"Fallo en el reenvío: {forward_status}", "body": forward_body, "Queue": pqueue, "pdf_base64": pdf_b64, **cache}
+
+
+# ---------- Modo trabajo (asíncrono) ----------
+# Con "Prefer: respond-async" (o JOB_MODE=always) la solicitud se encola en
+# JOB_QUEUE_ID y se responde 202 con un job_id. La solicitud queda en el almacén
+# de trabajos (ver jobs.py) y el mensaje solo lleva el job_id. El trabajo lo procesa esta
+# misma función cuando el Service Connector le entrega la JOB_QUEUE_ID, o
+# worker.py en modo pull. El estado se consulta con GET ?job_id=<id> o
+# GET .../jobs/<id>, y el resultado también sale en el mensaje de la cola de
+# resultados (campo job_id).
+JOB_QUEUE_ID = os.getenv("JOB_QUEUE_ID")
+JOB_QUEUE_ENDPOINT = os.getenv("JOB_QUEUE_ENDPOINT")
+JOB_MODE = os.getenv("JOB_MODE", "request").lower()
+
+_job_store = None
+
+
+def _get_job_store():
+    global _job_store
+    if _job_store is None:
+        _job_store = jobs.store_from_env()
+    return _job_store
+
+
+def _wants_job(headers: dict):
+    if JOB_MODE == "always":
+        return True
+    return "respond-async" in str(headers.get("prefer", "")).lower()
+
+
+def _job_id_from_url(request_url):
+    if not request_url:
+        return None
+    parts = urlsplit(request_url)
+    job_id = parse_qs(parts.query).get("job_id", [None])[0]
+    if not job_id:
+        segments = [s for s in parts.path.split("/") if s]
+        if len(segments) >= 2 and segments[-2] == "jobs":
+            job_id = segments[-1]
+    return job_id if jobs.is_job_id(job_id) else None
+
+
+def enqueue_job(payload: dict):
+    """Registra el trabajo y lo encola en JOB_QUEUE_ID. Devuelve el registro guardado.
+
+    La solicitud se guarda en el almacén y en la Queue solo viaja el job_id:
+    un documento grande supera el tamaño máximo de un mensaje. El registro
+    "queued" se guarda antes del put: escrito después podría pisar el estado
+    de un worker que ya tomó el mensaje. Si el put falla, el trabajo queda
+    "failed" con el error, en lugar de "queued" para siempre.
+    """
+    job_id = jobs.new_job_id()
+    store = _get_job_store()
+    store.put_payload(job_id, payload)
+    job = jobs.new_job(job_id)
+    store.put(job)
+    try:
+        _put_message(JOB_QUEUE_ID, {"job_id": job_id}, endpoint=JOB_QUEUE_ENDPOINT)
     except Exception as e:
-        return "[queue] Error publicando en la cola:", str(e)
+        print(f"[job] Error encolando el trabajo {job_id}:", str(e))
+        return jobs.update(store, job_id, status=jobs.FAILED,
+                           result={"ok": False, "error": f"No se pudo encolar el trabajo: {e}"})
+    print(f"[job] Trabajo {job_id} encolado")
+    return job
+
+
+def process_job(job_id, payload: dict = None):
+    """Ejecuta un trabajo encolado y guarda su resultado. Devuelve el registro final.
+
+    Sin ``payload`` (el mensaje solo trae el job_id) la solicitud se lee del almacén.
+    """
+    store = _get_job_store()
+    job = store.get(job_id)
+    if job and job["status"] in (jobs.SUCCEEDED, jobs.FAILED):
+        # Reentrega de la Queue de un trabajo ya resuelto
+        return job
+    if payload is None:
+        payload = store.get_payload(job_id)
+        if payload is None:
+            print(f"[job] Trabajo {job_id} sin solicitud guardada")
+            return jobs.update(store, job_id, status=jobs.FAILED,
+                               result={"ok": False, "error": "Solicitud del trabajo no encontrada"})
+    jobs.update(store, job_id, status=jobs.RUNNING)
+    try:
+        status_code, result = generar_y_entregar(payload, job_id)
+    except Exception as e:
+        status_code, result = 500, {"ok": False, "error": str(e)}
+    status = jobs.SUCCEEDED if status_code == 200 else jobs.FAILED
+    print(f"[job] Trabajo {job_id} terminado: {status}")
+    return jobs.update(store, job_id, status=status, result=result)
+
 
+def _process_job_messages(job_messages):
+    """Procesa un trabajo por invocación y devuelve los demás a JOB_QUEUE_ID.
+
+    Un documento grande ocupa buena parte del timeout de la función (func.yaml),
+    así que los trabajos de un lote del Service Connector no se procesan en
+    serie. Si no se pueden reencolar responde 500 para que el conector
+    reentregue el lote; el trabajo ya resuelto no se repite.
+    Devuelve (status_code, cuerpo).
+    """
+    processed, rest = [], []
+    if job_messages:
+        job = process_job(*job_messages[0])
+        processed.append({"job_id": job["job_id"], "status": job["status"]})
+        rest = job_messages[1:]
+    if rest and not JOB_QUEUE_ID:
+        # Sin JOB_QUEUE_ID no hay dónde reencolar: se procesan en esta invocación
+        for job_id, job_payload in rest:
+            job = process_job(job_id, job_payload)
+            processed.append({"job_id": job["job_id"], "status": job["status"]})
+        rest = []
+    try:
+        for job_id, job_payload in rest:
+            message = {"job_id": job_id} if job_payload is None else {"job_id": job_id, "payload": job_payload}
+            _put_message(JOB_QUEUE_ID, message, endpoint=JOB_QUEUE_ENDPOINT)
+            processed.append({"job_id": job_id, "status": jobs.QUEUED})
+    except Exception as e:
+        print("[job] Error reencolando trabajos del lote:", str(e))
+        return 500, {"ok": False, "error": f"No se pudieron reencolar los trabajos: {e}", "processed": processed}
+    if rest:
+        print(f"[job] {len(rest)} trabajo(s) del lote reencolados para otras invocaciones")
+    return 200, {"processed": processed}
+
+
+def _job_messages(body):
+    """Trabajos (job_id, payload) si el cuerpo es un lote del Service Connector de JOB_QUEUE_ID."""
+    if not isinstance(body, list):
+        return None
+    items = []
+    for item in body:
+        if isinstance(item, str):
+            item = json.loads(item)
+        if not isinstance(item, dict) or not jobs.is_job_id(item.get("job_id")):
+            return None
+        items.append((item["job_id"], item.get("payload")))
+    return items
+
+
+def _json_response(ctx, status_code, body):
+    return response.Response(
+        ctx, status_code=status_code,
+        headers={"Content-Type": "application/json"},
+        response_data=json.dumps(body, ensure_ascii=False)
+    )
+
+
+# ---------- Lotes ----------
+def procesar_lote(ctx, body: dict):
+    """Genera un lote {"Documentos": [...], "Formato": "ndjson"|"zip"} en el pool de procesos.
+
+    Con BATCH_BUCKET cada PDF se sube a Object Storage al terminar y la respuesta
+    es el manifiesto NDJSON; si no, los PDFs van en la respuesta (NDJSON o ZIP),
+    acotada a BATCH_INLINE_MAX_DOCUMENTS documentos y BATCH_INLINE_MAX_BYTES
+    (OCI Functions no entrega respuestas de más de 6 MB): por encima, 413.
+    """
+    documentos = body.get("Documentos")
+    if not isinstance(documentos, list) or not all(isinstance(d, dict) for d in documentos):
+        return _json_response(ctx, 400, {"ok": False, "error": "Documentos debe ser una lista de objetos"})
+    if len(documentos) > batch.BATCH_MAX_DOCUMENTS:
+        return _json_response(ctx, 413, {"ok": False, "error": f"El lote supera {batch.BATCH_MAX_DOCUMENTS} documentos"})
+    if not batch.BATCH_BUCKET and len(documentos) > batch.BATCH_INLINE_MAX_DOCUMENTS:
+        return _json_response(ctx, 413, {
+            "ok": False,
+            "error": f"Sin BATCH_BUCKET el lote admite hasta {batch.BATCH_INLINE_MAX_DOCUMENTS} documentos"
+        })
+
+    formato = str(body.get("Formato", "ndjson")).lower()
+    results = batch.render_batch(documentos, cache=_pdf_cache)
+    print(f"[lote] {len(documentos)} documento(s), {batch.pool_size()} proceso(s), formato={formato}")
+
+    if batch.BATCH_BUCKET:
+        lines = "".join(batch.upload_lines(results, jobs.new_job_id()))
+        return response.Response(ctx, status_code=200,
+                                 headers={"Content-Type": "application/x-ndjson"}, response_data=lines)
+    out = batch.BoundedBuffer(batch.BATCH_INLINE_MAX_BYTES)
+    try:
+        if formato == "zip":
+            batch.write_zip(results, out)
+            content_type = "application/zip"
+        else:
+            for line in batch.ndjson_lines(results):
+                out.write(line.encode("utf-8"))
+            content_type = "application/x-ndjson"
+    except batch.InlineLimitExceeded as e:
+        results.close()
+        return _json_response(ctx, 413, {"ok": False, "error": f"{e}; configure BATCH_BUCKET para lotes grandes"})
+    return response.Response(ctx, status_code=200,
+                             headers={"Content-Type": content_type}, response_data=out.getvalue())
+
+
+# ---------- Health check ----------
+# Modo profundo: TARGET_API_URL responde y la cola de resultados responde a GetStats (ver health.py)
+def _health_checks(target_url=os.getenv("TARGET_API_URL"), queue_id=os.getenv("OCI_QUEUE_ID")):
+    return {
+        "target_api": (lambda: http_reachable(target_url)) if target_url else None,
+        "queue": (lambda: _get_queue_client().get_stats(queue_id)) if queue_id else None,
+    }
+
+
+_health_probe = DeepProbe(_health_checks())
 
 
 # ---------- Handler ----------
 def handler(ctx, data: io.BytesIO = None):
+    # Health check: responde antes de leer el cuerpo, generar PDFs o crear clientes
+    mode = health_mode(ctx)
+    if mode:
+        status_code, body = health_response(mode, _health_probe)
+        return response.Response(ctx, status_code=status_code,
+                                 headers={"Content-Type": "application/json"}, response_data=body)
+
     try:
+        headers = {k.lower(): v for k, v in (ctx.Headers() if hasattr(ctx, "Headers") else {}).items()}
+        method = ctx.Method() if hasattr(ctx, "Method") else "POST"
+        request_url = ctx.RequestURL() if hasattr(ctx, "RequestURL") else None
+
+        # Consulta de estado de un trabajo
+        job_id = _job_id_from_url(request_url)
+        if method == "GET" and job_id:
+            job = _get_job_store().get(job_id)
+            if job is None:
+                return _json_response(ctx, 404, {"ok": False, "error": f"Trabajo no encontrado: {job_id}"})
+            return _json_response(ctx, 200, job)
+
         raw = data.getvalue() if data else b"{}"
         payload = json.loads(raw.decode("utf-8") or "{}")
 
-        out_path = "/tmp/salida.pdf"
-        crear_pdf_reportlab(out_path, payload)
+        # Lote de trabajos entregado por el Service Connector
+        job_messages = _job_messages(payload)
+        if job_messages is not None:
+            return _json_response(ctx, *_process_job_messages(job_messages))
 
-        with open(out_path, "rb") as f:
-            pdf_b64 = base64.b64encode(f.read()).decode("utf-8")
-
-        target_url = os.getenv("TARGET_API_URL")
-        target_auth = os.getenv("TARGET_API_AUTH")
-
-        if target_url:
-            headers = {"Content-Type": "application/json"}
-            if target_auth:
-                headers["Authorization"] = target_auth
-
-            payload_out = {"pdf_base64": pdf_b64, "metadata": payload}
-            r = requests.post(target_url, headers=headers, json=payload_out, timeout=30)
-
-            forward_status = r.status_code
-            try:
-                forward_body = r.json()
-            except Exception:
-                forward_body = r.text[:512]
-
-            # Publicar en la cola el resultado del reenvío
-            pqueue = publish_to_queue({"status": forward_status, "body": forward_body, "metadata": payload})
-
-            if forward_status == 200:
-                result = {"ok": True, "message": "Proceso completado con éxito", "Queue": pqueue, "pdf_base64": pdf_b64, "APIGW_receiver_response": r.json()}
-                return response.Response(
-                    ctx, status_code=200,
-                    headers={"Content-Type": "application/json"},
-                    response_data=json.dumps(result, ensure_ascii=False)
-                )
-            else:
-                result = {"ok": False, "error": f"Fallo en el reenvío: {forward_status}", "body": forward_body, "Queue": pqueue, "pdf_base64": pdf_b64}
-                return response.Response(
-                    ctx, status_code=500,
-                    headers={"Content-Type": "application/json"},
-                    response_data=json.dumps(result, ensure_ascii=False)
-                )
-        else:
-            return response.Response(
-                ctx, status_code=200,
-                headers={"Content-Type": "application/json"},
-                response_data=json.dumps({"ok": True, "pdf_base64": pdf_b64, "Queue": pqueue}, ensure_ascii=False)
-            )
+        if isinstance(payload, dict) and "Documentos" in payload:
+            return procesar_lote(ctx, payload)
+
+        if _wants_job(headers):
+            if JOB_QUEUE_ID:
+                job = enqueue_job(payload)
+                if job["status"] == jobs.FAILED:
+                    return _json_response(ctx, 503, {"ok": False, **job})
+                job_id = job["job_id"]
+                status_url = f"{urlsplit(request_url).path}?job_id={job_id}" if request_url else f"?job_id={job_id}"
+                return _json_response(ctx, 202, {
+                    "ok": True, "job_id": job_id, "status": jobs.QUEUED, "status_url": status_url
+                })
+            print("[job] JOB_QUEUE_ID no configurado, se procesa de forma síncrona")
+
+        status_code, result = generar_y_entregar(payload)
+        return _json_response(ctx, status_code, result)
 
     except Exception as e:
         return response.Response(
@@ -0,0 +1,133 @@
+"""Estado de los trabajos de generación de PDF en modo asíncrono.
+
+Cada trabajo se guarda como un JSON con su estado (queued, running,
+succeeded, failed) y el resultado final. Con ``JOB_BUCKET`` se guarda en
+Object Storage (resource principal), de modo que la función que recibe la
+solicitud, el worker y la consulta de estado ven lo mismo; sin bucket se usa
+un directorio local (``JOB_STORE_DIR``), útil en pruebas o en un worker en VM.
+
+La solicitud de cada trabajo también se guarda en el almacén
+(``put_payload``): en la Queue solo viaja el job_id, así los documentos
+grandes no superan el tamaño máximo de un mensaje.
+"""
+import json
+import os
+import re
+import tempfile
+import time
+import uuid
+
+import oci_auth
+
+JOB_BUCKET = os.getenv("JOB_BUCKET")
+JOB_NAMESPACE = os.getenv("JOB_NAMESPACE")
+JOB_PREFIX = os.getenv("JOB_PREFIX", "pdf-jobs/")
+JOB_STORE_DIR = os.getenv("JOB_STORE_DIR", "/tmp/pdf_jobs")
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+_JOB_ID = re.compile(r"[0-9a-f]{32}")
+
+
+def new_job_id():
+    return uuid.uuid4().hex
+
+
+def is_job_id(value):
+    """Solo ids generados por new_job_id: el id forma parte de rutas y nombres de objeto."""
+    return isinstance(value, str) and _JOB_ID.fullmatch(value) is not None
+
+
+def new_job(job_id):
+    now = time.time()
+    return {"job_id": job_id, "status": QUEUED, "created": now, "updated": now}
+
+
+class FileJobStore:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, job_id, suffix=".json"):
+        return os.path.join(self.directory, f"{job_id}{suffix}")
+
+    def _read(self, path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write(self, path, value):
+        # Escritura atómica: la consulta de estado nunca ve un JSON a medias
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def get(self, job_id):
+        return self._read(self._path(job_id))
+
+    def put(self, job):
+        self._write(self._path(job["job_id"]), job)
+
+    def get_payload(self, job_id):
+        return self._read(self._path(job_id, ".payload.json"))
+
+    def put_payload(self, job_id, payload):
+        self._write(self._path(job_id, ".payload.json"), payload)
+
+
+class ObjectStorageJobStore:
+    def __init__(self, bucket, namespace=None, prefix="pdf-jobs/"):
+        import oci
+
+        config, signer = oci_auth.client_args()
+        self.client = oci.object_storage.ObjectStorageClient(config=config, signer=signer)
+        self.namespace = namespace or self.client.get_namespace().data
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def _read(self, name):
+        import oci
+
+        try:
+            obj = self.client.get_object(self.namespace, self.bucket, f"{self.prefix}{name}")
+        except oci.exceptions.ServiceError as e:
+            if e.status == 404:
+                return None
+            raise
+        return json.loads(obj.data.content.decode("utf-8"))
+
+    def _write(self, name, value):
+        self.client.put_object(
+            self.namespace, self.bucket, f"{self.prefix}{name}",
+            json.dumps(value, ensure_ascii=False).encode("utf-8"),
+            content_type="application/json"
+        )
+
+    def get(self, job_id):
+        return self._read(f"{job_id}.json")
+
+    def put(self, job):
+        self._write(f"{job['job_id']}.json", job)
+
+    def get_payload(self, job_id):
+        return self._read(f"{job_id}.payload.json")
+
+    def put_payload(self, job_id, payload):
+        self._write(f"{job_id}.payload.json", payload)
+
+
+def store_from_env():
+    if JOB_BUCKET:
+        return ObjectStorageJobStore(JOB_BUCKET, JOB_NAMESPACE, JOB_PREFIX)
+    return FileJobStore(JOB_STORE_DIR)
+
+
+def update(store, job_id, **fields):
+    """Actualiza campos del trabajo y devuelve el registro guardado."""
+    job = store.get(job_id) or new_job(job_id)
+    job.update(fields, updated=time.time())
+    store.put(job)
+    return job
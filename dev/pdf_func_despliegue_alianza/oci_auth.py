@@ -0,0 +1,45 @@
+"""Autenticación de los clientes del SDK de OCI según dónde corre el código.
+
+En OCI Functions se usa el resource principal de la función. worker.py en
+una VM no tiene resource principal: usa instance principals (la VM debe
+estar en un dynamic group con las políticas de la Queue y los buckets) o un
+archivo de configuración del SDK.
+
+Variables de entorno:
+    OCI_AUTH            resource_principal (por defecto en la función),
+                        instance_principal (por defecto en worker.py) o config
+    OCI_CONFIG_FILE     archivo de configuración con OCI_AUTH=config (~/.oci/config)
+    OCI_CONFIG_PROFILE  perfil del archivo (DEFAULT)
+"""
+import os
+
+RESOURCE_PRINCIPAL = "resource_principal"
+INSTANCE_PRINCIPAL = "instance_principal"
+CONFIG = "config"
+MODES = (RESOURCE_PRINCIPAL, INSTANCE_PRINCIPAL, CONFIG)
+
+OCI_CONFIG_FILE = os.getenv("OCI_CONFIG_FILE", "~/.oci/config")
+OCI_CONFIG_PROFILE = os.getenv("OCI_CONFIG_PROFILE", "DEFAULT")
+
+_mode = os.getenv("OCI_AUTH", RESOURCE_PRINCIPAL)
+
+
+def configure(mode):
+    """Cambia el modo de autenticación; debe llamarse antes de crear clientes."""
+    global _mode
+    if mode not in MODES:
+        raise ValueError(f"OCI_AUTH no soportado: {mode!r} (opciones: {', '.join(MODES)})")
+    _mode = mode
+
+
+def client_args():
+    """(config, signer) para crear un cliente del SDK con el modo configurado."""
+    import oci
+
+    if _mode == CONFIG:
+        config = oci.config.from_file(OCI_CONFIG_FILE, OCI_CONFIG_PROFILE)
+        return config, oci.signer.Signer.from_config(config)
+    if _mode == INSTANCE_PRINCIPAL:
+        # El cliente toma la región del signer
+        return {}, oci.auth.signers.InstancePrincipalsSecurityTokenSigner()
+    return {}, oci.auth.signers.get_resource_principals_signer()
@@ -0,0 +1,172 @@
+"""Caché de PDFs generados, direccionada por el contenido de la solicitud.
+
+La clave es el SHA-256 de la forma canónica (JSON con claves ordenadas) de los
+campos que usa ``crear_pdf_reportlab``, más ``PDF_TEMPLATE_VERSION`` y ``PDF_PROFILE``:
+cambiar la plantilla exige subir esa versión para no servir documentos viejos.
+
+Niveles:
+    1. Memoria de la instancia, LRU acotada en bytes (PDF_CACHE_MEMORY_BYTES).
+    2. Opcional, compartido (PDF_CACHE_TIER):
+       "dir"            -> directorio local PDF_CACHE_DIR (disco o stand-in local)
+       "object_storage" -> bucket PDF_CACHE_BUCKET con resource principal
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import oci_auth
+
+PDF_TEMPLATE_VERSION = os.getenv("PDF_TEMPLATE_VERSION", "1")
+PDF_PROFILE = os.getenv("PDF_PROFILE", "default").lower()
+PDF_CACHE_MEMORY_BYTES = int(os.getenv("PDF_CACHE_MEMORY_BYTES", str(32 * 1024 * 1024)))
+PDF_CACHE_TIER = os.getenv("PDF_CACHE_TIER", "none").lower()
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", "/tmp/pdf_cache")
+PDF_CACHE_BUCKET = os.getenv("PDF_CACHE_BUCKET")
+PDF_CACHE_NAMESPACE = os.getenv("PDF_CACHE_NAMESPACE")
+PDF_CACHE_PREFIX = os.getenv("PDF_CACHE_PREFIX", "pdf-cache/")
+
+# Campos de la solicitud que cambian el documento
+RENDER_FIELDS = ("Ciudad", "Referencia", "NIT", "Plan", "Clientes", "Representante")
+CLIENT_FIELDS = ("cedula", "nombre", "encargo")
+
+
+def cache_key(payload: dict):
+    canonical = {field: payload[field] for field in RENDER_FIELDS if field in payload}
+    if isinstance(canonical.get("Clientes"), list):
+        canonical["Clientes"] = [
+            {k: c.get(k, "") for k in CLIENT_FIELDS} if isinstance(c, dict) else c
+            for c in canonical["Clientes"]
+        ]
+    text = json.dumps([PDF_TEMPLATE_VERSION, PDF_PROFILE, canonical], sort_keys=True,
+                      separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class MemoryTier:
+    name = "memory"
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            pdf = self._data.get(key)
+            if pdf is not None:
+                self._data.move_to_end(key)
+            return pdf
+
+    def put(self, key, pdf):
+        if len(pdf) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._data[key] = pdf
+            self._size += len(pdf)
+            while self._size > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self._size -= len(evicted)
+
+
+class DirectoryTier:
+    name = "dir"
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, key):
+        try:
+            with open(os.path.join(self.directory, f"{key}.pdf"), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, pdf):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(pdf)
+        os.replace(tmp, os.path.join(self.directory, f"{key}.pdf"))
+
+
+class ObjectStorageTier:
+    name = "object_storage"
+
+    def __init__(self, bucket, namespace=None, prefix="pdf-cache/"):
+        import oci
+
+        config, signer = oci_auth.client_args()
+        self.client = oci.object_storage.ObjectStorageClient(config=config, signer=signer)
+        self.namespace = namespace or self.client.get_namespace().data
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def get(self, key):
+        import oci
+
+        try:
+            return self.client.get_object(self.namespace, self.bucket, f"{self.prefix}{key}.pdf").data.content
+        except oci.exceptions.ServiceError as e:
+            if e.status == 404:
+                return None
+            raise
+
+    def put(self, key, pdf):
+        self.client.put_object(self.namespace, self.bucket, f"{self.prefix}{key}.pdf", pdf,
+                               content_type="application/pdf")
+
+
+class PdfCache:
+    def __init__(self, tiers):
+        self.tiers = tiers
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Devuelve (pdf, nivel) o (None, None). Un acierto se copia a los niveles anteriores."""
+        for i, tier in enumerate(self.tiers):
+            try:
+                pdf = tier.get(key)
+            except Exception as e:
+                print(f"[cache] Error leyendo del nivel {tier.name}: {e}")
+                continue
+            if pdf is not None:
+                for upper in self.tiers[:i]:
+                    upper.put(key, pdf)
+                with self._lock:
+                    self.hits += 1
+                return pdf, tier.name
+        with self._lock:
+            self.misses += 1
+        return None, None
+
+    def put(self, key, pdf):
+        for tier in self.tiers:
+            try:
+                tier.put(key, pdf)
+            except Exception as e:
+                print(f"[cache] Error escribiendo en el nivel {tier.name}: {e}")
+
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+def cache_from_env():
+    tiers = [MemoryTier(PDF_CACHE_MEMORY_BYTES)]
+    if PDF_CACHE_TIER == "dir":
+        tiers.append(DirectoryTier(PDF_CACHE_DIR))
+    elif PDF_CACHE_TIER == "object_storage" and PDF_CACHE_BUCKET:
+        try:
+            tiers.append(ObjectStorageTier(PDF_CACHE_BUCKET, PDF_CACHE_NAMESPACE, PDF_CACHE_PREFIX))
+        except Exception as e:
+            print(f"[cache] Object Storage no disponible, solo caché en memoria: {e}")
+    return PdfCache(tiers)
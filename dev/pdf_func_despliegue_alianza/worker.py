@@ -0,0 +1,68 @@
+"""Worker en modo pull para los trabajos de PDF encolados en JOB_QUEUE_ID.
+
+Alternativa al Service Connector: lee los trabajos, los procesa con la misma
+lógica de la función (func.process_job) y borra los mensajes resueltos. Un
+error al guardar el estado deja el mensaje para que la Queue lo reentregue.
+
+En una VM no hay resource principal: el worker usa instance principals, u
+OCI_AUTH=config con un archivo de configuración del SDK (ver oci_auth.py),
+para la Queue de trabajos, la cola de resultados y los buckets.
+
+Uso:
+    JOB_QUEUE_ID=... JOB_QUEUE_ENDPOINT=... JOB_BUCKET=... TARGET_API_URL=... python worker.py
+"""
+import json
+import os
+import time
+
+import oci_auth
+
+# Antes de importar func: sus cachés y almacenes pueden crear clientes al importarse
+oci_auth.configure(os.getenv("OCI_AUTH", oci_auth.INSTANCE_PRINCIPAL))
+
+import func
+import jobs
+
+POLL_LIMIT = int(os.getenv("POLL_LIMIT", "5"))
+POLL_TIMEOUT = int(os.getenv("POLL_TIMEOUT", "20"))
+# Tiempo de invisibilidad: debe cubrir la generación y el reenvío de un documento grande
+JOB_VISIBILITY = int(os.getenv("JOB_VISIBILITY", "300"))
+ERROR_BACKOFF = int(os.getenv("ERROR_BACKOFF", "5"))
+
+
+def poll_once():
+    client = func._get_queue_client(endpoint=func.JOB_QUEUE_ENDPOINT)
+    resp = client.get_messages(
+        queue_id=func.JOB_QUEUE_ID,
+        visibility_in_seconds=JOB_VISIBILITY,
+        timeout_in_seconds=POLL_TIMEOUT,
+        limit=POLL_LIMIT
+    )
+    for m in resp.data.messages:
+        try:
+            item = json.loads(m.content)
+            if not jobs.is_job_id(item["job_id"]):
+                raise ValueError(f"job_id inválido: {item['job_id']!r}")
+            func.process_job(item["job_id"], item.get("payload"))
+        except (ValueError, KeyError) as e:
+            print(f"[worker] Mensaje {m.id} inválido, se descarta: {e}")
+        except Exception as e:
+            print(f"[worker] Error procesando el mensaje {m.id}, se reintentará: {e}")
+            continue
+        client.delete_message(func.JOB_QUEUE_ID, m.receipt)
+    return len(resp.data.messages)
+
+
+def main():
+    if not func.JOB_QUEUE_ID:
+        raise SystemExit("JOB_QUEUE_ID no configurado")
+    while True:
+        try:
+            poll_once()
+        except Exception as e:
+            print(f"[worker] Error en el ciclo de consumo: {e}")
+            time.sleep(ERROR_BACKOFF)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Mide tamaño y CPU del formato comprimido de la Queue sobre payloads reales.
+
+Usa Contexto/Mensajes.json (Minka), el evento de tarjeta de firma.py y el mock
+de actividad de Contexto/context.txt (Pomelo), envueltos como lo hacen los
+productores, y compara el content v1 (JSON plano) con el v2 comprimido.
+
+Uso:
+    python dev/tools/bench_compression.py --iterations 2000
+"""
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+import zlib
+
+DEV_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(DEV_DIR, "notificaciones_minka", "fn_producer_queue_minka_debit_dev"))
+
+import envelope  # noqa: E402
+
+CARD_EVENT = {
+    "event_id": "card-block",
+    "id": "crd-3BPOqf2EH14E70Jdbs6WuYc6mbH",
+    "updated_at": "2026-03-30T19:04:43.042289Z",
+    "user_id": "usr-3AuR38ZZNL7QcU2D7ybyPn2G6YS",
+    "event": "BLOCK",
+    "card_type": "VIRTUAL",
+    "idempotency_key": "82d10aa1-0df7-488f-8a8c-4fcdca0fe8d8",
+}
+
+
+def load_payloads():
+    with open(os.path.join(DEV_DIR, "notificaciones_minka", "Contexto", "Mensajes.json"), encoding="utf-8") as f:
+        minka = json.load(f)
+    with open(os.path.join(DEV_DIR, "eventos_tarjetas_pomelo", "Contexto", "context.txt"), encoding="utf-8") as f:
+        text = f.read()
+    activity = json.loads(text[text.index('{"idempotency_key"'):].strip())
+    return [
+        ("minka_prepared", {"payload": minka, "channel": "Prepared"}),
+        ("minka_committed", {"payload": minka, "pathParams": minka["data"]["intent"]["data"]["handle"],
+                             "channel": "Committed"}),
+        ("pomelo_tarjeta", {"Channel": "CANAL_EVENTOS_TARJETA", "payload": CARD_EVENT}),
+        ("pomelo_actividad", {"Channel": "CANAL_NOTIFICACIONES_ACTIVIDADES", "payload": activity}),
+    ]
+
+
+def _per_call_us(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return 1e6 * (time.perf_counter() - start) / iterations
+
+
+def measure(name, body, iterations):
+    plain, _ = envelope.encode(body, compress=False)
+    compressed = json.dumps({
+        "envelopeVersion": envelope.ENVELOPE_VERSION,
+        "contentEncoding": envelope.CONTENT_ENCODING,
+        "data": base64.b64encode(zlib.compress(plain.encode("utf-8"), envelope.COMPRESSION_LEVEL)).decode("ascii"),
+    })
+    assert envelope.decode(compressed) == body
+    raw = plain.encode("utf-8")
+    return {
+        "payload": name,
+        "v1_bytes": len(raw),
+        "v2_bytes": len(compressed),
+        "ratio": round(len(compressed) / len(raw), 3),
+        # encode() solo escribe v2 si supera el umbral y realmente reduce el tamaño
+        "escribe_v2": bool(envelope.encode(body, compress=True)[1]),
+        "encode_v1_us": round(_per_call_us(lambda: envelope.encode(body, compress=False), iterations), 1),
+        "encode_v2_us": round(_per_call_us(lambda: envelope.encode(body, compress=True), iterations), 1),
+        "decode_v1_us": round(_per_call_us(lambda: envelope.decode(plain), iterations), 1),
+        "decode_v2_us": round(_per_call_us(lambda: envelope.decode(compressed), iterations), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"zlib nivel {envelope.COMPRESSION_LEVEL}, umbral {envelope.COMPRESSION_MIN_BYTES} bytes "
+          "(los payloads por debajo del umbral se escriben en v1)")
+    rows = [measure(name, body, args.iterations) for name, body in load_payloads()]
+    columns = list(rows[0].keys())
+    print("  ".join(f"{c:>16}" for c in columns))
+    for row in rows:
+        print("  ".join(f"{str(row[c]):>16}" for c in columns))
+
+
+if __name__ == "__main__":
+    main()
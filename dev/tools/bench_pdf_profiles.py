@@ -0,0 +1,89 @@
+"""Compara tamaño y tiempo de generación de los perfiles de PDF por número de partícipes.
+
+Genera la carta de adhesión con ``crear_pdf_reportlab`` de la función PDF
+para cada perfil (PDF_PROFILES) y muestra bytes del PDF, bytes en base64 (lo
+que viaja a TARGET_API_URL, en la respuesta y en la cola), tiempo medio y si
+dos generaciones seguidas producen los mismos bytes.
+
+Uso:
+    python dev/tools/bench_pdf_profiles.py --participants 1 10 100 1000 --repeat 5
+"""
+import argparse
+import base64
+import io
+import os
+import sys
+import time
+
+DEV_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(DEV_DIR, "pdf_func_despliegue_alianza"))
+
+import func  # noqa: E402
+
+
+def payload(participants):
+    return {
+        "Ciudad": "Bogotá",
+        "Referencia": "Contrato 123",
+        "NIT": "900123456",
+        "Plan": "Plan Pensional XYZ",
+        "Representante": "Juan Pérez",
+        "Clientes": [
+            {"cedula": str(10000000 + i), "nombre": f"Partícipe {i} Apellido", "encargo": f"ENC-{i:06d}"}
+            for i in range(participants)
+        ],
+    }
+
+
+def render(datos, profile):
+    out = io.BytesIO()
+    func.crear_pdf_reportlab(out, datos, profile)
+    return out.getvalue()
+
+
+def measure(participants, profile, repeat):
+    datos = payload(participants)
+    start = time.perf_counter()
+    outputs = [render(datos, profile) for _ in range(repeat)]
+    elapsed = (time.perf_counter() - start) / repeat
+    pdf = outputs[0]
+    return {
+        "participes": participants,
+        "perfil": profile,
+        "pdf_bytes": len(pdf),
+        "base64_bytes": len(base64.b64encode(pdf)),
+        "ms": round(1000 * elapsed, 1),
+        "determinista": all(o == pdf for o in outputs[1:]) if repeat > 1 else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--participants", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    # Los prints de la función ensucian la tabla
+    stdout = sys.stdout
+    rows = []
+    for participants in args.participants:
+        for profile in func.PDF_PROFILES:
+            sys.stdout = io.StringIO()
+            try:
+                rows.append(measure(participants, profile, args.repeat))
+            finally:
+                sys.stdout = stdout
+
+    columns = list(rows[0].keys())
+    print("  ".join(f"{c:>13}" for c in columns))
+    for row in rows:
+        print("  ".join(f"{str(row[c]):>13}" for c in columns))
+    base = {r["participes"]: r["base64_bytes"] for r in rows if r["perfil"] == "default"}
+    for row in rows:
+        if row["perfil"] != "default":
+            saving = 100 * (1 - row["base64_bytes"] / base[row["participes"]])
+            print(f"{row['perfil']} con {row['participes']} partícipe(s): {saving:.1f}% menos bytes por salto")
+
+
+if __name__ == "__main__":
+    main()
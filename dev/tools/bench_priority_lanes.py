@@ -0,0 +1,113 @@
+"""Compara la espera de los eventos urgentes con una sola Queue FIFO y con carriles de prioridad.
+
+Simula en tiempo virtual una consumidora en modo pull que atiende ``capacity``
+eventos por segundo en lotes de ``batch``, mientras llegan bloqueos de tarjeta
+(prioridad alta) y un volumen de notificaciones de actividad mayor que la
+capacidad, de modo que el backlog de baja prioridad crece todo el tiempo.
+La clasificación y el orden de los carriles salen de priority.py, igual que
+en el productor y el worker.
+
+Uso:
+    python dev/tools/bench_priority_lanes.py --seconds 600 --low-rate 60 --capacity 50
+"""
+import argparse
+import os
+import random
+import sys
+from collections import deque
+
+DEV_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(DEV_DIR, "eventos_tarjetas_pomelo", "fn_consume_envento_tarjeta_pomelo_dev"))
+
+HIGH_LANE = "carril-alto"
+DEFAULT_QUEUE = "queue-comun"
+os.environ.setdefault("QUEUE_OCID_BY_PRIORITY", f"high={HIGH_LANE}")
+
+import priority  # noqa: E402
+
+BLOCK_EVENT = ("CANAL_EVENTOS_TARJETA", {"event": "BLOCK", "id": "crd-1"})
+ACTIVITY = ("CANAL_NOTIFICACIONES_ACTIVIDADES", {"type": "PURCHASE", "activity": {}})
+
+
+def _arrivals(rng, rate, seconds, event):
+    t = rng.expovariate(rate)
+    while t < seconds:
+        yield t, event
+        t += rng.expovariate(rate)
+
+
+def simulate(lanes, seconds, high_rate, low_rate, capacity, batch, windows, seed=7):
+    """Devuelve por ventana el backlog de baja prioridad y el p50/p99 de espera de los urgentes."""
+    rng = random.Random(seed)
+    arrivals = sorted(
+        list(_arrivals(rng, high_rate, seconds, BLOCK_EVENT))
+        + list(_arrivals(rng, low_rate, seconds, ACTIVITY))
+    )
+    order = priority.drain_order(DEFAULT_QUEUE) if lanes else [DEFAULT_QUEUE]
+    queues = {queue_id: deque() for queue_id in order}
+    service_time = batch / capacity
+    window = seconds / windows
+    report = [{"high_waits": [], "backlog": 0} for _ in range(windows)]
+
+    t, next_arrival = 0.0, 0
+    while t < seconds:
+        while next_arrival < len(arrivals) and arrivals[next_arrival][0] <= t:
+            arrived, (channel, payload) = arrivals[next_arrival]
+            klass = priority.priority_for(channel, payload)
+            queue_id = (priority.lane_for(klass) if lanes else None) or DEFAULT_QUEUE
+            queues[queue_id].append((arrived, klass))
+            next_arrival += 1
+
+        # Igual que worker.poll_once: un lote del primer carril con mensajes
+        lane = next((q for q in queues.values() if q), None)
+        if lane is None:
+            t += service_time
+            continue
+        served = min(batch, len(lane))
+        t += served / capacity
+        slot = report[min(int(t / window), windows - 1)]
+        for _ in range(served):
+            arrived, klass = lane.popleft()
+            if klass == "high":
+                slot["high_waits"].append(t - arrived)
+        slot["backlog"] = sum(1 for q in queues.values() for _, k in q if k != "high")
+
+    rows = []
+    for i, slot in enumerate(report):
+        waits = sorted(slot["high_waits"])
+        rows.append({
+            "ventana_s": f"{int(i * window)}-{int((i + 1) * window)}",
+            "backlog_bajo": slot["backlog"],
+            "alta_n": len(waits),
+            "alta_p50_s": round(waits[len(waits) // 2], 2) if waits else None,
+            "alta_p99_s": round(waits[min(len(waits) - 1, int(len(waits) * 0.99))], 2) if waits else None,
+        })
+    return rows
+
+
+def _print(title, rows):
+    print(title)
+    columns = list(rows[0].keys())
+    print("  ".join(f"{c:>12}" for c in columns))
+    for row in rows:
+        print("  ".join(f"{str(row[c]):>12}" for c in columns))
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=600)
+    parser.add_argument("--high-rate", type=float, default=2.0, help="bloqueos por segundo")
+    parser.add_argument("--low-rate", type=float, default=60.0, help="notificaciones por segundo")
+    parser.add_argument("--capacity", type=float, default=50.0, help="eventos por segundo de la consumidora")
+    parser.add_argument("--batch", type=int, default=10)
+    parser.add_argument("--windows", type=int, default=6)
+    args = parser.parse_args()
+
+    params = (args.seconds, args.high_rate, args.low_rate, args.capacity, args.batch, args.windows)
+    _print("Una sola Queue FIFO", simulate(False, *params))
+    _print(f"Carriles de prioridad ({' > '.join(priority.drain_order(DEFAULT_QUEUE))})", simulate(True, *params))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Benchmark local del limitador de tasa bajo concurrencia.
+
+Lanza varios hilos que piden tokens sin pausa durante unos segundos y compara
+las llamadas concedidas con el máximo teórico (ráfaga + tasa * duración).
+
+Uso:
+    python dev/tools/bench_rate_limiter.py --rate 50 --burst 10 --threads 32 --seconds 5
+"""
+import argparse
+import filecmp
+import os
+import sys
+import threading
+import time
+
+DEV_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COPIES = [
+    os.path.join(DEV_DIR, "notificaciones_minka", "fn_consumer_queue_minka_debit_dev", "rate_limiter.py"),
+    os.path.join(DEV_DIR, "eventos_tarjetas_pomelo", "fn_consume_envento_tarjeta_pomelo_dev", "rate_limiter.py"),
+    os.path.join(DEV_DIR, "eventos_tarjetas_pomelo", "fn_notificacion_evento_tarjeta_pomelo_dev", "rate_limiter.py"),
+]
+sys.path.insert(0, os.path.dirname(COPIES[0]))
+
+from rate_limiter import RateLimiter  # noqa: E402
+
+
+def run(rate, burst, threads, seconds, key="Prepared"):
+    limiter = RateLimiter({key: (rate, burst)})
+    granted = [0] * threads
+    denied = [0] * threads
+    stop = time.monotonic() + seconds
+    start_barrier = threading.Barrier(threads)
+
+    def worker(i):
+        start_barrier.wait()
+        while time.monotonic() < stop:
+            if limiter.try_acquire(key) == 0.0:
+                granted[i] += 1
+            else:
+                denied[i] += 1
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.monotonic()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.monotonic() - started
+
+    total = sum(granted)
+    allowed = burst + rate * elapsed
+    return {
+        "threads": threads,
+        "elapsed_s": round(elapsed, 3),
+        "granted": total,
+        "denied": sum(denied),
+        "max_allowed": int(allowed),
+        "observed_rate": round(total / elapsed, 2),
+        "limit_holds": total <= allowed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=float, default=50.0)
+    parser.add_argument("--burst", type=float, default=10.0)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    identical = all(filecmp.cmp(COPIES[0], other, shallow=False) for other in COPIES[1:])
+    print(f"Copias de rate_limiter.py idénticas: {identical}")
+
+    result = run(args.rate, args.burst, args.threads, args.seconds)
+    for k, v in result.items():
+        print(f"{k:>14}: {v}")
+    return 0 if result["limit_holds"] and identical else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
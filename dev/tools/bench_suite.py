@@ -0,0 +1,368 @@
+"""Suite de benchmarks de los handlers con umbrales de regresión.
+
+Cubre los caminos calientes de las funciones con el código real, contra la
+Queue y el OSB falsos de local_emulator.py:
+    firma.*              check_signature y sign_response de la función de notificación
+    productor.*          sobre Pomelo (trace + envelope + validación), _put_messages y el handler completo
+    consumidor_pomelo.*  process_batch con lotes de 1, 10 y 100 eventos
+    consumidor_minka.*   process_batch con lotes de 1, 10 y 100 intents
+    minka.*              _build_osb_endpoint y match_route (la tabla de rutas que reemplazó a _extract_path_params)
+    pdf.*                crear_pdf_reportlab con 10, 1.000 y 10.000 partícipes
+
+Cada benchmark corre en un proceso propio (así el pico de RSS es solo suyo)
+y registra:
+    ms           mediana por operación de ``--repeat`` rondas
+    alloc_kb     pico de memoria asignada por operación (tracemalloc)
+    peak_rss_mb  pico de RSS del proceso (incluye intérprete y SDK)
+El logging de las funciones queda en WARNING para no medir la escritura de logs.
+
+Cada corrida se guarda en ``--results`` (run-<fecha>.json) y se compara con
+``baseline.json``; si alguna métrica empeora más que su umbral
+(``--max-regression``) el comando termina con código 1.
+
+Uso:
+    python dev/tools/bench_suite.py --save-baseline
+    python dev/tools/bench_suite.py                    # compara con la línea base
+    python dev/tools/bench_suite.py --filter consumidor --max-regression ms=0.15,alloc_kb=0.1,peak_rss_mb=0.1
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import uuid
+
+from local_emulator import (DEV_DIR, MINKA_QUEUE, POMELO_API_SECRET, POMELO_ENDPOINT, POMELO_QUEUE, Emulator,
+                            configure_logging, load_function, pomelo_signature)
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_results")
+DEFAULT_THRESHOLDS = {"ms": 0.25, "alloc_kb": 0.10, "peak_rss_mb": 0.15}
+
+CARD_EVENT = {
+    "event_id": "card-block",
+    "id": "crd-3BPOqf2EH14E70Jdbs6WuYc6mbH",
+    "updated_at": "2026-03-30T19:04:43.042289Z",
+    "user_id": "usr-3AuR38ZZNL7QcU2D7ybyPn2G6YS",
+    "event": "BLOCK",
+    "card_type": "VIRTUAL",
+    "idempotency_key": "82d10aa1-0df7-488f-8a8c-4fcdca0fe8d8",
+}
+
+
+def _folder(name):
+    return os.path.join(DEV_DIR, name)
+
+
+def _card_event():
+    return dict(CARD_EVENT, id=f"crd-{uuid.uuid4().hex[:27]}", idempotency_key=str(uuid.uuid4()))
+
+
+def _minka_body(intent):
+    with open(os.path.join(DEV_DIR, "notificaciones_minka", "Contexto", "Mensajes.json"), encoding="utf-8") as f:
+        body = json.load(f)
+    body["data"]["intent"]["data"]["handle"] = intent
+    return body
+
+
+# === BENCHMARKS ===
+# Cada setup devuelve (operación sin argumentos, recursos a cerrar al terminar)
+
+def setup_check_signature():
+    func = load_function(_folder("eventos_tarjetas_pomelo/fn_notificacion_evento_tarjeta_pomelo_dev"),
+                         {"API_SECRET": POMELO_API_SECRET})["func"]
+    body = json.dumps(CARD_EVENT)
+    timestamp = str(int(time.time()))
+    signature = pomelo_signature(POMELO_API_SECRET, POMELO_ENDPOINT, timestamp, body)
+    return lambda: func.check_signature(POMELO_API_SECRET, POMELO_ENDPOINT, timestamp, body, signature), None
+
+
+def setup_sign_response():
+    func = load_function(_folder("eventos_tarjetas_pomelo/fn_notificacion_evento_tarjeta_pomelo_dev"),
+                         {"API_SECRET": POMELO_API_SECRET})["func"]
+    body = json.dumps({"status": "Error en la petición POST", "osb_status": 500})
+    return lambda: func.sign_response(POMELO_API_SECRET, body, {"Content-Type": "application/json"},
+                                      POMELO_ENDPOINT), None
+
+
+def setup_producer_envelope():
+    modules = load_function(_folder("eventos_tarjetas_pomelo/fn_producer_evento_tarjeta_pomelo_dev"), {},
+                            ("envelope", "priority", "tracing", "validation"))
+    envelope, priority, tracing, validation = (modules[n] for n in ("envelope", "priority", "tracing", "validation"))
+    channel = "CANAL_EVENTOS_TARJETA"
+    raw = json.dumps(CARD_EVENT).encode("utf-8")
+
+    def op():
+        validation.check_body_size(raw)
+        body = json.loads(raw)
+        validation.validate(channel, body)
+        trace = tracing.stamp(tracing.new_trace(tracing.correlation_id({})))
+        content, extra = envelope.encode({"Channel": channel, "payload": body, "trace": trace})
+        validation.check_message_size(content)
+        return {"channelId": channel, "priority": priority.priority_for(channel, body),
+                **tracing.trace_metadata(trace), **extra}
+    return op, None
+
+
+def setup_producer_put_messages():
+    emulator = Emulator(consumer_mode="manual", functions=["pomelo_producer"]).start()
+    func = emulator.functions["pomelo_producer"]["func"]
+    content = json.dumps({"Channel": "CANAL_EVENTOS_TARJETA", "payload": CARD_EVENT})
+    metadata = {"channelId": "CANAL_EVENTOS_TARJETA"}
+    return lambda: func._put_messages(POMELO_QUEUE, [(content, metadata)]), emulator
+
+
+def setup_producer_handler():
+    emulator = Emulator(consumer_mode="manual", functions=["pomelo_producer"]).start()
+    headers = {"channel_queue": "CANAL_EVENTOS_TARJETA"}
+    return lambda: emulator.invoke("pomelo_producer", _card_event(), headers=headers), emulator
+
+
+def _setup_pomelo_batch(size):
+    def setup():
+        emulator = Emulator(consumer_mode="manual", functions=["pomelo_consumer"]).start()
+        func = emulator.functions["pomelo_consumer"]["func"]
+
+        def op():
+            return func.process_batch([{"Channel": "CANAL_EVENTOS_TARJETA", "payload": _card_event()}
+                                       for _ in range(size)])
+        return op, emulator
+    return setup
+
+
+def _setup_minka_batch(size):
+    def setup():
+        emulator = Emulator(consumer_mode="manual", functions=["minka_consumer"]).start()
+        func = emulator.functions["minka_consumer"]["func"]
+        template = _minka_body("plantilla")
+
+        def op():
+            # Intents nuevos en cada lote: uno repetido se descartaría como superado
+            events = []
+            for _ in range(size):
+                body = json.loads(json.dumps(template))
+                body["data"]["intent"]["data"]["handle"] = uuid.uuid4().hex
+                events.append({"channel": "Prepared", "payload": body, "pathParams": None})
+            return func.process_batch(events)
+        return op, emulator
+    return setup
+
+
+def setup_build_osb_endpoint():
+    func = load_function(_folder("notificaciones_minka/fn_consumer_queue_minka_debit_dev"),
+                         {"OSB_BASE_URL": "http://osb/minka", "QUEUE_OCID": MINKA_QUEUE})["func"]
+    cases = [("Prepared", None), ("Aborted", "deb_1"), ("Committed", "int_1"), ("Completed", "int_1")]
+
+    def op():
+        for channel, path_params in cases:
+            func._build_osb_endpoint(channel, path_params)
+    return op, None
+
+
+def setup_match_route():
+    routes = load_function(_folder("notificaciones_minka/fn_producer_queue_minka_debit_dev"), {},
+                           ("routes",))["routes"]
+    urls = [
+        "/rest/b2b/fiducia/minka/v2/debits",
+        "/rest/b2b/fiducia/minka/v2/debits/deb_01u9RGCevt4rEkRMV/abort",
+        "/rest/b2b/fiducia/minka/v2/debits/20250602122456789TFY782423196249812/commit",
+        "/rest/b2b/fiducia/minka/v2/intents/20250602122456789TFY782423196249812",
+    ]
+
+    def op():
+        for url in urls:
+            routes.match_route(url)
+    return op, None
+
+
+def _setup_pdf(rows):
+    def setup():
+        func = load_function(_folder("pdf_func_despliegue_alianza"), {})["func"]
+        datos = {
+            "Ciudad": "Bogotá",
+            "Referencia": "Contrato 123",
+            "NIT": "900123456",
+            "Plan": "Plan Pensional XYZ",
+            "Representante": "Juan Pérez",
+            "Clientes": [{"cedula": str(10000000 + i), "nombre": f"Partícipe {i} Apellido",
+                          "encargo": f"ENC-{i:06d}"} for i in range(rows)],
+        }
+        return lambda: func.crear_pdf_reportlab(io.BytesIO(), datos), None
+    return setup
+
+
+# nombre -> (setup, operaciones por ronda)
+BENCHMARKS = {
+    "firma.check_signature": (setup_check_signature, 2000),
+    "firma.sign_response": (setup_sign_response, 2000),
+    "productor.sobre_pomelo": (setup_producer_envelope, 2000),
+    "productor.put_messages": (setup_producer_put_messages, 20),
+    "productor.handler": (setup_producer_handler, 20),
+    "consumidor_pomelo.lote_1": (_setup_pomelo_batch(1), 20),
+    "consumidor_pomelo.lote_10": (_setup_pomelo_batch(10), 5),
+    "consumidor_pomelo.lote_100": (_setup_pomelo_batch(100), 1),
+    "consumidor_minka.lote_1": (_setup_minka_batch(1), 20),
+    "consumidor_minka.lote_10": (_setup_minka_batch(10), 5),
+    "consumidor_minka.lote_100": (_setup_minka_batch(100), 1),
+    "minka.build_osb_endpoint": (setup_build_osb_endpoint, 20000),
+    "minka.match_route": (setup_match_route, 20000),
+    "pdf.crear_pdf_10": (_setup_pdf(10), 10),
+    "pdf.crear_pdf_1000": (_setup_pdf(1000), 1),
+    "pdf.crear_pdf_10000": (_setup_pdf(10000), 1),
+}
+
+
+def measure(name, repeat, scale):
+    """Corre un benchmark en este proceso y devuelve sus métricas."""
+    setup, number = BENCHMARKS[name]
+    number = max(1, int(number * scale))
+    stdout = sys.stdout
+    # Los prints de las funciones no deben mezclarse con el JSON del resultado
+    sys.stdout = io.StringIO()
+    try:
+        op, resource_to_close = setup()
+        configure_logging("WARNING")
+        op()
+
+        rounds = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                op()
+            rounds.append((time.perf_counter() - start) / number)
+
+        tracemalloc.start()
+        peaks = []
+        for _ in range(min(number, 50)):
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            op()
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+        tracemalloc.stop()
+        if resource_to_close is not None:
+            resource_to_close.close()
+    finally:
+        sys.stdout = stdout
+
+    return {
+        "ms": round(1000 * statistics.median(rounds), 4),
+        "ms_min": round(1000 * min(rounds), 4),
+        "alloc_kb": round(max(peaks) / 1024, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "ops": number,
+    }
+
+
+def run_isolated(name, repeat, scale):
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", name, "--repeat", str(repeat), "--scale", str(scale)],
+        capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        return {"error": (proc.stderr.strip().splitlines() or ["sin salida"])[-1]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def compare(current, baseline, thresholds):
+    """Lista de (benchmark, métrica, base, actual, variación) que superan su umbral."""
+    regressions = []
+    for name, metrics in current.items():
+        base = baseline.get(name)
+        if not base or "error" in metrics or "error" in base:
+            continue
+        for metric, limit in thresholds.items():
+            before, after = base.get(metric), metrics.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            if change > limit:
+                regressions.append((name, metric, before, after, change))
+    return regressions
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=DEV_DIR).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _parse_thresholds(spec):
+    thresholds = dict(DEFAULT_THRESHOLDS)
+    for item in (spec or "").split(","):
+        if "=" in item:
+            metric, _, value = item.partition("=")
+            thresholds[metric.strip()] = float(value)
+    return thresholds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filter", help="solo benchmarks cuyo nombre contiene este texto")
+    parser.add_argument("--list", action="store_true")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplica las operaciones por ronda")
+    parser.add_argument("--results", default=RESULTS_DIR)
+    parser.add_argument("--baseline", help="archivo de línea base (por defecto <results>/baseline.json)")
+    parser.add_argument("--save-baseline", action="store_true", help="guarda esta corrida como línea base")
+    parser.add_argument("--max-regression", help="umbrales por métrica, p. ej. ms=0.25,alloc_kb=0.1,peak_rss_mb=0.15")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.repeat, args.scale)))
+        return 0
+
+    names = [n for n in BENCHMARKS if not args.filter or args.filter in n]
+    if args.list:
+        print("\n".join(names))
+        return 0
+
+    thresholds = _parse_thresholds(args.max_regression)
+    baseline_path = args.baseline or os.path.join(args.results, "baseline.json")
+    baseline = {}
+    if os.path.exists(baseline_path) and not args.save_baseline:
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)["benchmarks"]
+
+    results = {}
+    print(f"{'benchmark':<30}{'ms':>12}{'alloc_kb':>12}{'peak_rss_mb':>13}")
+    for name in names:
+        metrics = results[name] = run_isolated(name, args.repeat, args.scale)
+        if "error" in metrics:
+            print(f"{name:<30}  error: {metrics['error']}")
+            continue
+        print(f"{name:<30}{metrics['ms']:>12}{metrics['alloc_kb']:>12}{metrics['peak_rss_mb']:>13}")
+
+    run = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "benchmarks": results,
+    }
+    os.makedirs(args.results, exist_ok=True)
+    run_path = os.path.join(args.results, f"run-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    for path in [run_path] + ([baseline_path] if args.save_baseline else []):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(run, f, indent=2, ensure_ascii=False)
+    print(f"Resultados en {run_path}" + (f"; línea base en {baseline_path}" if args.save_baseline else ""))
+
+    failed = [n for n, m in results.items() if "error" in m]
+    regressions = compare(results, baseline, thresholds)
+    for name, metric, before, after, change in regressions:
+        print(f"REGRESIÓN {name} {metric}: {before} -> {after} ({100 * change:+.0f}%, umbral "
+              f"{100 * thresholds[metric]:.0f}%)")
+    if not baseline and not args.save_baseline:
+        print(f"Sin línea base en {baseline_path}: use --save-baseline")
+    return 1 if regressions or failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+"""Servidor de tokens OAuth falso (client credentials) para pruebas locales.
+
+Atiende ``POST /token`` con ``grant_type=client_credentials`` y las
+credenciales en Basic auth, entrega tokens con ``expires_in`` configurable y
+cuenta cuántos emitió. Con ``--demo`` lanza varios hilos contra un
+TokenProvider y muestra que solo se pide un token por renovación.
+
+Uso:
+    python dev/tools/fake_token_server.py --port 8085 --expires-in 30
+    OAUTH_TOKEN_URL=http://127.0.0.1:8085/token OAUTH_CLIENT_ID=cliente OAUTH_CLIENT_SECRET=secreto ...
+    python dev/tools/fake_token_server.py --demo
+"""
+import argparse
+import base64
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+DEV_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(DEV_DIR, "notificaciones_minka", "fn_consumer_queue_minka_debit_dev"))
+
+
+class FakeTokenServer(ThreadingHTTPServer):
+    """Servidor en un hilo propio; ``issued`` cuenta los tokens emitidos."""
+
+    daemon_threads = True
+
+    def __init__(self, port=0, client_id="cliente", client_secret="secreto", expires_in=30, delay=0.0):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.expires_in = expires_in
+        self.delay = delay
+        self.issued = 0
+        self.lock = threading.Lock()
+
+    @property
+    def token_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/token"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length", "0"))
+        form = parse_qs(self.rfile.read(length).decode("utf-8"))
+        expected = base64.b64encode(f"{server.client_id}:{server.client_secret}".encode()).decode()
+
+        if self.path != "/token":
+            return self._reply(404, {"error": "not_found"})
+        if form.get("grant_type") != ["client_credentials"]:
+            return self._reply(400, {"error": "unsupported_grant_type"})
+        if self.headers.get("Authorization") != f"Basic {expected}":
+            return self._reply(401, {"error": "invalid_client"})
+
+        time.sleep(server.delay)
+        with server.lock:
+            server.issued += 1
+        self._reply(200, {
+            "access_token": uuid.uuid4().hex,
+            "token_type": "Bearer",
+            "expires_in": server.expires_in,
+        })
+
+
+def demo(threads, seconds, expires_in, refresh_margin):
+    from token_provider import TokenProvider
+
+    server = FakeTokenServer(expires_in=expires_in, delay=0.2).start()
+    provider = TokenProvider(server.token_url, "cliente", "secreto", refresh_margin=refresh_margin)
+    calls = [0]
+    calls_lock = threading.Lock()
+    stop = time.monotonic() + seconds
+
+    def caller():
+        while time.monotonic() < stop:
+            provider.token()
+            with calls_lock:
+                calls[0] += 1
+            time.sleep(0.01)
+
+    workers = [threading.Thread(target=caller) for _ in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    server.shutdown()
+
+    expected = 1 + int(seconds // max(expires_in - refresh_margin, expires_in / 2))
+    print(f"hilos={threads} llamadas={calls[0]} tokens_emitidos={server.issued} esperados~{expected}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8085)
+    parser.add_argument("--client-id", default="cliente")
+    parser.add_argument("--client-secret", default="secreto")
+    parser.add_argument("--expires-in", type=int, default=30)
+    parser.add_argument("--delay", type=float, default=0.0, help="latencia artificial por token")
+    parser.add_argument("--demo", action="store_true")
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    args = parser.parse_args()
+
+    if args.demo:
+        demo(args.threads, args.seconds, expires_in=4, refresh_margin=1)
+        return
+
+    server = FakeTokenServer(args.port, args.client_id, args.client_secret, args.expires_in, args.delay)
+    print(f"Servidor de tokens en {server.token_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""Generador de carga con tráfico Pomelo y Minka firmado.
+
+Parte de plantillas reales y varía en cada petición los ids y las llaves de
+idempotencia:
+    pomelo-notificacion  evento de tarjeta (cuerpo de dev/signature.py) a la función de notificación
+    pomelo-eventos       el mismo evento a la productora (channel_queue=CANAL_EVENTOS_TARJETA)
+    pomelo-actividades   JSON_MOCK de eventos_tarjetas_pomelo/Contexto/context.txt a la productora
+    minka                Contexto/Mensajes.json como intents Prepared -> commit -> Completed
+Cada petición lleva x-endpoint, x-timestamp, x-api-key y x-signature
+(``hmac-sha256 <base64>`` sobre timestamp + endpoint + body, el esquema de
+firma.py) y un X-Correlation-Id propio.
+
+Con ``--rate`` la carga es de lazo abierto: la petición i sale en
+inicio + i/rate y la latencia se mide desde ese instante, así una cola de
+espera en el cliente también cuenta. Sin ``--rate`` cada uno de los
+``--concurrency`` hilos envía la siguiente petición al recibir la respuesta.
+
+Uso:
+    python dev/tools/load_generator.py --scenario pomelo-eventos --local --requests 500 --concurrency 16
+    python dev/tools/load_generator.py --scenario minka --url http://127.0.0.1:8080/minka_producer --rate 50 --duration 30
+    python dev/tools/load_generator.py --scenario pomelo-notificacion --url https://<apigw>/notificacion/eventos/tarjeta \\
+        --secret <api_secret base64> --endpoint /pomelo/eventosTarjeta/V1.0 --rate 20 --duration 60
+"""
+import argparse
+import copy
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from local_emulator import DEV_DIR, POMELO_API_SECRET, POMELO_ENDPOINT, percentile, pomelo_signature
+
+# Cuerpo de dev/signature.py
+POMELO_CARD_EVENT = {
+    "event_id": "card-block",
+    "id": "crd-3BPOqf2EH14E70Jdbs6WuYc6mbH",
+    "updated_at": "2026-03-30T19:04:43.042289Z",
+    "user_id": "usr-3AuR38ZZNL7QcU2D7ybyPn2G6YS",
+    "event": "BLOCK",
+    "card_type": "VIRTUAL",
+    "idempotency_key": "82d10aa1-0df7-488f-8a8c-4fcdca0fe8d8",
+}
+
+# escenario -> función del emulador que lo atiende con --local
+SCENARIOS = {
+    "pomelo-notificacion": "pomelo_notification",
+    "pomelo-eventos": "pomelo_producer",
+    "pomelo-actividades": "pomelo_producer",
+    "minka": "minka_producer",
+}
+
+
+def _short_id():
+    return uuid.uuid4().hex[:27]
+
+
+def load_activity_mock():
+    """JSON_MOCK de Contexto/context.txt (la línea que sigue a la marca)."""
+    path = os.path.join(DEV_DIR, "eventos_tarjetas_pomelo", "Contexto", "context.txt")
+    with open(path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    for i, line in enumerate(lines):
+        if line.strip().startswith("JSON_MOCK"):
+            return json.loads(next(l for l in lines[i + 1:] if l.strip()))
+    raise ValueError(f"JSON_MOCK no encontrado en {path}")
+
+
+def load_minka_template():
+    path = os.path.join(DEV_DIR, "notificaciones_minka", "Contexto", "Mensajes.json")
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class Traffic:
+    """Genera la i-ésima petición de un escenario: (ruta, método, cabeceras, cuerpo)."""
+
+    def __init__(self, scenario, template=None, secret=POMELO_API_SECRET, endpoint=POMELO_ENDPOINT,
+                 api_key="mock-api-key-12345"):
+        self.scenario = scenario
+        self.secret = secret
+        self.endpoint = endpoint
+        self.api_key = api_key
+        if template is None:
+            if scenario == "pomelo-actividades":
+                template = load_activity_mock()
+            elif scenario == "minka":
+                template = load_minka_template()
+            else:
+                template = POMELO_CARD_EVENT
+        self.template = template
+
+    def _card_event(self, i):
+        body = copy.deepcopy(self.template)
+        body.update({
+            "event_id": f"card-event-{i}",
+            "id": f"crd-{_short_id()}",
+            "user_id": f"usr-{_short_id()}",
+            "updated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "idempotency_key": str(uuid.uuid4()),
+        })
+        return body
+
+    def _activity(self, i):
+        body = copy.deepcopy(self.template)
+        body["idempotency_key"] = str(uuid.uuid4())
+        activity = body.get("activity", {})
+        if "origin_tx_id" in activity:
+            activity["origin_tx_id"] = f"ctx-{_short_id()}"
+        if isinstance(activity.get("account"), dict):
+            activity["account"]["id"] = f"acc-{_short_id()}"
+        return body
+
+    def _minka(self, i):
+        """Cada intent son tres peticiones consecutivas: Prepared, commit y Completed."""
+        intent = f"{time.strftime('%Y%m%d%H%M%S')}{i // 3:012d}TFY"
+        body = copy.deepcopy(self.template)
+        body["data"]["handle"] = f"deb_{uuid.uuid5(uuid.NAMESPACE_OID, intent).hex[:17]}"
+        body["data"]["intent"]["data"]["handle"] = intent
+        step = i % 3
+        if step == 0:
+            return "/debits", "POST", body
+        if step == 1:
+            return f"/debits/{intent}/commit", "POST", body
+        body["data"]["intent"].setdefault("meta", {})["status"] = "completed"
+        return f"/intents/{intent}", "PUT", body
+
+    def request(self, i):
+        path, method = "", "POST"
+        if self.scenario == "minka":
+            path, method, body = self._minka(i)
+        elif self.scenario == "pomelo-actividades":
+            body = self._activity(i)
+        else:
+            body = self._card_event(i)
+
+        raw = json.dumps(body, ensure_ascii=False)
+        timestamp = str(int(time.time()))
+        headers = {
+            "Content-Type": "application/json",
+            "X-Correlation-Id": uuid.uuid4().hex,
+            "x-endpoint": self.endpoint,
+            "x-timestamp": timestamp,
+            "x-signature": pomelo_signature(self.secret, self.endpoint, timestamp, raw),
+            "x-api-key": self.api_key,
+        }
+        if self.scenario == "pomelo-eventos":
+            headers["channel_queue"] = "CANAL_EVENTOS_TARJETA"
+        elif self.scenario == "pomelo-actividades":
+            headers["channel_queue"] = "CANAL_NOTIFICACIONES_ACTIVIDADES"
+        return path, method, headers, raw
+
+
+class HttpTarget:
+    """Envía a ``url`` + ruta de la petición, con una sesión HTTP por hilo."""
+
+    def __init__(self, url, timeout=30):
+        import requests
+
+        self._requests = requests
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def send(self, path, method, headers, body):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = self._requests.Session()
+        r = session.request(method, self.url + path, data=body.encode("utf-8"), headers=headers,
+                            timeout=self.timeout)
+        return r.status_code
+
+
+class LocalTarget:
+    """Invoca la función del emulador (local_emulator.Emulator) sin pasar por HTTP."""
+
+    def __init__(self, emulator, function):
+        self.emulator = emulator
+        self.function = function
+
+    def send(self, path, method, headers, body):
+        status, _, _ = self.emulator.invoke(self.function, body, headers=headers, url=path or "/", method=method)
+        return status
+
+
+def run(target, traffic, requests=None, duration=None, rate=None, concurrency=8):
+    """Envía la carga y devuelve las muestras [(status, latencia_s)] y el tiempo total."""
+    samples = []
+    lock = threading.Lock()
+    started = time.monotonic()
+    stop_at = started + duration if duration else None
+    counter = iter(range(requests)) if requests else itertools.count()
+    counter_lock = threading.Lock()
+
+    def next_index():
+        with counter_lock:
+            if stop_at is not None and time.monotonic() >= stop_at:
+                return None
+            return next(counter, None)
+
+    def send(i, scheduled):
+        path, method, headers, body = traffic.request(i)
+        if scheduled is None:
+            scheduled = time.monotonic()
+        try:
+            status = target.send(path, method, headers, body)
+        except Exception as e:
+            status = type(e).__name__
+        with lock:
+            samples.append((status, time.monotonic() - scheduled))
+
+    if rate:
+        # Lazo abierto: se programa cada envío y el pool absorbe la concurrencia
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            while True:
+                i = next_index()
+                if i is None:
+                    break
+                scheduled = started + i / rate
+                delay = scheduled - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(send, i, scheduled)
+    else:
+        def loop():
+            while True:
+                i = next_index()
+                if i is None:
+                    return
+                send(i, None)
+
+        threads = [threading.Thread(target=loop) for _ in range(concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    return samples, time.monotonic() - started
+
+
+def report(samples, elapsed):
+    latencies = [1000 * s for _, s in samples]
+    statuses = {}
+    for status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    ok = sum(1 for status, _ in samples if isinstance(status, int) and 200 <= status < 300)
+    return {
+        "requests": len(samples),
+        "ok": ok,
+        "statuses": statuses,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else None,
+        "latency_ms": {p: round(percentile(latencies, q), 2) if latencies else None
+                       for p, q in (("p50", 50), ("p90", 90), ("p95", 95), ("p99", 99), ("max", 100))},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="pomelo-eventos")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="URL de la función o del API Gateway (para minka, la base de las rutas)")
+    target.add_argument("--local", action="store_true", help="usa el emulador en el mismo proceso")
+    parser.add_argument("--requests", type=int, help="total de peticiones")
+    parser.add_argument("--duration", type=float, help="segundos de carga")
+    parser.add_argument("--rate", type=float, help="peticiones por segundo (lazo abierto)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--template", help="JSON que reemplaza la plantilla del escenario")
+    parser.add_argument("--secret", default=POMELO_API_SECRET, help="api_secret en base64 para la firma")
+    parser.add_argument("--endpoint", default=POMELO_ENDPOINT, help="x-endpoint firmado")
+    parser.add_argument("--api-key", default="mock-api-key-12345")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--osb-latency", type=float, default=0.0, help="con --local: latencia del OSB falso")
+    parser.add_argument("--osb-error-rate", type=float, default=0.0, help="con --local: errores del OSB falso")
+    args = parser.parse_args()
+    if not args.requests and not args.duration:
+        parser.error("indique --requests o --duration")
+
+    template = None
+    if args.template:
+        with open(args.template, encoding="utf-8") as f:
+            template = json.load(f)
+    traffic = Traffic(args.scenario, template, args.secret, args.endpoint, args.api_key)
+
+    if args.url:
+        samples, elapsed = run(HttpTarget(args.url, args.timeout), traffic, args.requests, args.duration,
+                               args.rate, args.concurrency)
+        print(json.dumps(report(samples, elapsed), indent=2))
+        return
+
+    from local_emulator import Emulator, configure_logging
+
+    with Emulator(osb_latency=args.osb_latency, osb_error_rate=args.osb_error_rate) as emulator:
+        configure_logging("WARNING")
+        samples, elapsed = run(LocalTarget(emulator, SCENARIOS[args.scenario]), traffic, args.requests,
+                               args.duration, args.rate, args.concurrency)
+        result = report(samples, elapsed)
+        result["idle"] = emulator.wait_idle(timeout=max(60.0, elapsed))
+        result["pipeline"] = emulator.summary()
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,853 @@
+"""Emulador local del flujo Pomelo y Minka, sin OCI.
+
+Levanta en el mismo proceso:
+    - una Queue en memoria que atiende la API REST de OCI Queue (put, get,
+      delete, updateMessages, stats), así funcionan sin cambios tanto el SDK
+      ``oci`` de las productoras como los ``requests.post`` firmados de las
+      consumidoras;
+    - un OSB falso con latencia y errores configurables que registra cada
+      llamada (ruta, X-Correlation-Id, status);
+    - contextos FDK reales (``fdk.context.InvokeContext``) con cabeceras,
+      RequestURL y método;
+y carga los ``func.py`` reales de eventos_tarjetas_pomelo y
+notificaciones_minka, cada uno con sus propios módulos y variables de
+entorno. Un conector (como el Service Connector: entrega el content y borra
+el lote si la función responde 2xx) o el ``worker.py`` en modo pull llevan
+los mensajes de la Queue a la consumidora.
+
+Solo se reemplazan ``oci.config.from_file`` (configuración con una llave
+generada al vuelo) y ``oci.queue.QueueAdminClient`` (devuelve el endpoint
+local). Requiere ``oci`` y ``fdk`` instalados (requirements.txt de las
+funciones).
+
+Uso:
+    python dev/tools/local_emulator.py --events 200 --osb-latency 0.05 --osb-error-rate 0.05
+    python dev/tools/local_emulator.py --consumer-mode worker --events 50
+    python dev/tools/local_emulator.py --serve --port 8080
+        POST http://127.0.0.1:8080/<función>/<ruta>  (p. ej. /minka_producer/debits)
+        GET  http://127.0.0.1:8080/stats
+
+Desde código:
+    with Emulator(osb_latency=0.02) as emu:
+        emu.invoke("pomelo_producer", body, headers={"channel_queue": "CANAL_EVENTOS_TARJETA"})
+        emu.wait_idle()
+        print(emu.summary())
+"""
+import argparse
+import base64
+import contextlib
+import datetime
+import hashlib
+import hmac
+import importlib
+import io
+import itertools
+import json
+import logging
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlsplit
+
+DEV_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+POMELO_QUEUE = "ocid1.queue.oc1.emulador.pomelo"
+MINKA_QUEUE = "ocid1.queue.oc1.emulador.minka"
+
+# nombre -> (carpeta relativa a dev/, Queue que usa)
+FUNCTIONS = {
+    "pomelo_producer": ("eventos_tarjetas_pomelo/fn_producer_evento_tarjeta_pomelo_dev", POMELO_QUEUE),
+    "pomelo_consumer": ("eventos_tarjetas_pomelo/fn_consume_envento_tarjeta_pomelo_dev", POMELO_QUEUE),
+    "pomelo_notification": ("eventos_tarjetas_pomelo/fn_notificacion_evento_tarjeta_pomelo_dev", POMELO_QUEUE),
+    "minka_producer": ("notificaciones_minka/fn_producer_queue_minka_debit_dev", MINKA_QUEUE),
+    "minka_consumer": ("notificaciones_minka/fn_consumer_queue_minka_debit_dev", MINKA_QUEUE),
+}
+CONSUMERS = {"pomelo_consumer": POMELO_QUEUE, "minka_consumer": MINKA_QUEUE}
+
+# Secreto de los valores mock de Contexto/context.txt
+POMELO_API_SECRET = "c2VjcmV0LWNsYXZlLXBvbWVsbw=="
+POMELO_ENDPOINT = "/pomelo/eventosTarjeta/V1.0"
+
+logger = logging.getLogger("emulador")
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))]
+
+
+def pomelo_signature(api_secret, endpoint, timestamp, body):
+    """Firma ``hmac-sha256 <base64>`` sobre timestamp + endpoint + body, como la valida la función de notificación."""
+    digest = hmac.new(base64.b64decode(api_secret), (timestamp + endpoint + body).encode("utf-8"),
+                      hashlib.sha256).digest()
+    return "hmac-sha256 " + base64.b64encode(digest).decode()
+
+
+def _iso(epoch):
+    return datetime.datetime.fromtimestamp(epoch, datetime.timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+# === QUEUE EN MEMORIA ===
+
+class _Message:
+    __slots__ = ("id", "content", "metadata", "created_at", "visible_at", "expire_at", "delivery_count", "receipt")
+
+    def __init__(self, message_id, content, metadata, visible_at, retention):
+        self.id = message_id
+        self.content = content
+        self.metadata = metadata or {}
+        self.created_at = time.time()
+        self.visible_at = visible_at
+        self.expire_at = self.created_at + retention
+        self.delivery_count = 0
+        self.receipt = None
+
+    def to_json(self):
+        return {
+            "id": self.id,
+            "content": self.content,
+            "receipt": self.receipt,
+            "deliveryCount": self.delivery_count,
+            "visibleAfter": _iso(self.visible_at),
+            "expireAfter": _iso(self.expire_at),
+            "createdAt": _iso(self.created_at),
+            "metadata": self.metadata,
+        }
+
+
+class QueueService:
+    """Queues en memoria con la semántica de OCI Queue.
+
+    Un mensaje leído queda invisible ``visibility`` segundos; si no se borra
+    vuelve a estar disponible. Tras ``max_deliveries`` entregas pasa a ``dlq``.
+    """
+
+    def __init__(self, retention=3600, max_deliveries=5):
+        self.retention = retention
+        self.max_deliveries = max_deliveries
+        self.dlq = []
+        self.puts = 0
+        self.deletes = 0
+        self._queues = {}
+        self._receipts = {}
+        self._ids = itertools.count(1)
+        self._cond = threading.Condition()
+
+    def put(self, queue_id, entries):
+        """Encola [{"content", "metadata", "deliveryDelayInSeconds"}]; devuelve los ids."""
+        now = time.time()
+        with self._cond:
+            queue = self._queues.setdefault(queue_id, {})
+            ids = []
+            for entry in entries:
+                delay = float(entry.get("deliveryDelayInSeconds") or 0)
+                message = _Message(next(self._ids), entry["content"], entry.get("metadata"),
+                                   now + delay, self.retention)
+                queue[message.id] = message
+                ids.append(message.id)
+            self.puts += len(ids)
+            self._cond.notify_all()
+        return ids
+
+    def _channel_matches(self, message, channel_filter):
+        if not channel_filter:
+            return True
+        channel = str(message.metadata.get("channelId", ""))
+        if channel_filter.endswith("*"):
+            return channel.startswith(channel_filter[:-1])
+        return channel == channel_filter
+
+    def get(self, queue_id, limit=10, visibility=30, timeout=0, channel_filter=None):
+        """Devuelve hasta ``limit`` mensajes visibles; espera hasta ``timeout`` segundos si no hay."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                now = time.time()
+                queue = self._queues.get(queue_id, {})
+                out = []
+                for message in list(queue.values()):
+                    if message.expire_at <= now:
+                        del queue[message.id]
+                        continue
+                    if message.visible_at > now or not self._channel_matches(message, channel_filter):
+                        continue
+                    if self.max_deliveries and message.delivery_count >= self.max_deliveries:
+                        del queue[message.id]
+                        self.dlq.append((queue_id, message))
+                        continue
+                    message.delivery_count += 1
+                    message.visible_at = now + visibility
+                    self._receipts.pop(message.receipt, None)
+                    message.receipt = uuid.uuid4().hex
+                    self._receipts[message.receipt] = (queue_id, message.id)
+                    out.append(message)
+                    if len(out) >= limit:
+                        break
+                remaining = deadline - time.monotonic()
+                if out or remaining <= 0:
+                    return out
+                # Se despierta con cada put o, a más tardar, cuando vence una visibilidad
+                next_visible = min((m.visible_at for m in queue.values()), default=now + remaining)
+                self._cond.wait(max(0.01, min(remaining, next_visible - now)))
+
+    def _lookup(self, queue_id, receipt):
+        ref = self._receipts.get(receipt)
+        if ref is None or ref[0] != queue_id:
+            return None
+        return self._queues.get(queue_id, {}).get(ref[1])
+
+    def delete(self, queue_id, receipt):
+        with self._cond:
+            message = self._lookup(queue_id, receipt)
+            if message is None:
+                return False
+            del self._queues[queue_id][message.id]
+            del self._receipts[receipt]
+            self.deletes += 1
+            self._cond.notify_all()
+            return True
+
+    def update(self, queue_id, receipt, visibility):
+        with self._cond:
+            message = self._lookup(queue_id, receipt)
+            if message is None:
+                return None
+            message.visible_at = time.time() + visibility
+            self._cond.notify_all()
+            return message
+
+    def stats(self, queue_id):
+        now = time.time()
+        with self._cond:
+            messages = list(self._queues.get(queue_id, {}).values())
+        in_flight = sum(1 for m in messages if m.visible_at > now and m.delivery_count)
+        delayed = sum(1 for m in messages if m.visible_at > now and not m.delivery_count)
+        return {
+            "visibleMessages": len(messages) - in_flight - delayed,
+            "inFlightMessages": in_flight,
+            "delayedMessages": delayed,
+            "sizeInBytes": sum(len(m.content.encode("utf-8")) for m in messages),
+        }
+
+    def pending(self):
+        with self._cond:
+            return sum(len(q) for q in self._queues.values())
+
+
+class _JsonHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _reply(self, status, body=None, headers=None):
+        data = b"" if body is None else (body if isinstance(body, bytes) else json.dumps(body).encode("utf-8"))
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("opc-request-id", uuid.uuid4().hex)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class _QueueApiHandler(_JsonHandler):
+    """Rutas de la API de mensajes de OCI Queue (20210201)."""
+
+    _ROUTE = re.compile(r"^/20210201/queues/(?P<queue>[^/]+)(?P<rest>/.*)?$")
+
+    def _route(self):
+        parts = urlsplit(self.path)
+        m = self._ROUTE.match(parts.path)
+        if not m:
+            self._reply(404, {"code": "NotFound", "message": parts.path})
+            return None, None, None
+        return m.group("queue"), m.group("rest") or "", {k: v[-1] for k, v in parse_qs(parts.query).items()}
+
+    def do_GET(self):
+        service = self.server.service
+        queue_id, rest, query = self._route()
+        if queue_id is None:
+            return
+        if rest == "/messages":
+            messages = service.get(
+                queue_id,
+                limit=int(query.get("limit", 1)),
+                visibility=int(query.get("visibilityInSeconds", 30)),
+                timeout=min(int(query.get("timeoutInSeconds", 0)), 20),
+                channel_filter=query.get("channelFilter"),
+            )
+            return self._reply(200, {"messages": [m.to_json() for m in messages]})
+        if rest == "/stats":
+            return self._reply(200, {"queue": service.stats(queue_id), "dlq": {"visibleMessages": len(service.dlq)}})
+        self._reply(404, {"code": "NotFound", "message": self.path})
+
+    def do_POST(self):
+        service = self.server.service
+        queue_id, rest, _ = self._route()
+        if queue_id is None:
+            return
+        body = json.loads(self._body() or b"{}")
+        if rest == "/messages":
+            ids = service.put(queue_id, body.get("messages", []))
+            return self._reply(200, {"messages": [{"id": i, "expireAfter": _iso(time.time() + service.retention)}
+                                                  for i in ids]})
+        if rest == "/messages/actions/deleteMessages":
+            entries = [{} if service.delete(queue_id, e.get("receipt")) else
+                       {"errorCode": "NotFound", "errorMessage": "receipt desconocido"} for e in body.get("entries", [])]
+            failures = sum(1 for e in entries if e)
+            return self._reply(200, {"serverFailures": 0, "clientFailures": failures, "entries": entries})
+        if rest == "/messages/actions/updateMessages":
+            entries = []
+            for e in body.get("entries", []):
+                message = service.update(queue_id, e.get("receipt"), int(e.get("visibilityInSeconds", 30)))
+                entries.append({"id": message.id, "visibleAfter": _iso(message.visible_at)} if message else
+                               {"errorCode": "NotFound", "errorMessage": "receipt desconocido"})
+            failures = sum(1 for e in entries if "errorCode" in e)
+            return self._reply(200, {"serverFailures": 0, "clientFailures": failures, "entries": entries})
+        self._reply(404, {"code": "NotFound", "message": self.path})
+
+    def do_PUT(self):
+        service = self.server.service
+        queue_id, rest, _ = self._route()
+        if queue_id is None:
+            return
+        if rest.startswith("/messages/"):
+            body = json.loads(self._body() or b"{}")
+            message = service.update(queue_id, rest[len("/messages/"):], int(body.get("visibilityInSeconds", 30)))
+            if message is None:
+                return self._reply(404, {"code": "NotFound", "message": "receipt desconocido"})
+            return self._reply(200, {"id": message.id, "visibleAfter": _iso(message.visible_at)})
+        self._reply(404, {"code": "NotFound", "message": self.path})
+
+    def do_DELETE(self):
+        service = self.server.service
+        queue_id, rest, _ = self._route()
+        if queue_id is None:
+            return
+        if rest.startswith("/messages/") and service.delete(queue_id, rest[len("/messages/"):]):
+            return self._reply(200)
+        self._reply(404, {"code": "NotFound", "message": "receipt desconocido"})
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class QueueServer(_Server):
+    def __init__(self, service, port=0):
+        super().__init__(("127.0.0.1", port), _QueueApiHandler)
+        self.service = service
+
+
+# === OSB FALSO ===
+
+class _OsbHandler(_JsonHandler):
+    def _handle(self):
+        server = self.server
+        body = self._body()
+        delay = server.latency + random.uniform(0, server.jitter)
+        if delay:
+            time.sleep(delay)
+        status = server.responder(self.command, self.path, self.headers, body) if server.responder else None
+        if status is None:
+            status = server.error_status if random.random() < server.error_rate else server.ok_status
+        with server.lock:
+            server.received.append({
+                "method": self.command,
+                "path": self.path,
+                "correlationId": self.headers.get("X-Correlation-Id"),
+                "status": status,
+                "at": time.time(),
+            })
+        self._reply(status, None if status == 204 else {"status": status})
+
+    do_POST = do_PUT = _handle
+
+
+class FakeOsb(_Server):
+    """OSB con latencia ``latency`` + uniforme(0, ``jitter``) y una fracción ``error_rate`` de respuestas ``error_status``.
+
+    ``responder(method, path, headers, body)`` puede fijar el status de una
+    llamada; si devuelve None se aplica la regla general.
+    """
+
+    def __init__(self, port=0, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503,
+                 ok_status=200, responder=None):
+        super().__init__(("127.0.0.1", port), _OsbHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.ok_status = ok_status
+        self.responder = responder
+        self.received = []
+        self.lock = threading.Lock()
+
+
+# === CARGA DE FUNCIONES ===
+
+@contextlib.contextmanager
+def _environ(values):
+    saved = {k: os.environ.get(k) for k in values}
+    os.environ.update({k: str(v) for k, v in values.items()})
+    try:
+        yield
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+
+def load_function(folder, env, modules=("func",)):
+    """Importa los módulos de una carpeta de función aislados de las demás.
+
+    Las funciones comparten nombres de módulo (func, envelope, tracing...), así
+    que cada carpeta se importa con sus módulos fuera de ``sys.modules`` y con
+    sus variables de entorno, que los módulos leen al importarse.
+    """
+    names = {f[:-3] for f in os.listdir(folder) if f.endswith(".py")}
+    saved = {n: sys.modules.pop(n) for n in names if n in sys.modules}
+    sys.path.insert(0, folder)
+    try:
+        with _environ(env):
+            return {name: importlib.import_module(name) for name in modules}
+    finally:
+        sys.path.remove(folder)
+        for n in names:
+            sys.modules.pop(n, None)
+        sys.modules.update(saved)
+
+
+def _generate_oci_config(directory):
+    """Configuración OCI válida para el SDK, con una llave RSA generada al vuelo."""
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    key_file = os.path.join(directory, "oci_api_key.pem")
+    with open(key_file, "wb") as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.TraditionalOpenSSL,
+                                  serialization.NoEncryption()))
+    der = key.public_key().public_bytes(serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo)
+    digest = hashes.Hash(hashes.MD5())
+    digest.update(der)
+    fingerprint = ":".join(f"{b:02x}" for b in digest.finalize())
+    return {
+        "user": "ocid1.user.oc1..emulador",
+        "tenancy": "ocid1.tenancy.oc1..emulador",
+        "fingerprint": fingerprint,
+        "key_file": key_file,
+        "region": "us-ashburn-1",
+    }
+
+
+class _QueueAdmin:
+    endpoint = None
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def get_queue(self, queue_id, **kwargs):
+        return SimpleNamespace(data=SimpleNamespace(id=queue_id, messages_endpoint=self.endpoint))
+
+
+def make_context(headers=None, request_url="/", method="POST", config=None):
+    """Contexto FDK para invocar un handler; las cabeceras llegan en minúsculas, como en el runtime."""
+    from fdk import context
+
+    headers = {str(k).lower(): v for k, v in (headers or {}).items()}
+    return context.InvokeContext("emulador", "emulador", "emulador", "emulador", uuid.uuid4().hex,
+                                 config=config or {}, headers=headers, request_url=request_url, method=method)
+
+
+def _unwrap(ctx, result):
+    """(status, headers, body) a partir de un fdk Response o de la tupla que devuelven las consumidoras."""
+    if isinstance(result, tuple):
+        status, body = result[0], result[1]
+        headers = result[2] if len(result) > 2 else {}
+    else:
+        status = result.status_code
+        body = result.response_data
+        headers = ctx.GetResponseHeaders()
+    if isinstance(body, bytes):
+        body = body.decode("utf-8")
+    # La productora Minka entrega el status como texto ("202")
+    return int(status), dict(headers or {}), body
+
+
+def configure_logging(level):
+    """Deja un solo handler con el nivel pedido; las funciones configuran el logging al importarse."""
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    logging.basicConfig(level=level, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    for name in ("urllib3", "oci"):
+        logging.getLogger(name).setLevel(max(logging.WARNING, root.level))
+
+
+# === EMULADOR ===
+
+class Emulator:
+    """Queue, OSB y funciones reales conectadas como en OCI.
+
+    ``consumer_mode``:
+        "connector" -> como el Service Connector: lotes de ``batch_size``
+                       contents a la consumidora; el lote se borra si responde 2xx
+        "worker"    -> ``worker.poll_once()`` de cada consumidora (modo pull)
+        "manual"    -> nada consume; usar ``deliver(nombre)`` para un lote
+    ``env`` permite sobreescribir variables por función: {"minka_consumer": {"MAX_RETRIES": "1"}}.
+    """
+
+    def __init__(self, osb_latency=0.0, osb_jitter=0.0, osb_error_rate=0.0, osb_error_status=503,
+                 osb_responder=None, consumer_mode="connector", batch_size=10, visibility=10,
+                 max_deliveries=5, env=None, functions=None):
+        self.consumer_mode = consumer_mode
+        self.batch_size = batch_size
+        self.visibility = visibility
+        self.queue = QueueService(max_deliveries=max_deliveries)
+        self.osb = FakeOsb(latency=osb_latency, jitter=osb_jitter, error_rate=osb_error_rate,
+                           error_status=osb_error_status, responder=osb_responder)
+        self.functions = {}
+        self.sent = {}
+        self._env = env or {}
+        self._names = functions or list(FUNCTIONS)
+        self._workdir = None
+        self._queue_server = None
+        self._patches = []
+        self._threads = []
+        self._stop = threading.Event()
+        self.batches = {name: 0 for name in CONSUMERS}
+
+    # --- ciclo de vida ---
+
+    def start(self):
+        import oci
+
+        self._workdir = tempfile.mkdtemp(prefix="emulador_")
+        self._queue_server = QueueServer(self.queue).start()
+        self.osb.start()
+
+        config = _generate_oci_config(self._workdir)
+        _QueueAdmin.endpoint = self._queue_server.url
+        self._patch(oci.config, "from_file", lambda *args, **kwargs: dict(config))
+        self._patch(oci.queue, "QueueAdminClient", _QueueAdmin)
+
+        for name in self._names:
+            folder, queue_id = FUNCTIONS[name]
+            modules = ("func", "worker") if name in CONSUMERS and self.consumer_mode == "worker" else ("func",)
+            self.functions[name] = load_function(os.path.join(DEV_DIR, folder), self._function_env(name, queue_id),
+                                                 modules)
+
+        if self.consumer_mode != "manual":
+            for name in CONSUMERS:
+                if name in self.functions:
+                    thread = threading.Thread(target=self._consume_loop, args=(name,), daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+        return self
+
+    def close(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self.osb.shutdown()
+        self._queue_server.shutdown()
+        for target, attr, original in reversed(self._patches):
+            setattr(target, attr, original)
+        self._patches = []
+        shutil.rmtree(self._workdir, ignore_errors=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _patch(self, target, attr, value):
+        self._patches.append((target, attr, getattr(target, attr)))
+        setattr(target, attr, value)
+
+    def _function_env(self, name, queue_id):
+        osb = self.osb.url
+        env = {
+            "QUEUE_OCID": queue_id,
+            "QUEUE_OCID_BY_CHANNEL": "",
+            "QUEUE_OCID_SHARDS": "",
+            "QUEUE_OCID_BY_PRIORITY": "",
+            "OSB_AUTH": "Basic " + base64.b64encode(b"emulador:emulador").decode(),
+            "OAUTH_TOKEN_URL": "",
+            "SPOOL_PATH": os.path.join(self._workdir, f"{name}_spool.sqlite3"),
+            "RATE_LIMIT_JITTER": "0",
+            "POLL_TIMEOUT": "1",
+            "VISIBILITY": str(self.visibility),
+            "ERROR_BACKOFF": "1",
+        }
+        if name == "pomelo_consumer":
+            env.update({
+                "OSB_BASE_URL_POMELO": f"{osb}/pomelo/notificaciones",
+                "OSB_BASE_URL_ACTIVIDADES": f"{osb}/pomelo/actividades",
+                "OSB_BASE_URL_TARJETA": f"{osb}/pomelo/tarjeta",
+            })
+        elif name == "pomelo_notification":
+            env.update({"OSB_BASE_URL": f"{osb}/pomelo/notificacion", "API_SECRET": POMELO_API_SECRET})
+        elif name == "minka_consumer":
+            env.update({
+                "OSB_BASE_URL": f"{osb}/minka",
+                "VISIBILITY_DELAY": "1",
+                "STATE_DEFER_DELAY": "1",
+                "VISIBILITY_EXTENSION": str(self.visibility),
+            })
+        env.update(self._env.get(name, {}))
+        return env
+
+    # --- invocación ---
+
+    def invoke(self, name, body=b"", headers=None, url="/", method="POST"):
+        """Invoca el handler real de ``name``. Devuelve (status, headers, body)."""
+        module = self.functions[name]["func"]
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body)
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        headers = dict(headers or {})
+        if name.endswith("_producer") or name == "pomelo_notification":
+            # Mismo orden de preferencia que tracing.correlation_id
+            lower = {k.lower(): v for k, v in headers.items()}
+            correlation = lower.get("x-correlation-id") or lower.get("x-request-id")
+            if not correlation:
+                correlation = headers["X-Correlation-Id"] = uuid.uuid4().hex
+            self.sent[correlation] = time.time()
+        ctx = make_context(headers, url, method)
+        return _unwrap(ctx, module.handler(ctx, io.BytesIO(body)))
+
+    def deliver(self, name, timeout=0):
+        """Un lote de la Queue a la consumidora ``name``, como el Service Connector. Devuelve los mensajes entregados."""
+        queue_id = CONSUMERS[name]
+        messages = self.queue.get(queue_id, limit=self.batch_size, visibility=self.visibility, timeout=timeout)
+        if not messages:
+            return 0
+        events = [json.loads(m.content) for m in messages]
+        status, _, _ = self.invoke(name, json.dumps(events), url="/", method="POST")
+        self.batches[name] += 1
+        if 200 <= status < 300:
+            for m in messages:
+                self.queue.delete(queue_id, m.receipt)
+        else:
+            logger.warning(f"{name} respondió {status}: el lote vuelve a la Queue al vencer la visibilidad")
+        return len(messages)
+
+    def _consume_loop(self, name):
+        worker = self.functions[name].get("worker")
+        while not self._stop.is_set():
+            try:
+                if worker is not None:
+                    if worker.poll_once():
+                        self.batches[name] += 1
+                else:
+                    self.deliver(name, timeout=0.5)
+            except Exception:
+                logger.exception(f"Error en el consumo de {name}")
+                time.sleep(0.5)
+
+    def wait_idle(self, timeout=60.0, settle=0.2):
+        """Espera a que las Queues queden vacías, incluidos los mensajes diferidos y los que están en proceso.
+
+        Un mensaje en proceso sigue en la Queue hasta que la consumidora o el
+        conector lo borran, después de procesarlo.
+        """
+        deadline = time.monotonic() + timeout
+        quiet_since = None
+        while time.monotonic() < deadline:
+            if not self.queue.pending():
+                quiet_since = quiet_since or time.monotonic()
+                if time.monotonic() - quiet_since >= settle:
+                    return True
+            else:
+                quiet_since = None
+            time.sleep(0.05)
+        return False
+
+    # --- resultados ---
+
+    def summary(self):
+        with self.osb.lock:
+            received = list(self.osb.received)
+        by_path = {}
+        delivered = {}
+        for call in received:
+            key = re.sub(r"/[^/]+/(abortar|confirmar|completar)$", r"/{handle}/\1", urlsplit(call["path"]).path)
+            by_path.setdefault(key, {}).setdefault(str(call["status"]), 0)
+            by_path[key][str(call["status"])] += 1
+            if 200 <= call["status"] < 300 and call["correlationId"] in self.sent:
+                delivered.setdefault(call["correlationId"], call["at"])
+        e2e = [1000 * (at - self.sent[cid]) for cid, at in delivered.items()]
+        return {
+            "sent": len(self.sent),
+            "delivered": len(delivered),
+            "osb_calls": len(received),
+            "osb_by_path": by_path,
+            "queue": {"puts": self.queue.puts, "deletes": self.queue.deletes, "pending": self.queue.pending(),
+                      "dlq": len(self.queue.dlq)},
+            "batches": dict(self.batches),
+            "e2e_ms": {"p50": percentile(e2e, 50), "p95": percentile(e2e, 95), "p99": percentile(e2e, 99),
+                       "max": max(e2e) if e2e else None},
+        }
+
+
+# === TRÁFICO DE EJEMPLO ===
+
+def pomelo_card_event(i):
+    return {
+        "event_id": f"card-event-{i}",
+        "id": f"crd-{i % 97:05d}",
+        "updated_at": _iso(time.time()),
+        "user_id": f"usr-{i % 53:05d}",
+        "event": "BLOCK" if i % 10 == 0 else "ACTIVATION",
+        "card_type": "VIRTUAL",
+        "idempotency_key": str(uuid.uuid4()),
+    }
+
+
+def minka_requests(i):
+    """Secuencia Prepared -> Committed -> Completed de un intent con cuerpos de Contexto/Mensajes.json."""
+    with open(os.path.join(DEV_DIR, "notificaciones_minka", "Contexto", "Mensajes.json"), encoding="utf-8") as f:
+        template = json.load(f)
+    debit = f"deb_emulador{i:06d}"
+    intent = f"int_emulador{i:06d}"
+    body = json.loads(json.dumps(template))
+    body["data"]["handle"] = debit
+    body["data"]["intent"]["data"]["handle"] = intent
+    completed = json.loads(json.dumps(body))
+    completed["data"]["intent"]["meta"]["status"] = "completed"
+    return [
+        ("/debits", "POST", body),
+        (f"/debits/{intent}/commit", "POST", body),
+        (f"/intents/{intent}", "PUT", completed),
+    ]
+
+
+def run_demo(emulator, events):
+    """Envía ``events`` eventos Pomelo, ``events // 3`` intents Minka y notificaciones firmadas."""
+    statuses = {}
+
+    def count(name, status):
+        statuses.setdefault(name, {}).setdefault(str(status), 0)
+        statuses[name][str(status)] += 1
+
+    for i in range(events):
+        status, _, _ = emulator.invoke("pomelo_producer", pomelo_card_event(i),
+                                       headers={"channel_queue": "CANAL_EVENTOS_TARJETA"})
+        count("pomelo_producer", status)
+    for i in range(max(1, events // 3)):
+        for url, method, body in minka_requests(i):
+            status, _, _ = emulator.invoke("minka_producer", body, url=url, method=method)
+            count("minka_producer", status)
+    for i in range(max(1, events // 10)):
+        body = json.dumps(pomelo_card_event(i))
+        timestamp = str(int(time.time()))
+        headers = {
+            "x-endpoint": POMELO_ENDPOINT,
+            "x-timestamp": timestamp,
+            "x-signature": pomelo_signature(POMELO_API_SECRET, POMELO_ENDPOINT, timestamp, body),
+            "x-api-key": "mock-api-key-12345",
+        }
+        status, _, _ = emulator.invoke("pomelo_notification", body, headers=headers)
+        count("pomelo_notification", status)
+    return statuses
+
+
+# === MODO SERVIDOR ===
+
+class _FrontHandler(_JsonHandler):
+    """``/<función>/<ruta>`` invoca la función con RequestURL ``/<ruta>``; ``GET /stats`` da el resumen."""
+
+    def _handle(self):
+        emulator = self.server.emulator
+        parts = urlsplit(self.path)
+        if self.command == "GET" and parts.path == "/stats":
+            return self._reply(200, emulator.summary())
+        name, _, rest = parts.path.lstrip("/").partition("/")
+        if name not in emulator.functions or name in CONSUMERS:
+            return self._reply(404, {"code": 404, "message": f"función desconocida: {name}"})
+        url = "/" + rest + (f"?{parts.query}" if parts.query else "")
+        status, headers, body = emulator.invoke(name, self._body(), dict(self.headers.items()), url, self.command)
+        headers.pop("Content-Length", None)
+        self._reply(status, (body or "").encode("utf-8"), {k: v for k, v in headers.items()
+                                                             if k.lower() not in ("content-type",)})
+
+    do_GET = do_POST = do_PUT = _handle
+
+
+class FrontServer(_Server):
+    def __init__(self, emulator, port=0):
+        super().__init__(("127.0.0.1", port), _FrontHandler)
+        self.emulator = emulator
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=30, help="eventos Pomelo de la demo (Minka: un tercio)")
+    parser.add_argument("--osb-latency", type=float, default=0.0, help="segundos por llamada al OSB")
+    parser.add_argument("--osb-jitter", type=float, default=0.0)
+    parser.add_argument("--osb-error-rate", type=float, default=0.0)
+    parser.add_argument("--osb-error-status", type=int, default=503)
+    parser.add_argument("--consumer-mode", choices=("connector", "worker"), default="connector")
+    parser.add_argument("--batch-size", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=120.0, help="espera máxima a que se vacíen las Queues")
+    parser.add_argument("--serve", action="store_true", help="atiende HTTP en --port en lugar de la demo")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    emulator = Emulator(osb_latency=args.osb_latency, osb_jitter=args.osb_jitter, osb_error_rate=args.osb_error_rate,
+                        osb_error_status=args.osb_error_status, consumer_mode=args.consumer_mode,
+                        batch_size=args.batch_size)
+    with emulator:
+        configure_logging(args.log_level)
+        if args.serve:
+            front = FrontServer(emulator, args.port)
+            print(f"Emulador en {front.url} (OSB falso en {emulator.osb.url})")
+            try:
+                front.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            return
+
+        started = time.monotonic()
+        statuses = run_demo(emulator, args.events)
+        idle = emulator.wait_idle(args.timeout)
+        result = emulator.summary()
+        result["producers"] = statuses
+        result["idle"] = idle
+        result["seconds"] = round(time.monotonic() - started, 2)
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
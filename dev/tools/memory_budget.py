@@ -0,0 +1,310 @@
+"""Presupuesto de memoria por función y tipo de invocación.
+
+Cada tipo de invocación corre en un proceso propio que carga solo esa
+función, con la Queue y el OSB falsos de local_emulator.py en el proceso
+padre (así su memoria no se mezcla con la de la función). Se mide:
+    runtime_mb   RSS del intérprete con el FDK cargado, antes de importar la función
+    import_mb    RSS después de importar func.py (dependencias de arranque)
+    steady_mb    RSS estable: mediana de la segunda mitad de ``--invocations`` invocaciones
+    peak_mb      pico de RSS del proceso durante esas invocaciones
+    alloc_kb     pico de memoria Python asignada por invocación (tracemalloc, en una pasada aparte)
+    modules      si la invocación llegó a importar oci / reportlab
+y se compara con el ``memory`` de func.yaml: el pico debe dejar al menos
+``--min-headroom`` MB libres. Con ``--check`` el comando termina con código 1
+si algún tipo de invocación no cabe.
+
+El SDK de OCI se parchea (QueueAdminClient apunta a la Queue falsa) recién
+cuando la función importa ``oci.queue``, para no cargarlo en los caminos que
+no lo usan.
+
+Uso:
+    python dev/tools/memory_budget.py
+    python dev/tools/memory_budget.py --filter pdf --invocations 5
+    python dev/tools/memory_budget.py --check --min-headroom 24 --output presupuesto.json
+"""
+import argparse
+import importlib.abc
+import importlib.util
+import io
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tracemalloc
+import uuid
+
+from load_generator import Traffic
+from local_emulator import DEV_DIR, FUNCTIONS, Emulator, _generate_oci_config
+
+PDF_FOLDER = "pdf_func_despliegue_alianza"
+DEFAULT_MIN_HEADROOM = 16
+
+
+def _card_batch(size):
+    def build(i):
+        events = [{"Channel": "CANAL_EVENTOS_TARJETA", "payload": Traffic("pomelo-eventos")._card_event(i * size + n)}
+                  for n in range(size)]
+        return {}, "/", "POST", json.dumps(events)
+    return build
+
+
+def _minka_batch(size):
+    traffic = Traffic("minka")
+
+    def build(i):
+        events = []
+        for n in range(size):
+            _, _, body = traffic._minka(3 * (i * size + n))
+            events.append({"channel": "Prepared", "payload": body, "pathParams": None})
+        return {}, "/", "POST", json.dumps(events)
+    return build
+
+
+def _traffic(scenario):
+    traffic = Traffic(scenario)
+
+    def build(i):
+        path, method, headers, body = traffic.request(i)
+        return headers, path or "/", method, body
+    return build
+
+
+def _pdf(rows):
+    def build(i):
+        datos = {
+            "Ciudad": "Bogotá",
+            # Referencia distinta en cada invocación: se mide la generación, no la caché
+            "Referencia": f"Contrato {uuid.uuid4().hex[:8]}",
+            "NIT": "900123456",
+            "Plan": "Plan Pensional XYZ",
+            "Representante": "Juan Pérez",
+            "Clientes": [{"cedula": str(10000000 + n), "nombre": f"Partícipe {n} Apellido",
+                          "encargo": f"ENC-{n:06d}"} for n in range(rows)],
+        }
+        return {"Content-Type": "application/json"}, "/", "POST", json.dumps(datos, ensure_ascii=False)
+    return build
+
+
+def _health(i):
+    return {"health_check": "true"}, "/", "GET", ""
+
+
+# tipo de invocación -> (función, constructor de la i-ésima petición, invocaciones por defecto)
+INVOCATIONS = {
+    "pomelo_producer.evento": ("pomelo_producer", _traffic("pomelo-eventos"), 40),
+    "pomelo_producer.actividad": ("pomelo_producer", _traffic("pomelo-actividades"), 40),
+    "pomelo_producer.health": ("pomelo_producer", _health, 40),
+    "pomelo_consumer.lote_10": ("pomelo_consumer", _card_batch(10), 20),
+    "pomelo_consumer.lote_100": ("pomelo_consumer", _card_batch(100), 6),
+    "pomelo_consumer.health": ("pomelo_consumer", _health, 40),
+    "pomelo_notification.evento": ("pomelo_notification", _traffic("pomelo-notificacion"), 40),
+    "pomelo_notification.health": ("pomelo_notification", _health, 40),
+    "minka_producer.debito": ("minka_producer", _traffic("minka"), 40),
+    "minka_producer.health": ("minka_producer", _health, 40),
+    "minka_consumer.lote_10": ("minka_consumer", _minka_batch(10), 20),
+    "minka_consumer.lote_100": ("minka_consumer", _minka_batch(100), 6),
+    "minka_consumer.health": ("minka_consumer", _health, 40),
+    "pdf.clientes_10": ("pdf", _pdf(10), 20),
+    "pdf.clientes_1000": ("pdf", _pdf(1000), 6),
+    "pdf.clientes_10000": ("pdf", _pdf(10000), 3),
+    "pdf.health": ("pdf", _health, 40),
+}
+
+
+def _folder(function):
+    return os.path.join(DEV_DIR, PDF_FOLDER if function == "pdf" else FUNCTIONS[function][0])
+
+
+def budget_mb(function):
+    """``memory`` de func.yaml de la función."""
+    with open(os.path.join(_folder(function), "func.yaml"), encoding="utf-8") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key.strip() == "memory":
+                return int(value.strip())
+    return None
+
+
+def _proc_status_mb(field):
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def rss_mb():
+    """RSS actual; sin /proc (macOS) se usa el pico."""
+    return _proc_status_mb("VmRSS") or peak_rss_mb()
+
+
+def peak_rss_mb():
+    """Pico de RSS. En Linux, VmHWM: ru_maxrss hereda tras exec el pico del proceso padre."""
+    peak = _proc_status_mb("VmHWM")
+    if peak is not None:
+        return peak
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+
+class _PatchOnImport(importlib.abc.MetaPathFinder):
+    """Ejecuta ``patch(módulo)`` justo después de importarse ``name``, si es que se importa."""
+
+    def __init__(self, name, patch):
+        self.name = name
+        self.patch = patch
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname != self.name:
+            return None
+        sys.meta_path.remove(self)
+        spec = importlib.util.find_spec(fullname)
+        exec_module = spec.loader.exec_module
+
+        def exec_and_patch(module):
+            exec_module(module)
+            self.patch(module)
+        spec.loader.exec_module = exec_and_patch
+        return spec
+
+
+def measure(spec):
+    """Mide un tipo de invocación en este proceso (modo --child)."""
+    from local_emulator import _QueueAdmin, _unwrap, configure_logging, load_function, make_context
+
+    name, count, traced = spec["invocation"], spec["invocations"], spec["traced"]
+    function, build, _ = INVOCATIONS[name]
+    os.chdir(spec["workdir"])
+    _QueueAdmin.endpoint = spec["queue_url"]
+    sys.meta_path.insert(0, _PatchOnImport("oci.queue", lambda m: setattr(m, "QueueAdminClient", _QueueAdmin)))
+
+    make_context()  # carga el FDK, que en OCI ya está en memoria antes que la función
+    runtime = rss_mb()
+    func = load_function(_folder(function), spec["env"])["func"]
+    configure_logging("WARNING")
+    imported = rss_mb()
+
+    def invoke(i):
+        headers, url, method, body = build(i)
+        ctx = make_context(headers, url, method)
+        data = io.BytesIO(body.encode("utf-8")) if body else None
+        status, _, _ = _unwrap(ctx, func.handler(ctx, data))
+        return status
+
+    statuses = {}
+    samples = []
+    for i in range(count):
+        status = invoke(i)
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+        samples.append(rss_mb())
+    peak = peak_rss_mb()
+
+    tracemalloc.start()
+    allocs = []
+    for i in range(count, count + traced):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        invoke(i)
+        allocs.append(tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+
+    return {
+        "runtime_mb": round(runtime, 1),
+        "import_mb": round(imported, 1),
+        "steady_mb": round(statistics.median(samples[len(samples) // 2:]), 1),
+        "peak_mb": round(peak, 1),
+        "alloc_kb": round(max(allocs) / 1024, 1) if allocs else None,
+        "modules": {m: m in sys.modules for m in ("oci", "reportlab", "requests")},
+        "statuses": statuses,
+        "invocations": count,
+    }
+
+
+def run_isolated(name, spec):
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", json.dumps(spec)],
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        return {"error": (proc.stderr.strip().splitlines() or ["sin salida"])[-1]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _write_oci_config(workdir):
+    config = _generate_oci_config(workdir)
+    with open(os.path.join(workdir, "config.oci"), "w", encoding="utf-8") as f:
+        f.write("[DEFAULT]\n" + "".join(f"{key}={value}\n" for key, value in config.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filter", help="solo tipos de invocación cuyo nombre contiene este texto")
+    parser.add_argument("--list", action="store_true")
+    parser.add_argument("--invocations", type=int, help="invocaciones por tipo (por defecto, las de INVOCATIONS)")
+    parser.add_argument("--traced", type=int, default=3, help="invocaciones medidas con tracemalloc")
+    parser.add_argument("--min-headroom", type=float, default=DEFAULT_MIN_HEADROOM,
+                        help="MB que el pico debe dejar libres respecto de func.yaml")
+    parser.add_argument("--check", action="store_true", help="código 1 si algún tipo de invocación no cabe")
+    parser.add_argument("--output", help="archivo para el resultado JSON")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        stdout, sys.stdout = sys.stdout, io.StringIO()
+        try:
+            result = measure(json.loads(args.child))
+        finally:
+            sys.stdout = stdout
+        print(json.dumps(result))
+        return 0
+
+    names = [n for n in INVOCATIONS if not args.filter or args.filter in n]
+    if args.list:
+        print("\n".join(names))
+        return 0
+
+    results = {}
+    with Emulator(consumer_mode="manual", functions=[]) as emulator:
+        _write_oci_config(emulator._workdir)
+        for name in names:
+            function, _, count = INVOCATIONS[name]
+            if function == "pdf":
+                env = {"TARGET_API_URL": "", "OCI_QUEUE_ID": ""}
+            else:
+                env = emulator._function_env(function, FUNCTIONS[function][1])
+            spec = {
+                "invocation": name,
+                "invocations": args.invocations or count,
+                "traced": args.traced,
+                "workdir": emulator._workdir,
+                "queue_url": emulator._queue_server.url,
+                "env": env,
+            }
+            result = run_isolated(name, spec)
+            budget = budget_mb(function)
+            if "error" not in result and budget:
+                result["budget_mb"] = budget
+                result["headroom_mb"] = round(budget - result["peak_mb"], 1)
+                result["fits"] = result["headroom_mb"] >= args.min_headroom
+            results[name] = result
+            print(f"{name:30} " + (
+                f"error: {result['error']}" if "error" in result else
+                f"import={result['import_mb']:6.1f}  steady={result['steady_mb']:6.1f}  "
+                f"peak={result['peak_mb']:6.1f}/{result.get('budget_mb')} MB  alloc={result['alloc_kb']:9.1f} KB  "
+                f"oci={'sí' if result['modules']['oci'] else 'no'}  {'OK' if result.get('fits') else 'EXCEDE'}"
+            ), file=sys.stderr)
+
+    text = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+    failed = [n for n, r in results.items() if "error" in r or not r.get("fits", True)]
+    return 1 if args.check and failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+"""Deriva la tabla de rutas del productor Minka desde el deployment del API Gateway.
+
+Lee ``transacciones.json``, toma las rutas de ``/fiducia/minka/`` y el canal que
+fija la cabecera ``x-queue-channel`` de cada una, y las compara con
+``routes.ROUTES`` del productor. Termina con código 1 si no coinciden e imprime
+la tabla que debería usarse.
+
+Uso:
+    python dev/tools/minka_routes.py transacciones.json
+"""
+import json
+import os
+import sys
+
+DEV_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(DEV_DIR, "notificaciones_minka", "fn_producer_queue_minka_debit_dev"))
+
+import routes  # noqa: E402
+
+MINKA_PREFIX = "/rest/b2b/fiducia/minka/v2"
+
+
+def routes_from_spec(spec):
+    table = []
+    for route in spec["specification"]["routes"]:
+        path = route["path"]
+        if not path.startswith(MINKA_PREFIX):
+            continue
+        items = (route.get("requestPolicies", {}).get("headerTransformations", {})
+                 .get("setHeaders", {}).get("items", []))
+        channel = next((i["values"][0] for i in items if i["name"].lower() == "x-queue-channel"), None)
+        table.append((path[len(MINKA_PREFIX):], tuple(route["methods"]), channel))
+    return table
+
+
+def main(argv):
+    path = argv[1] if len(argv) > 1 else os.path.join(os.path.dirname(DEV_DIR), "transacciones.json")
+    with open(path, encoding="utf-8") as f:
+        derived = routes_from_spec(json.load(f))
+
+    if derived == routes.ROUTES:
+        print(f"routes.ROUTES coincide con {path} ({len(derived)} rutas)")
+        return 0
+
+    print("routes.ROUTES no coincide con el deployment. Tabla esperada:")
+    print("ROUTES = [")
+    for template, methods, channel in derived:
+        print(f"    ({template!r}, {methods!r}, {channel!r}),")
+    print("]")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
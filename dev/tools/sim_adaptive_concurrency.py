@@ -0,0 +1,138 @@
+"""Simulación del control adaptativo de concurrencia contra un OSB falso.
+
+El OSB falso atiende ``capacity`` solicitudes en paralelo con una latencia base;
+por encima de esa capacidad la latencia crece de forma proporcional a la carga
+y a partir de ``capacity * overload`` responde 503. La simulación pasa por
+fases con latencia/capacidad distintas y muestra cómo el límite y el
+throughput siguen a la capacidad disponible.
+
+Uso:
+    python dev/tools/sim_adaptive_concurrency.py --workers 64 --phase-seconds 6
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+DEV_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(DEV_DIR, "notificaciones_minka", "fn_consumer_queue_minka_debit_dev"))
+
+from concurrency import AdaptiveConcurrencyLimiter  # noqa: E402
+
+# (nombre, latencia base en segundos, capacidad en solicitudes paralelas)
+DEFAULT_PHASES = [
+    ("sano", 0.020, 16),
+    ("degradado", 0.060, 4),
+    ("recuperado", 0.020, 16),
+    ("ampliado", 0.020, 24),
+]
+
+
+class _Resp:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FakeOSB:
+    """OSB en proceso con latencia y capacidad ajustables en caliente."""
+
+    def __init__(self, latency, capacity, overload=3.0):
+        self.latency = latency
+        self.capacity = capacity
+        self.overload = overload
+        self._inflight = 0
+        self._lock = threading.Lock()
+
+    def configure(self, latency, capacity):
+        with self._lock:
+            self.latency = latency
+            self.capacity = capacity
+
+    def request(self):
+        with self._lock:
+            self._inflight += 1
+            load = self._inflight / self.capacity
+            rejected = load > self.overload
+            latency = self.latency * max(1.0, load)
+        try:
+            if rejected:
+                time.sleep(self.latency / 10)
+                return _Resp(503)
+            time.sleep(latency)
+            return _Resp(200)
+        finally:
+            with self._lock:
+                self._inflight -= 1
+
+
+def simulate(phases, workers, phase_seconds, limiter=None):
+    osb = FakeOSB(phases[0][1], phases[0][2])
+    # Ventana de latencia base menor que la duración de cada fase
+    limiter = limiter or AdaptiveConcurrencyLimiter(initial=2, max_limit=workers,
+                                                    window=phase_seconds / 4)
+    stats = {"ok": 0, "error": 0, "latency": 0.0}
+    stats_lock = threading.Lock()
+    stop = threading.Event()
+
+    def worker():
+        while not stop.is_set():
+            start = time.monotonic()
+            r = limiter.call(osb.request)
+            elapsed = time.monotonic() - start
+            with stats_lock:
+                if r.status_code < 500:
+                    stats["ok"] += 1
+                    stats["latency"] += elapsed
+                else:
+                    stats["error"] += 1
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+    for t in threads:
+        t.start()
+
+    report = []
+    for name, latency, capacity in phases:
+        osb.configure(latency, capacity)
+        with stats_lock:
+            stats.update(ok=0, error=0, latency=0.0)
+        limits = []
+        end = time.monotonic() + phase_seconds
+        while time.monotonic() < end:
+            time.sleep(0.05)
+            limits.append(limiter.limit)
+        with stats_lock:
+            ok, error, total_latency = stats["ok"], stats["error"], stats["latency"]
+        # Las mediciones toman la segunda mitad de la fase, ya estabilizada
+        tail = limits[len(limits) // 2:]
+        report.append({
+            "fase": name,
+            "capacidad": capacity,
+            "limite_medio": round(sum(tail) / len(tail), 1),
+            "throughput_rps": round(ok / phase_seconds, 1),
+            "ideal_rps": round(capacity / latency, 1),
+            "espera_ms": round(1000 * total_latency / ok, 1) if ok else None,
+            "errores": error,
+        })
+
+    stop.set()
+    for t in threads:
+        t.join()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=64)
+    parser.add_argument("--phase-seconds", type=float, default=6.0)
+    args = parser.parse_args()
+
+    report = simulate(DEFAULT_PHASES, args.workers, args.phase_seconds)
+    columns = list(report[0].keys())
+    print("  ".join(f"{c:>14}" for c in columns))
+    for row in report:
+        print("  ".join(f"{str(row[c]):>14}" for c in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""Verificación masiva y en paralelo de firmas de webhooks Pomelo registradas.
+
+Lee registros (timestamp, endpoint, body, signature) de archivos NDJSON o de
+exportaciones de logs (una línea por registro con un objeto JSON en algún
+punto de la línea), en texto plano o .gz, o de la entrada estándar con
+``-``. Cada registro puede traer los campos planos (``timestamp``/
+``x-timestamp``, ``endpoint``/``x-endpoint``, ``signature``/``x-signature``,
+``body``) o las cabeceras en ``headers`` y el cuerpo en ``body``.
+
+La verificación es la de ``check_signature`` de la función de notificación:
+prefijo ``hmac-sha256 ``, HMAC-SHA256 con el secreto en base64 sobre
+timestamp + endpoint + body, y comparación en tiempo constante. Se aceptan
+varios secretos candidatos (ventanas de rotación); cada registro se marca con
+el primero que coincide. Las líneas se reparten por bloques entre procesos,
+que también hacen el parseo del JSON.
+
+Salida: resumen JSON (por secreto: coincidencias y rango de timestamps;
+conteo de firmas que no coinciden y de registros malformados) y, con
+``--mismatches``, un NDJSON con cada registro que no coincidió.
+
+Uso:
+    python dev/tools/verify_signatures.py auditoria/*.ndjson.gz --secret actual=<base64> --secret anterior=<base64> \\
+        --mismatches no_coinciden.ndjson --summary resumen.json
+    python dev/tools/verify_signatures.py --generate 1000000 --secret <base64> > muestra.ndjson
+"""
+import argparse
+import base64
+import binascii
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from multiprocessing import Pool
+
+PREFIX = "hmac-sha256 "
+FIELDS = {
+    "timestamp": ("timestamp", "x-timestamp"),
+    "endpoint": ("endpoint", "x-endpoint"),
+    "signature": ("signature", "x-signature"),
+}
+BODY_FIELDS = ("body", "input_body")
+
+# Secretos del proceso worker: [(etiqueta, hmac precargado con la llave)]
+_keyed = []
+
+
+def parse_secrets(values):
+    """``etiqueta=base64`` o solo ``base64`` (etiqueta secreto<n>)."""
+    secrets = []
+    for i, value in enumerate(values):
+        label, sep, secret = value.partition("=")
+        # En base64 el "=" solo aparece como relleno al final: sin texto después no hay etiqueta
+        if not sep or not label or len(secret) < 4:
+            label, secret = f"secreto{i + 1}", value
+        base64.b64decode(secret, validate=True)
+        secrets.append((label, secret))
+    return secrets
+
+
+def _init_worker(secrets):
+    global _keyed
+    _keyed = [(label, hmac.new(base64.b64decode(secret), digestmod=hashlib.sha256)) for label, secret in secrets]
+
+
+def _field(record, headers, names):
+    for name in names:
+        if name in record:
+            return record[name]
+        if name in headers:
+            return headers[name]
+    return None
+
+
+def extract(line):
+    """(timestamp, endpoint, body, signature) de una línea, o (None, motivo) si no se puede leer."""
+    text = line.decode("utf-8", errors="replace") if isinstance(line, bytes) else line
+    start = text.find("{")
+    if start < 0:
+        return None, "sin JSON"
+    try:
+        record = json.loads(text[start:])
+    except ValueError:
+        return None, "JSON inválido"
+    if not isinstance(record, dict):
+        return None, "JSON inválido"
+    headers = record.get("headers")
+    headers = {str(k).lower(): v for k, v in headers.items()} if isinstance(headers, dict) else {}
+    values = {key: _field(record, headers, names) for key, names in FIELDS.items()}
+    body = next((record[name] for name in BODY_FIELDS if name in record), None)
+    if any(not isinstance(v, str) for v in values.values()):
+        return None, "faltan timestamp, endpoint o signature"
+    if body is not None and not isinstance(body, str):
+        return None, "body no es texto (se necesita el cuerpo tal como llegó)"
+    return (values["timestamp"], values["endpoint"], body or "", values["signature"]), None
+
+
+def verify(timestamp, endpoint, body, signature):
+    """Etiqueta del secreto que firma el registro, o (None, motivo)."""
+    if not signature.startswith(PREFIX):
+        return None, "falta el prefijo hmac-sha256"
+    try:
+        received = base64.b64decode(signature[len(PREFIX):])
+    except (binascii.Error, ValueError):
+        return None, "firma no es base64"
+    message = (timestamp + endpoint + body).encode("utf-8")
+    for label, keyed in _keyed:
+        mac = keyed.copy()
+        mac.update(message)
+        if hmac.compare_digest(received, mac.digest()):
+            return label, None
+    return None, "no coincide con ningún secreto"
+
+
+def _verify_chunk(chunk):
+    source, first_line, lines = chunk
+    matches = {}
+    failures = []
+    malformed = 0
+    for offset, line in enumerate(lines):
+        if not line.strip():
+            continue
+        fields, reason = extract(line)
+        if fields is None:
+            malformed += 1
+            failures.append({"file": source, "line": first_line + offset, "reason": reason})
+            continue
+        timestamp, endpoint, body, signature = fields
+        label, reason = verify(timestamp, endpoint, body, signature)
+        if label is None:
+            failures.append({
+                "file": source,
+                "line": first_line + offset,
+                "reason": reason,
+                "timestamp": timestamp,
+                "endpoint": endpoint,
+                "signature": signature,
+                "body_sha256": hashlib.sha256(body.encode("utf-8")).hexdigest(),
+            })
+            continue
+        stats = matches.setdefault(label, [0, timestamp, timestamp])
+        stats[0] += 1
+        stats[1] = min(stats[1], timestamp, key=_ts_key)
+        stats[2] = max(stats[2], timestamp, key=_ts_key)
+    return len(lines), matches, malformed, failures
+
+
+def _ts_key(timestamp):
+    try:
+        return (0, int(timestamp), "")
+    except ValueError:
+        return (1, 0, timestamp)
+
+
+def _open(path):
+    if path == "-":
+        return sys.stdin.buffer
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+
+def chunks(paths, size):
+    for path in paths:
+        stream = _open(path)
+        try:
+            lines = []
+            first = 1
+            for number, line in enumerate(stream, 1):
+                lines.append(line)
+                if len(lines) >= size:
+                    yield path, first, lines
+                    lines, first = [], number + 1
+            if lines:
+                yield path, first, lines
+        finally:
+            if stream is not sys.stdin.buffer:
+                stream.close()
+
+
+def check_against_function(secret):
+    """Compara con check_signature de la función de notificación si se puede importar."""
+    try:
+        from local_emulator import DEV_DIR, load_function
+
+        func = load_function(os.path.join(DEV_DIR, "eventos_tarjetas_pomelo",
+                                          "fn_notificacion_evento_tarjeta_pomelo_dev"), {})["func"]
+    except ImportError:
+        return None
+    import logging
+
+    logging.getLogger().setLevel(logging.WARNING)
+    _init_worker([("muestra", secret)])
+    body = '{"id": "crd-muestra", "event": "BLOCK"}'
+    good = generate_record(secret, "1730505600", "/pomelo/eventosTarjeta/V1.0", body)
+    bad = dict(good, body=body + " ")
+    for record in (good, bad):
+        expected = bool(func.check_signature(secret, record["endpoint"], record["timestamp"], record["body"],
+                                             record["signature"]))
+        if expected != (verify(record["timestamp"], record["endpoint"], record["body"], record["signature"])[0]
+                        is not None):
+            raise SystemExit("La verificación no coincide con check_signature de la función de notificación")
+    return True
+
+
+def generate_record(secret, timestamp, endpoint, body):
+    digest = hmac.new(base64.b64decode(secret), (timestamp + endpoint + body).encode("utf-8"), hashlib.sha256)
+    return {"timestamp": timestamp, "endpoint": endpoint, "body": body,
+            "signature": PREFIX + base64.b64encode(digest.digest()).decode()}
+
+
+def generate(count, secrets, out):
+    """Registros sintéticos: se reparten entre los secretos y un 1% lleva el cuerpo alterado."""
+    endpoint = "/pomelo/eventosTarjeta/V1.0"
+    start = int(time.time()) - 86400
+    for i in range(count):
+        body = json.dumps({"event_id": f"card-event-{i}", "id": f"crd-{uuid.uuid4().hex[:27]}", "event": "BLOCK",
+                           "idempotency_key": str(uuid.uuid4())})
+        record = generate_record(secrets[i % len(secrets)][1], str(start + i * 86400 // max(count, 1)), endpoint,
+                                 body)
+        if random.random() < 0.01:
+            record["body"] = body.replace("BLOCK", "UNBLOCK")
+        out.write(json.dumps(record) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="*", help="archivos NDJSON o de log (.gz admitido); '-' para stdin")
+    parser.add_argument("--secret", action="append", default=[], help="[etiqueta=]api_secret en base64; repetible")
+    parser.add_argument("--secrets-file", help="un [etiqueta=]secreto por línea")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-lines", type=int, default=5000)
+    parser.add_argument("--mismatches", help="NDJSON con los registros que no coinciden o no se pudieron leer")
+    parser.add_argument("--summary", help="archivo para el resumen JSON (por defecto, la salida estándar)")
+    parser.add_argument("--generate", type=int, metavar="N", help="escribe N registros sintéticos en la salida estándar")
+    args = parser.parse_args()
+
+    values = list(args.secret)
+    if args.secrets_file:
+        with open(args.secrets_file, encoding="utf-8") as f:
+            values += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    if not values:
+        parser.error("indique al menos un --secret o --secrets-file")
+    secrets = parse_secrets(values)
+
+    if args.generate:
+        generate(args.generate, secrets, sys.stdout)
+        return 0
+    if not args.paths:
+        parser.error("indique los archivos a verificar")
+
+    check_against_function(secrets[0][1])
+
+    started = time.monotonic()
+    total = malformed = mismatched = 0
+    matches = {}
+    mismatches_out = open(args.mismatches, "w", encoding="utf-8") if args.mismatches else None
+    try:
+        with Pool(args.workers, initializer=_init_worker, initargs=(secrets,)) as pool:
+            for lines, chunk_matches, chunk_malformed, failures in pool.imap_unordered(
+                    _verify_chunk, chunks(args.paths, args.chunk_lines)):
+                total += lines
+                malformed += chunk_malformed
+                mismatched += len(failures) - chunk_malformed
+                for label, (count, first, last) in chunk_matches.items():
+                    stats = matches.setdefault(label, [0, first, last])
+                    stats[0] += count
+                    stats[1] = min(stats[1], first, key=_ts_key)
+                    stats[2] = max(stats[2], last, key=_ts_key)
+                if mismatches_out:
+                    for failure in failures:
+                        mismatches_out.write(json.dumps(failure, ensure_ascii=False) + "\n")
+    finally:
+        if mismatches_out:
+            mismatches_out.close()
+
+    elapsed = time.monotonic() - started
+    summary = {
+        "lines": total,
+        "matched": sum(stats[0] for stats in matches.values()),
+        "mismatched": mismatched,
+        "malformed": malformed,
+        "by_secret": {label: {"matched": count, "first_timestamp": first, "last_timestamp": last}
+                      for label, (count, first, last) in matches.items()},
+        "seconds": round(elapsed, 2),
+        "records_per_second": round(total / elapsed) if elapsed else None,
+        "workers": args.workers,
+    }
+    text = json.dumps(summary, indent=2, ensure_ascii=False)
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+    return 1 if mismatched or malformed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())